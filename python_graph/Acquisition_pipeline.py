@@ -0,0 +1,549 @@
+import collections
+import multiprocessing as mp
+import queue
+import threading
+import time
+
+import numpy as np
+
+from Block_pipeline import BlockPipeline
+from Metrics import Registry
+from Shared_ring import SharedRingBuffer
+
+# --- CHÍNH SÁCH KHI HÀNG ĐỢI ĐẦY ---
+DROP_OLDEST = 'drop_oldest'  # Bỏ phần tử cũ nhất để nhận phần tử mới (bên gửi không bao giờ bị chặn)
+DROP_NEWEST = 'drop_newest'  # Bỏ phần tử mới (giữ nguyên những gì đang chờ)
+BLOCK = 'block'              # Chặn bên gửi cho tới khi có chỗ (backpressure)
+POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+# Chuỗi tầng của Final.py (configs/final.json): đỉnh R tìm trên ECG chưa làm mượt,
+# bộ đệm hiển thị nhận ECG đã làm mượt, BPM/SpO2 tính trên dữ liệu thô
+DEFAULT_STAGES = (
+    {'type': 'filter_bank', 'use_sos': False},
+    {'type': 'r_peaks'},
+    {'type': 'ptt'},
+    {'type': 'smoother', 'channel': 'ecg', 'window_length': 9, 'polyorder': 2},
+    {'type': 'plot'},
+    {'type': 'ppg_analyzer'},
+)
+# Tiến trình DSP gửi số đo của mình về tiến trình chính mỗi bấy nhiêu giây
+METRICS_EXPORT_INTERVAL = 1.0
+
+
+class BoundedQueue:
+    def __init__(self, maxsize, policy=DROP_OLDEST, name='queue'):
+        """
+        Hàng đợi có giới hạn giữa các luồng (thread), chính sách khi đầy được
+        chọn rõ ràng và có bộ đếm để theo dõi.
+
+        Tham số:
+        - maxsize (int): Số phần tử tối đa.
+        - policy (str): DROP_OLDEST, DROP_NEWEST hoặc BLOCK.
+        - name (str): Tên hiển thị trong stats().
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"policy phải là một trong {POLICIES}")
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.name = name
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        # Bộ đếm
+        self.accepted = 0   # Số phần tử đã nhận vào hàng đợi
+        self.delivered = 0  # Số phần tử đã lấy ra
+        self.dropped = 0    # Số phần tử bị bỏ (cũ hoặc mới tùy chính sách)
+        self.max_depth = 0
+
+    @property
+    def depth(self):
+        return len(self._items)
+
+    def put(self, item, timeout=None):
+        """
+        Đưa một phần tử vào hàng đợi.
+        Trả về False nếu phần tử bị bỏ (DROP_NEWEST, hoặc BLOCK quá timeout).
+        """
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                if self.policy == DROP_OLDEST:
+                    self._items.popleft()
+                    self.dropped += 1
+                elif self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                elif not self._cond.wait_for(lambda: len(self._items) < self.maxsize, timeout):
+                    self.dropped += 1
+                    return False
+            self._items.append(item)
+            self.accepted += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Lấy phần tử cũ nhất, chờ tối đa timeout giây. Trả về None nếu không có."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                return None
+            item = self._items.popleft()
+            self.delivered += 1
+            self._cond.notify_all()
+            return item
+
+    def get_all(self, timeout=None):
+        """Lấy toàn bộ phần tử đang chờ (list, cũ -> mới), chờ tối đa timeout nếu rỗng."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                return []
+            items = list(self._items)
+            self._items.clear()
+            self.delivered += len(items)
+            self._cond.notify_all()
+            return items
+
+    def stats(self):
+        return {'name': self.name, 'policy': self.policy, 'depth': self.depth, 'max_depth': self.max_depth,
+                'accepted': self.accepted, 'delivered': self.delivered, 'dropped': self.dropped}
+
+
+class ProcessBoundedQueue:
+    def __init__(self, maxsize, policy=DROP_OLDEST, name='queue', ctx=None):
+        """
+        Giống BoundedQueue nhưng dùng được giữa các tiến trình (multiprocessing.Queue).
+        Bộ đếm nằm trong bộ nhớ chia sẻ nên tiến trình nào cũng đọc được.
+        Lưu ý: mỗi phần tử bị pickle khi đi qua hàng đợi.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"policy phải là một trong {POLICIES}")
+        ctx = ctx or mp.get_context()
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.name = name
+        self._queue = ctx.Queue(self.maxsize)
+        # [accepted, delivered, dropped, max_depth]
+        self._counters = ctx.Array('q', 4)
+
+    def _add(self, index, n=1):
+        with self._counters.get_lock():
+            self._counters[index] += n
+            depth = self._counters[0] - self._counters[1] - self._evicted_unlocked()
+            self._counters[3] = max(self._counters[3], depth)
+
+    def _evicted_unlocked(self):
+        # Phần tử bị bỏ theo DROP_OLDEST đã được nhận vào rồi mới bị lấy ra
+        return self._counters[2] if self.policy == DROP_OLDEST else 0
+
+    @property
+    def accepted(self):
+        return self._counters[0]
+
+    @property
+    def delivered(self):
+        return self._counters[1]
+
+    @property
+    def dropped(self):
+        return self._counters[2]
+
+    @property
+    def max_depth(self):
+        return self._counters[3]
+
+    @property
+    def depth(self):
+        with self._counters.get_lock():
+            return max(0, self._counters[0] - self._counters[1] - self._evicted_unlocked())
+
+    def put(self, item, timeout=None):
+        if self.policy == BLOCK:
+            try:
+                self._queue.put(item, timeout=timeout)
+            except queue.Full:
+                self._add(2)
+                return False
+        else:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    if self.policy == DROP_NEWEST:
+                        self._add(2)
+                        return False
+                    try:
+                        self._queue.get_nowait()
+                        self._add(2)
+                    except queue.Empty:
+                        pass
+        self._add(0)
+        return True
+
+    def get(self, timeout=None):
+        try:
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        self._add(1)
+        return item
+
+    def get_all(self, timeout=None):
+        first = self.get(timeout)
+        if first is None:
+            return []
+        items = [first]
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._add(1, len(items) - 1)
+        return items
+
+    def stats(self):
+        return {'name': self.name, 'policy': self.policy, 'depth': self.depth, 'max_depth': self.max_depth,
+                'accepted': self.accepted, 'delivered': self.delivered, 'dropped': self.dropped}
+
+
+class SharedRingChannel:
+    def __init__(self, capacity, n_channels=3, name='raw', ctx=None):
+        """
+        Kênh dữ liệu thô giữa các tiến trình qua SharedRingBuffer, cùng giao diện
+        put()/get_all()/stats() với BoundedQueue nhưng không pickle dữ liệu.
+        Đơn vị của depth và các bộ đếm là MẪU (không phải khối).
+
+        Chính sách khi đầy luôn là DROP_OLDEST: bên ghi (luồng đọc Serial) không
+        bao giờ bị chặn, bên đọc chậm hơn 'capacity' mẫu sẽ mất các mẫu cũ nhất.
+        Bên đọc chờ dữ liệu mới trên một multiprocessing.Event do put() bật.
+        """
+        ctx = ctx or mp.get_context()
+        self.name = name
+        self.policy = DROP_OLDEST
+        self.ring = SharedRingBuffer(capacity, n_channels, dtype=np.int64)
+        # Bên đọc cập nhật: [số mẫu đã lấy, số mẫu bị mất, độ sâu lớn nhất]
+        self._counters = ctx.Array('q', 3)
+        # Thời điểm đọc Serial của khối mới nhất (để đo độ trễ như BoundedQueue)
+        self._t_read = ctx.Value('d', 0.0, lock=False)
+        self._ready = ctx.Event()
+        self._written_at_close = None
+
+    @property
+    def accepted(self):
+        if self._written_at_close is not None:
+            return self._written_at_close
+        return self.ring.total_written
+
+    def put(self, item, timeout=None):
+        t_read, block = item
+        self.ring.extend(block)
+        self._t_read.value = t_read
+        self._ready.set()
+        return True
+
+    @property
+    def depth(self):
+        """Số mẫu đã ghi nhưng bên đọc chưa lấy (và chưa bị ghi đè)."""
+        return max(0, self.accepted - self._counters[0] - self._counters[1])
+
+    @property
+    def dropped(self):
+        return self._counters[1]
+
+    def get_all(self, timeout=None):
+        """
+        Bên đọc: trả về [(t_read, khối)] các mẫu mới (bản sao, giữ lâu được), chờ tối
+        đa timeout giây nếu chưa có. Nếu bên ghi đã ghi đè các mẫu trong lúc copy
+        (bên đọc chậm hơn 'capacity' mẫu), cả khối bị bỏ và được đếm vào dropped.
+        """
+        ring = self.ring
+        if ring.total_written == ring.cursor:
+            # Xóa cờ rồi kiểm tra lại: put() tăng seq trước khi bật cờ nên không lỡ khối nào
+            self._ready.clear()
+            if ring.total_written == ring.cursor and not self._ready.wait(timeout or 0):
+                return []
+        t_read = self._t_read.value
+        view, lost = ring.read_new()
+        block = view.copy()
+        if not ring.is_valid(ring.last_start):
+            lost += len(block)
+            block = block[:0]
+        with self._counters.get_lock():
+            self._counters[0] += len(block)
+            self._counters[1] += lost
+            self._counters[2] = max(self._counters[2], len(block) + lost)
+        return [(t_read, block)] if len(block) else []
+
+    def stats(self):
+        return {'name': self.name, 'policy': self.policy, 'depth': self.depth, 'max_depth': self._counters[2],
+                'accepted': self.accepted, 'delivered': self._counters[0],
+                'dropped': self._counters[1]}
+
+    def close(self):
+        # Giữ lại bộ đếm để stats() vẫn dùng được sau khi giải phóng vùng nhớ
+        self._written_at_close = self.ring.total_written
+        self.ring.close()
+
+
+class VitalSignsDSP(BlockPipeline):
+    def __init__(self, fs=100, window_size=500, spo2_cal_coeffs=(110, 25), display=None, display_size=None,
+                 stages=None, metrics=None):
+        """
+        Chuỗi xử lý của Final.py (BlockPipeline với DEFAULT_STAGES): FilterBank (ECG, IR, RED)
+        -> làm mượt ECG -> bộ đệm hiển thị -> StreamingPPGAnalyzer.
+        Song song đó, đỉnh R (nhịp tim từ ECG) được tìm trên ECG đã lọc, chưa làm mượt,
+        và ghép với sóng PPG để tính thời gian truyền sóng mạch (StreamingPTT).
+
+        Tham số:
+        - window_size: Cửa sổ tính BPM/SpO2 (số mẫu).
+        - display_size: Số mẫu hiển thị (mặc định = window_size). Cửa sổ hiển thị dài
+                        (vd: 60 giây) không làm thay đổi cửa sổ tính BPM/SpO2.
+        - display: Bộ đệm hiển thị 3 kênh (ECG đã làm mượt, IR, RED đã lọc).
+                   Mặc định RingBuffer(display_size, 3); có thể là SharedRingBuffer
+                   để tiến trình khác đọc trực tiếp.
+        - stages: Danh sách tầng khác DEFAULT_STAGES (xem Block_pipeline, configs/*.json).
+        - metrics: Metrics.Registry để đo thời gian từng tầng (None = không đo).
+        """
+        if stages is None:
+            stages = [dict(spec) for spec in DEFAULT_STAGES]
+            stages[-1]['spo2_cal_coeffs'] = spo2_cal_coeffs
+        super().__init__(stages, fs=fs, window_size=window_size, display=display, display_size=display_size,
+                         metrics=metrics)
+
+    def snapshot(self, t_read=None, copy=True):
+        """
+        Trạng thái hiển thị hiện tại (dict).
+        - copy=True: kèm bản sao 'ecg', 'ir', 'red' để gửi sang luồng vẽ.
+        - copy=False: chỉ gửi thông tin nhỏ (bên vẽ đọc thẳng bộ đệm chia sẻ).
+        - 'beats' tăng mỗi khi có nhịp mới (bên vẽ so sánh với giá trị lần trước,
+          không bị lỡ nhịp khi bỏ qua frame).
+        - 'ecg_bpm', 'r_peaks': Nhịp tim từ khoảng RR của ECG (None khi chưa đủ) và
+          tổng số đỉnh R đã xác nhận.
+        - 'ptt': Kết quả PTT của nhịp gần nhất (dict theo PTT.KEYS, None khi chưa có).
+        Tầng nào không có trong chuỗi thì khóa tương ứng không có trong ảnh chụp.
+        """
+        return super().snapshot(t_read=t_read, copy=copy)
+
+
+def acquisition_loop(ingest, raw_queue, stop_event):
+    """
+    Luồng thu thập: chỉ đọc Serial và đẩy khối thô (t_read, block) vào hàng đợi.
+    Không lọc, không vẽ, nên không bị chậm theo GUI.
+    """
+    while not stop_event.is_set():
+        try:
+            block = ingest.read_block()
+        except Exception as e:
+            print(f"Lỗi đọc Serial: {e}")
+            break
+        if len(block):
+            raw_queue.put((time.perf_counter(), block))
+
+
+def dsp_loop(raw_queue, frame_queue, stop_event, fs=100, window_size=500, display_name=None, display_size=None,
+             stages=None, dsp=None, metrics=None, metrics_queue=None):
+    """
+    Luồng/tiến trình DSP: gom tất cả khối thô đang chờ, xử lý một lần,
+    rồi đẩy trạng thái mới nhất sang hàng đợi vẽ.
+    Là hàm cấp module để dùng được làm target của multiprocessing.Process.
+
+    display_name: tên SharedRingBuffer hiển thị (tiến trình DSP là bên ghi duy nhất);
+    khi đó frame chỉ chứa thông tin nhỏ, bên vẽ đọc dữ liệu trực tiếp từ bộ nhớ chung.
+    stages: Cấu hình các tầng (None = DEFAULT_STAGES), được tạo ngay trong tiến trình DSP.
+    dsp: VitalSignsDSP đã tạo sẵn (chế độ luồng: tạo ở luồng chính, việc import
+         SciPy của các tầng không làm DSP chậm lúc đầu và lỗi cấu hình báo ngay).
+    metrics: Metrics.Registry (chế độ luồng, dùng chung với tiến trình chính). None = không đo.
+    metrics_queue: Chế độ tiến trình: tạo Registry riêng và gửi Registry.state() vào hàng
+                   đợi này mỗi METRICS_EXPORT_INTERVAL giây và khi dừng.
+    """
+    display = SharedRingBuffer.attach(display_name, writer=True) if display_name else None
+    export = metrics_queue is not None
+    if export:
+        metrics = Registry()
+    if dsp is None:
+        dsp = VitalSignsDSP(fs=fs, window_size=window_size, display=display, display_size=display_size,
+                            stages=stages, metrics=metrics)
+    # Thời gian từ lúc đọc khối khỏi nguồn tới khi DSP xử lý xong (gồm thời gian chờ trong hàng đợi)
+    latency = metrics.histogram('vitals_dsp_latency_seconds', "Từ lúc đọc khối tới khi DSP xử lý xong") \
+        if metrics is not None else None
+    last_export = 0.0
+    try:
+        while not stop_event.is_set():
+            items = raw_queue.get_all(timeout=0.1)
+            if not items:
+                continue
+            block = items[0][1] if len(items) == 1 else np.concatenate([b for _, b in items])
+            t_read = items[-1][0]
+            dsp.process(block, t_read=t_read)
+            frame = dsp.snapshot(t_read=t_read, copy=display is None)
+            if latency is not None:
+                now = time.perf_counter()
+                latency.observe(now - t_read)
+                if export and now - last_export >= METRICS_EXPORT_INTERVAL:
+                    last_export = now
+                    metrics_queue.put(metrics.state())
+            frame_queue.put(frame)
+    finally:
+        if export:
+            metrics_queue.put(metrics.state())
+        dsp.close()
+        if display is not None:
+            display.close()
+
+
+class AcquisitionPipeline:
+    def __init__(self, ingest, fs=100, window_size=500, dsp_mode='thread',
+                 raw_queue_size=256, raw_policy=DROP_OLDEST,
+                 frame_queue_size=2, frame_policy=DROP_OLDEST, display_size=None, stages=None, metrics=None):
+        """
+        Pipeline 3 tầng: thu thập -> DSP -> vẽ, nối bằng hàng đợi có giới hạn.
+
+        - Thu thập: luồng riêng, đọc Serial theo khối (SerialIngest.read_block).
+        - DSP: luồng riêng (dsp_mode='thread') hoặc tiến trình riêng
+               (dsp_mode='process', tránh GIL với GUI). Với 'process' script gọi
+               phải có khối if __name__ == "__main__" (Windows/macOS dùng spawn).
+        - Vẽ: gọi latest_frame() trong FuncAnimation, chỉ lấy trạng thái mới nhất.
+
+        Với dsp_mode='process', dữ liệu không đi qua pickle: mẫu thô được ghi một
+        lần vào SharedRingBuffer (raw_ring_name), tiến trình DSP ghi dữ liệu hiển
+        thị vào SharedRingBuffer thứ hai (display_ring_name). Tiến trình khác
+        (cửa sổ vẽ thứ hai, bộ ghi file...) có thể SharedRingBuffer.attach() vào
+        một trong hai bộ đệm này để đọc mà không làm chậm luồng đọc Serial.
+
+        Tham số:
+        - ingest: SerialIngest (hoặc đối tượng có read_block()), có thể bọc trong
+                  Rate_monitor.MonitoredIngest để đo tần số/bù mất mẫu ngay khi đọc.
+        - window_size: Cửa sổ tính BPM/SpO2 (số mẫu).
+        - display_size: Số mẫu trong ảnh chụp cho bên vẽ (mặc định = window_size).
+        - raw_queue_size, raw_policy: Hàng đợi khối thô (số khối). Mặc định DROP_OLDEST:
+          nếu DSP chậm, luồng đọc không bao giờ bị chặn (tránh tràn bộ đệm Serial
+          của hệ điều hành), khối cũ nhất bị bỏ và được đếm.
+          Với 'process': raw_queue_size * 64 mẫu trong bộ nhớ chung, khi đầy ghi đè mẫu
+          cũ nhất (chỉ hỗ trợ DROP_OLDEST, chính sách khác -> ValueError).
+        - frame_queue_size, frame_policy: Hàng đợi trạng thái cho bên vẽ. Bên vẽ chỉ
+          cần trạng thái mới nhất nên giữ nhỏ và DROP_OLDEST.
+        - stages: Chuỗi tầng của DSP (list cấu hình, xem Block_pipeline), mặc định
+          DEFAULT_STAGES. Với 'process' phải là dict (được pickle sang tiến trình DSP).
+        - metrics: Metrics.Registry nhận số đo của cả pipeline: thời gian tách dòng và từng
+          tầng DSP, độ trễ, độ sâu/số khối bỏ của hàng đợi, số dòng lỗi... None = không đo
+          (đường xử lý giữ nguyên). Với 'process', số đo của tiến trình DSP được gửi về
+          qua hàng đợi riêng và nạp vào Registry mỗi lần đọc số đo.
+        """
+        if dsp_mode not in ('thread', 'process'):
+            raise ValueError("dsp_mode phải là 'thread' hoặc 'process'")
+        if dsp_mode == 'process' and raw_policy != DROP_OLDEST:
+            raise ValueError("dsp_mode='process' chỉ hỗ trợ raw_policy=DROP_OLDEST (bộ nhớ chung ghi đè mẫu cũ nhất)")
+        self.ingest = ingest
+        self.dsp_mode = dsp_mode
+        self.display = None
+        self.metrics = metrics
+        self.metrics_queue = None
+        display_size = display_size or window_size
+
+        if dsp_mode == 'process':
+            ctx = mp.get_context()
+            self._stop = ctx.Event()
+            self.raw_queue = SharedRingChannel(raw_queue_size * 64, n_channels=3, name='raw', ctx=ctx)
+            self.display = SharedRingBuffer(display_size, n_channels=3, dtype=np.float64)
+            self.frame_queue = ProcessBoundedQueue(frame_queue_size, frame_policy, name='frame', ctx=ctx)
+            if metrics is not None:
+                self.metrics_queue = ProcessBoundedQueue(1, DROP_OLDEST, name='metrics', ctx=ctx)
+            self._dsp = ctx.Process(target=dsp_loop, daemon=True,
+                                    args=(self.raw_queue, self.frame_queue, self._stop, fs, window_size,
+                                          self.display.name, display_size, stages, None, None,
+                                          self.metrics_queue))
+        else:
+            self._stop = threading.Event()
+            self.raw_queue = BoundedQueue(raw_queue_size, raw_policy, name='raw')
+            self.frame_queue = BoundedQueue(frame_queue_size, frame_policy, name='frame')
+            dsp = VitalSignsDSP(fs=fs, window_size=window_size, display_size=display_size, stages=stages,
+                                metrics=metrics)
+            self._dsp = threading.Thread(target=dsp_loop, daemon=True,
+                                         args=(self.raw_queue, self.frame_queue, self._stop, fs, window_size,
+                                               None, display_size, stages, dsp, metrics))
+        # Luồng thu thập luôn ở tiến trình chính (đối tượng Serial không pickle được)
+        self._acq = threading.Thread(target=acquisition_loop, daemon=True,
+                                     args=(self.ingest, self.raw_queue, self._stop))
+        self._stopped = threading.Event()
+        self.frames_rendered = 0
+        if metrics is not None:
+            self.instrument(metrics)
+
+    def instrument(self, metrics):
+        """Đăng ký số đo của nguồn và các hàng đợi (đọc khi lấy số liệu, không tốn gì khi xử lý)."""
+        if hasattr(self.ingest, 'instrument'):
+            self.ingest.instrument(metrics)
+        metrics.counter('vitals_lines_total', "Số dòng hợp lệ đã đọc từ nguồn", fn=lambda: self.ingest.lines)
+        metrics.counter('vitals_malformed_lines_total', "Số dòng lỗi đã bỏ qua", fn=lambda: self.ingest.malformed)
+        for q in (self.raw_queue, self.frame_queue):
+            labels = {'queue': q.name}
+            metrics.gauge('vitals_queue_depth', "Số phần tử đang chờ trong hàng đợi", labels, fn=lambda q=q: q.depth)
+            metrics.gauge('vitals_queue_max_depth', "Độ sâu lớn nhất của hàng đợi", labels,
+                          fn=lambda q=q: q.stats()['max_depth'])
+            metrics.counter('vitals_queue_dropped_total', "Số phần tử bị bỏ khi hàng đợi đầy", labels,
+                            fn=lambda q=q: q.dropped)
+        metrics.counter('vitals_frames_rendered_total', "Số frame bên vẽ đã lấy", fn=lambda: self.frames_rendered)
+        if self.metrics_queue is not None:
+            metrics.add_collector(self._collect_dsp_metrics)
+
+    def _collect_dsp_metrics(self):
+        # Số đo mới nhất của tiến trình DSP (mỗi bản là toàn bộ giá trị, bản cũ hơn không cần)
+        states = self.metrics_queue.get_all(timeout=0)
+        if states:
+            self.metrics.load_state(states[-1])
+
+    @property
+    def raw_ring_name(self):
+        """Tên SharedRingBuffer dữ liệu thô (ECG, IR, RED) khi dsp_mode='process'."""
+        return self.raw_queue.ring.name if self.dsp_mode == 'process' else None
+
+    @property
+    def display_ring_name(self):
+        """Tên SharedRingBuffer hiển thị (ECG làm mượt, IR, RED đã lọc) khi dsp_mode='process'."""
+        return self.display.name if self.display is not None else None
+
+    def start(self):
+        self._dsp.start()
+        self._acq.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        """Dừng các tầng (luồng thu thập tự thoát sau tối đa ser.timeout giây)."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._stop.set()
+        self._acq.join(timeout)
+        self._dsp.join(timeout)
+        if self.dsp_mode == 'process':
+            self.raw_queue.close()
+            self.display.close()
+
+    def latest_frame(self):
+        """
+        Dành cho bên vẽ: trả về trạng thái mới nhất (dict, xem VitalSignsDSP.snapshot)
+        hoặc None nếu chưa có dữ liệu mới kể từ lần gọi trước. Không bao giờ chặn.
+        Với dsp_mode='process', 'ecg'/'ir'/'red' được copy từ bộ nhớ chung
+        (SharedRingBuffer.copy_view: copy lại nếu tiến trình DSP ghi trong lúc copy).
+        """
+        frames = self.frame_queue.get_all(timeout=0)
+        if not frames:
+            return None
+        self.frames_rendered += 1
+        frame = frames[-1]
+        if self.display is not None:
+            view = self.display.copy_view()
+            frame['ecg'], frame['ir'], frame['red'] = view[:, 0], view[:, 1], view[:, 2]
+        return frame
+
+    def stats(self):
+        """
+        Độ sâu và bộ đếm của từng hàng đợi, số dòng Serial hợp lệ/lỗi và tần số lấy
+        mẫu đo được ('rate', khi ingest là Rate_monitor.MonitoredIngest).
+        """
+        return {
+            'raw': self.raw_queue.stats(),
+            'frame': self.frame_queue.stats(),
+            'lines': self.ingest.lines,
+            'malformed': self.ingest.malformed,
+            'rate': self.ingest.stats() if hasattr(self.ingest, 'stats') else None,
+            'frames_rendered': self.frames_rendered,
+        }
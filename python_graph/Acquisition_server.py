@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+from Acquisition_pipeline import VitalSignsDSP
+from Rate_monitor import MonitoredIngest
+from Serial_ingest import SerialIngest
+
+# --- CẤU HÌNH MẶC ĐỊNH ---
+FS = 100
+BAUD_RATE = 921600
+WINDOW_SIZE = 500
+DSP_INTERVAL = 0.05  # Mỗi thiết bị được lọc/phân tích một lần mỗi 50 ms (gom các lần đọc)
+
+
+class Device:
+    def __init__(self, port, fs=FS, baud=BAUD_RATE, window_size=WINDOW_SIZE, name=None, **ingest_kwargs):
+        """
+        Một máy đo đầu giường: cổng Serial riêng, chuỗi xử lý riêng (VitalSignsDSP,
+        trạng thái bộ lọc/analyzer không dùng chung với thiết bị khác) và tầng đọc
+        MonitoredIngest (tần số thực, mất mẫu) riêng.
+
+        Tham số:
+        - port (str): Cổng Serial (vd: 'COM3', '/dev/ttyUSB0', cổng pty của ESP32 ảo).
+        - name (str): Tên hiển thị (mặc định = port).
+        - ingest_kwargs: Tham số của MonitoredIngest (fill_gaps, resample...).
+        """
+        self.port = port
+        self.name = name or port
+        self.fs = fs
+        self.baud = baud
+        self.window_size = window_size
+        self.ingest_kwargs = ingest_kwargs
+        self.ser = None
+        self.ingest = None
+        self.dsp = VitalSignsDSP(fs=fs, window_size=window_size)
+        self.frame = None
+        self.error = None
+        self._pending = []
+        self._thread = None
+        # Thời gian CPU của luồng sự kiện dành cho thiết bị này (đọc + tách dòng, lọc + phân tích)
+        self.read_time = 0.0
+        self.dsp_time = 0.0
+        self.reads = 0
+        self.max_lag = 0.0   # Thời gian chờ xử lý lâu nhất của một khối đã đọc (giây)
+        self._pending_since = None
+
+    @property
+    def connected(self):
+        return self.ser is not None and self.error is None
+
+    def open(self, timeout=0):
+        import serial
+        self.ser = serial.Serial(self.port, self.baud, timeout=timeout)
+        self.ser.reset_input_buffer()
+        self.ingest = MonitoredIngest(SerialIngest(self.ser), fs=self.fs, **self.ingest_kwargs)
+
+    def close(self):
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except Exception:
+                pass
+
+    def on_readable(self):
+        """Dữ liệu đã sẵn sàng (cổng ở chế độ không chặn): đọc hết và tách dòng, chưa lọc."""
+        t0 = time.perf_counter()
+        block = self.ingest.read_block()
+        self.add_block(block)
+        self.reads += 1
+        self.read_time += time.perf_counter() - t0
+
+    def add_block(self, block):
+        if len(block):
+            if not self._pending:
+                self._pending_since = time.perf_counter()
+            self._pending.append(block)
+
+    def process(self):
+        """Lọc và phân tích mọi khối đang chờ trong một lần, trả về True nếu có dữ liệu mới."""
+        if not self._pending:
+            return False
+        t0 = time.perf_counter()
+        self.max_lag = max(self.max_lag, t0 - self._pending_since)
+        blocks, self._pending = self._pending, []
+        self.dsp.process(blocks[0] if len(blocks) == 1 else np.concatenate(blocks))
+        self.frame = self.dsp.snapshot(t_read=self.ingest.t_read, copy=False)
+        self.dsp_time += time.perf_counter() - t0
+        return True
+
+    def status(self):
+        """Tóm tắt cho bảng theo dõi (dict)."""
+        result = self.frame['result'] if self.frame else {}
+        rate = self.ingest.stats() if self.ingest is not None else {}
+        return {
+            'name': self.name,
+            'connected': self.connected,
+            'error': self.error,
+            'samples': self.dsp.n_samples,
+            'rate': rate.get('rate'),
+            'lost': rate.get('lost', 0),
+            'bpm': result.get('bpm'),
+            'spo2': result.get('spo2'),
+            'ecg_bpm': self.frame['ecg_bpm'] if self.frame else None,
+            'status': result.get('status'),
+            'cpu_s': self.read_time + self.dsp_time,
+        }
+
+
+class AcquisitionServer:
+    def __init__(self, ports, fs=FS, baud=BAUD_RATE, window_size=WINDOW_SIZE, dsp_interval=DSP_INTERVAL,
+                 on_frame=None, **ingest_kwargs):
+        """
+        Thu thập từ nhiều thiết bị trên một tiến trình, một luồng, bằng asyncio.
+
+        - Đọc: mỗi cổng Serial mở ở chế độ không chặn (timeout=0) và đăng ký với vòng
+          lặp sự kiện bằng loop.add_reader(ser.fileno()). Callback chỉ chạy khi hệ điều
+          hành báo có dữ liệu, đọc hết bộ đệm trong một lần và tách dòng (LineParser),
+          không có vòng lặp hỏi in_waiting và không có readline() chặn.
+          Nơi không có add_reader cho cổng Serial (Windows: ProactorEventLoop, pyserial
+          không có fileno) mỗi cổng dùng một luồng đọc chặn với timeout, khối đọc được
+          chuyển về vòng lặp sự kiện bằng call_soon_threadsafe.
+        - Xử lý: mỗi dsp_interval giây, khối thô đang chờ của từng thiết bị được gom và
+          đưa qua VitalSignsDSP riêng của thiết bị đó (cùng chuỗi lọc/analyzer của Final.py).
+        - Thiết bị bị rút (lỗi đọc) được đóng và đánh dấu, các thiết bị khác chạy tiếp.
+
+        Tham số:
+        - ports (list): Cổng Serial, hoặc (tên, cổng).
+        - dsp_interval (float): Chu kỳ xử lý (giây). Lớn hơn -> ít lần gọi hơn, tải thấp hơn.
+        - on_frame: Hàm on_frame(device) gọi sau mỗi lần thiết bị có kết quả mới
+                    (device.frame là VitalSignsDSP.snapshot(copy=False)).
+        - ingest_kwargs: Tham số của MonitoredIngest cho mọi thiết bị.
+        """
+        self.devices = []
+        for p in ports:
+            name, port = p if isinstance(p, (tuple, list)) else (None, p)
+            self.devices.append(Device(port, fs=fs, baud=baud, window_size=window_size, name=name,
+                                       **ingest_kwargs))
+        self.dsp_interval = dsp_interval
+        self.on_frame = on_frame
+        self._loop = None
+        self._stop = None
+        self._threaded = []
+        self.started = None
+
+    # --- Đọc ---
+    def _register(self, device):
+        loop = self._loop
+        try:
+            device.open(timeout=0)
+            loop.add_reader(device.ser.fileno(), self._on_readable, device)
+        except (NotImplementedError, AttributeError):
+            # Không có add_reader cho cổng này: luồng đọc chặn riêng
+            device.close()
+            device.open(timeout=0.1)
+            device._thread = threading.Thread(target=self._reader_thread, args=(device,), daemon=True)
+            device._thread.start()
+            self._threaded.append(device)
+
+    def _on_readable(self, device):
+        try:
+            device.on_readable()
+        except Exception as e:
+            self._disconnect(device, e)
+
+    def _reader_thread(self, device):
+        loop = self._loop
+        while not self._stop.is_set():
+            try:
+                block = device.ingest.read_block()
+            except Exception as e:
+                loop.call_soon_threadsafe(self._disconnect, device, e)
+                return
+            if len(block):
+                loop.call_soon_threadsafe(device.add_block, block)
+
+    def _disconnect(self, device, error):
+        if device.error is not None:
+            return
+        device.error = str(error) or type(error).__name__
+        if device._thread is None:
+            try:
+                self._loop.remove_reader(device.ser.fileno())
+            except Exception:
+                pass
+        device.close()
+
+    # --- Vòng lặp chính ---
+    async def run(self, duration=None):
+        """Mở mọi cổng và chạy cho tới stop() (hoặc hết 'duration' giây)."""
+        self._loop = asyncio.get_running_loop()
+        self._stop = threading.Event()
+        for device in self.devices:
+            try:
+                self._register(device)
+            except Exception as e:
+                device.error = f"không mở được cổng: {e}"
+        self.started = time.perf_counter()
+        try:
+            next_tick = self.started
+            while not self._stop.is_set():
+                if duration is not None and time.perf_counter() - self.started >= duration:
+                    break
+                for device in self.devices:
+                    if device.process() and self.on_frame is not None:
+                        self.on_frame(device)
+                next_tick += self.dsp_interval
+                await asyncio.sleep(max(next_tick - time.perf_counter(), 0))
+        finally:
+            self._stop.set()
+            for device in self.devices:
+                if device.connected and device._thread is None:
+                    self._loop.remove_reader(device.ser.fileno())
+            for device in self._threaded:
+                device._thread.join(1.0)
+            for device in self.devices:
+                device.close()
+
+    def stop(self):
+        """Dừng run() (gọi được từ luồng khác)."""
+        if self._stop is not None:
+            self._stop.set()
+
+    def status(self):
+        return [device.status() for device in self.devices]
+
+
+def _fmt(value, width, digits):
+    return f"{value:>{width}.{digits}f}" if value is not None else f"{'-':>{width}}"
+
+
+def print_status(server):
+    print(f"{'Thiết bị':<16}{'Fs (Hz)':>9}{'Mất':>6}{'BPM':>8}{'SpO2':>7}{'ECG HR':>8}{'CPU (s)':>9}  Trạng thái")
+    for s in server.status():
+        state = s['error'] or s['status'] or '...'
+        print(f"{s['name'][-16:]:<16}{_fmt(s['rate'], 9, 2)}{s['lost']:>6}{_fmt(s['bpm'], 8, 1)}"
+              f"{_fmt(s['spo2'], 7, 1)}{_fmt(s['ecg_bpm'], 8, 0)}{s['cpu_s']:>9.2f}  {state}")
+
+
+async def _watch(server, duration, interval):
+    task = asyncio.create_task(server.run(duration))
+    while not task.done():
+        await asyncio.sleep(interval)
+        print_status(server)
+        print()
+    await task
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Thu thập và xử lý nhiều máy đo ECG/PPG trên một tiến trình (asyncio).")
+    parser.add_argument('ports', nargs='*', help="Các cổng Serial, vd: COM3 COM4 hoặc /dev/ttyUSB0 /dev/ttyUSB1")
+    parser.add_argument('--fs', type=int, default=FS)
+    parser.add_argument('--baud', type=int, default=BAUD_RATE)
+    parser.add_argument('--sim', default=None, help="Không cần phần cứng: phát file CSV này trên --n ESP32 ảo")
+    parser.add_argument('--n', type=int, default=4, help="Số ESP32 ảo khi dùng --sim")
+    parser.add_argument('--duration', type=float, default=None, help="Thời gian chạy (giây), mặc định tới khi Ctrl+C")
+    parser.add_argument('--interval', type=float, default=2.0, help="Chu kỳ in bảng trạng thái (giây)")
+    args = parser.parse_args()
+
+    sims = []
+    ports = list(args.ports)
+    if args.sim:
+        from ESP32_simulator import VirtualESP32
+        sims = [VirtualESP32(args.sim, fs=args.fs, loop=True, seed=i).start() for i in range(args.n)]
+        ports += [(f"sim{i}", sim.port) for i, sim in enumerate(sims)]
+    if not ports:
+        parser.error("cần ít nhất một cổng hoặc --sim")
+
+    server = AcquisitionServer(ports, fs=args.fs, baud=args.baud)
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    try:
+        asyncio.run(_watch(server, args.duration, args.interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for sim in sims:
+            sim.stop()
+    wall = time.perf_counter() - t0
+    print(f"-> {len(server.devices)} thiết bị, {wall:.1f} giây, CPU tiến trình "
+          f"{(time.process_time() - cpu0) / wall * 100:.1f}% một lõi"
+          + (" (gồm cả ESP32 ảo)" if sims else "") + ".")
+
+
+if __name__ == "__main__":
+    main()
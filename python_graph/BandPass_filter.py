@@ -11,8 +11,19 @@ class RealTimeBandpassFilter:
         :param order: Bậc bộ lọc (Mặc định 2 là đủ cho PPG)
         """
         
+        self.lowcut = lowcut
+        self.highcut = highcut
+        self.fs = fs
+        self.order = order
+
         #  Tạo hệ số b, a 
         self.b, self.a = butter(order, [lowcut, highcut], btype='band', fs=fs)
+
+        # Dạng hàm truyền (b, a) mất ổn định khi bậc cao / fs cao (cực ra ngoài
+        # vòng tròn đơn vị do sai số làm tròn). Khi đó nên dùng to_sos().
+        if np.max(np.abs(np.roots(self.a))) >= 1.0:
+            print(f"Cảnh báo: Bộ lọc bậc {order} @ {fs}Hz không ổn định ở dạng (b, a). "
+                  f"Hãy dùng RealTimeSOSFilter(bộ_lọc.to_sos()).")
         
         # QUAN TRỌNG: Khởi tạo trạng thái 'zi' (Bộ nhớ đệm)
         # Đây là thứ giúp bộ lọc hoạt động liên tục (Real-time)
@@ -28,4 +39,31 @@ class RealTimeBandpassFilter:
         # Tham số zi đầu vào là trạng thái cũ, zi đầu ra là trạng thái mới
         filtered_data, self.zi = lfilter(self.b, self.a, [new_sample], zi=self.zi)
         
-        return filtered_data[0]
\ No newline at end of file
+        return filtered_data[0]
+
+    def filter_block(self, samples):
+        """
+        Lọc một khối nhiều mẫu liên tiếp (Block processing có trạng thái).
+        Trạng thái 'zi' được giữ lại giữa các lần gọi, nên gọi filter_block
+        nhiều lần liên tiếp cho kết quả giống hệt gọi filter() cho từng mẫu.
+        :param samples: Mảng 1 chiều các giá trị thô (list hoặc numpy array)
+        :return: Numpy array đã lọc (cùng độ dài với đầu vào)
+        """
+        x = np.asarray(samples, dtype=np.float64)
+        if x.size == 0:
+            return x
+        filtered_data, self.zi = lfilter(self.b, self.a, x, zi=self.zi)
+        return filtered_data
+
+    def to_sos(self):
+        """
+        Xuất cùng thiết kế Butterworth dưới dạng Second-Order Sections.
+        Thiết kế trực tiếp bằng butter(output='sos') thay vì đổi từ (b, a),
+        nên vẫn chính xác ở bậc cao. Dùng với SOS_filter.RealTimeSOSFilter.
+        :return: Mảng sos (n_sections, 6)
+        """
+        return butter(self.order, [self.lowcut, self.highcut], btype='band', fs=self.fs, output='sos')
+
+    def reset(self):
+        """Reset trạng thái bộ lọc về ban đầu"""
+        self.zi = lfilter_zi(self.b, self.a)
@@ -0,0 +1,77 @@
+from scipy.signal import sosfilt_zi
+
+
+class Biquad:
+    __slots__ = ('b0', 'b1', 'b2', 'a1', 'a2', 'z1', 'z2')
+
+    def __init__(self, section, z1=0.0, z2=0.0):
+        """
+        Một khâu bậc 2 dạng Direct Form II Transposed, tính bằng số thực thuần.
+
+        Tham số:
+        - section: Một hàng sos [b0, b1, b2, a0, a1, a2] (a0 được chuẩn hóa về 1).
+        - z1, z2: Trạng thái ban đầu của khâu.
+        """
+        b0, b1, b2, a0, a1, a2 = (float(v) for v in section)
+        # Tính trước các hệ số đã chia cho a0 để vòng lặp chỉ còn nhân/cộng
+        self.b0 = b0 / a0
+        self.b1 = b1 / a0
+        self.b2 = b2 / a0
+        self.a1 = a1 / a0
+        self.a2 = a2 / a0
+        self.z1 = float(z1)
+        self.z2 = float(z2)
+
+    def process(self, x):
+        """Lọc một mẫu: y[n] = b0*x[n] + z1; cập nhật z1, z2."""
+        y = self.b0 * x + self.z1
+        self.z1 = self.b1 * x - self.a1 * y + self.z2
+        self.z2 = self.b2 * x - self.a2 * y
+        return y
+
+
+class ScalarIIRFilter:
+    __slots__ = ('sections', 'initial_state')
+
+    def __init__(self, sos):
+        """
+        Bộ lọc IIR từng mẫu một (1 mẫu vào -> 1 mẫu ra) không cấp phát bộ nhớ.
+
+        Dùng khi thật sự cần xử lý từng mẫu (vd: luồng đọc nền trong ECG.py):
+        không tạo list/Numpy array cho mỗi mẫu như khi gọi lfilter, chỉ dùng
+        phép tính số thực trên các khâu bậc 2 nối tiếp.
+        Kết quả khớp với đường Scipy (lfilter/sosfilt) trong sai số làm tròn.
+
+        Tham số:
+        - sos (array): Mảng (n_sections, 6). Thường lấy từ bộ_lọc.to_sos()
+                       hoặc dùng ScalarIIRFilter.from_filters(...).
+        """
+        # Trạng thái ban đầu giống sosfilt_zi (tương đương lfilter_zi của các lớp cũ)
+        zi = sosfilt_zi(sos)
+        self.initial_state = tuple((float(z[0]), float(z[1])) for z in zi)
+        self.sections = tuple(Biquad(sec, z1, z2) for sec, (z1, z2) in zip(sos, self.initial_state))
+
+    @classmethod
+    def from_filters(cls, *filters):
+        """
+        Tạo bộ lọc từ các bộ lọc có sẵn (RealTimeNotchFilter, RealTimeBandpassFilter,
+        RealTimeSOSFilter), ghép nối tiếp theo thứ tự truyền vào.
+        """
+        sos = [sec for f in filters for sec in f.to_sos()]
+        return cls(sos)
+
+    def filter(self, new_sample):
+        """Lọc một mẫu đơn lẻ (cùng giao diện với RealTimeBandpassFilter.filter)."""
+        x = new_sample
+        for section in self.sections:
+            x = section.process(x)
+        return x
+
+    # Cùng giao diện với RealTimeNotchFilter.process_sample
+    process_sample = filter
+
+    def reset(self):
+        """Reset trạng thái bộ lọc về ban đầu"""
+        for section, (z1, z2) in zip(self.sections, self.initial_state):
+            section.z1 = z1
+            section.z2 = z2
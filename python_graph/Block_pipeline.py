@@ -0,0 +1,518 @@
+import copy
+import json
+import os
+import socket
+import time
+
+import numpy as np
+
+from Rate_monitor import MonitoredIngest
+from Recorder import Recorder
+from Recording_loader import load_recording
+from Ring_buffer import RingBuffer
+from Serial_ingest import SerialIngest, COL_ECG, COL_IR, COL_RED
+
+# Tên kênh dùng trong file cấu hình -> cột của khối (n, 3)
+CHANNELS = {'ecg': COL_ECG, 'ir': COL_IR, 'red': COL_RED}
+# Thư mục chứa các cấu hình có sẵn (final.json, ppg.json...)
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'configs')
+
+# Bảng đăng ký: tên trong file cấu hình -> lớp (tầng xử lý) hoặc hàm tạo (nguồn).
+# Các tầng dùng SciPy (bộ lọc, analyzer...) chỉ import module của mình khi được tạo,
+# nên chuỗi chỉ ghi file/gửi mạng khởi động không cần tải scipy.signal
+STAGES = {}
+SOURCES = {}
+
+
+def register_stage(name):
+    """Đăng ký một lớp Stage dưới tên 'name' (khóa 'type' trong file cấu hình)."""
+    def wrap(cls):
+        cls.name = name
+        STAGES[name] = cls
+        return cls
+    return wrap
+
+
+def register_source(*names):
+    """Đăng ký hàm/lớp tạo nguồn dữ liệu dưới một hoặc nhiều tên."""
+    def wrap(factory):
+        for name in names:
+            SOURCES[name] = factory
+        return factory
+    return wrap
+
+
+def _column(channel):
+    try:
+        return CHANNELS[channel]
+    except KeyError:
+        raise ValueError(f"Kênh '{channel}' không hợp lệ, chọn một trong {list(CHANNELS)}") from None
+
+
+# --- TẦNG XỬ LÝ ---
+class Stage:
+    """
+    Một tầng của BlockPipeline. Mỗi khối (n, 3) 'ecg, ir, red' đi qua các tầng theo
+    thứ tự khai báo: tầng biến đổi (transform) trả về khối mới cho tầng sau, tầng
+    đích (sink) chỉ dùng khối rồi trả về nguyên vẹn.
+
+    - process(block, ctx): ctx là dict dùng chung cho một khối: 'raw' (khối thô
+      từ nguồn, không được ghi đè), 't_read' và những gì các tầng trước để lại
+      (vd: 'r_peaks').
+    - snapshot(frame): Thêm kết quả của tầng vào ảnh chụp gửi cho bên vẽ.
+    - close(): Giải phóng tài nguyên (file, socket) khi pipeline dừng.
+    """
+    name = None
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def process(self, block, ctx):
+        return block
+
+    def snapshot(self, frame):
+        pass
+
+    def close(self):
+        pass
+
+
+@register_stage('filter_bank')
+class FilterBankStage(Stage):
+    def __init__(self, pipeline, use_sos=False, ecg_gain=2.0, ppg_gain=-1.0, fast_kernel=False):
+        """
+        Lọc cả 3 kênh trong một lần (Filter_bank.create_vital_signs_bank):
+        ECG notch 50Hz + bandpass 0.5-40Hz, PPG bandpass 0.5-12Hz.
+
+        Tham số:
+        - use_sos (bool): Dạng SOS (Notch + Bandpass của ECG ghép thành một chuỗi).
+          Mặc định tắt: với khối 1-2 mẫu (luồng DSP ở 100Hz), sosfilt public chậm
+          hơn dạng (b, a) ~3.5 lần; chỉ nhanh hơn khi kèm fast_kernel hoặc khối lớn.
+        - ecg_gain, ppg_gain (float): Hệ số nhân sau lọc (mặc định x2 và đảo dấu).
+        - fast_kernel (bool): Dùng nhân C riêng của SciPy cho sosfilt (xem
+          SOS_filter.use_fast_kernel), mặc định hàm public.
+        """
+        super().__init__(pipeline)
+        from Filter_bank import create_vital_signs_bank
+        if fast_kernel:
+            from SOS_filter import use_fast_kernel
+            if not use_fast_kernel():
+                print("-> Không dùng được nhân sosfilt riêng của SciPy, dùng scipy.signal.sosfilt")
+        self.bank = create_vital_signs_bank(fs=pipeline.fs, use_sos=use_sos, ecg_gain=ecg_gain, ppg_gain=ppg_gain)
+
+    def process(self, block, ctx):
+        return self.bank.process(block)
+
+
+@register_stage('smoother')
+class SmootherStage(Stage):
+    def __init__(self, pipeline, channel='ecg', window_length=9, polyorder=2):
+        """
+        Làm mượt Savitzky-Golay dạng luồng một kênh (SGS.StreamingSmoother), ghi đè
+        kênh đó trong khối. Trễ cố định (window_length - 1) / 2 mẫu.
+        """
+        super().__init__(pipeline)
+        from SGS import StreamingSmoother
+        self.col = _column(channel)
+        self.smoother = StreamingSmoother(window_length=window_length, polyorder=polyorder, capacity=1)
+
+    def process(self, block, ctx):
+        if block is ctx['raw'] or block.dtype != np.float64:
+            block = np.array(block, dtype=np.float64)
+        block[:, self.col] = self.smoother.smooth(block[:, self.col])
+        return block
+
+
+@register_stage('r_peaks')
+class RPeakStage(Stage):
+    def __init__(self, pipeline, channel='ecg'):
+        """
+        Tìm đỉnh R (R_peak_detector.StreamingRPeakDetector) trên ECG đã lọc, chưa làm mượt.
+        Đỉnh mới của khối được để lại trong ctx['r_peaks'] cho tầng 'ptt'.
+        """
+        super().__init__(pipeline)
+        from R_peak_detector import StreamingRPeakDetector
+        self.col = _column(channel)
+        self.detector = StreamingRPeakDetector(fs=pipeline.fs)
+
+    def process(self, block, ctx):
+        ctx['r_peaks'] = self.detector.update(block[:, self.col])
+        return block
+
+    def snapshot(self, frame):
+        frame['ecg_bpm'] = self.detector.bpm
+        frame['r_peaks'] = self.detector.n_peaks
+
+
+@register_stage('ptt')
+class PTTStage(Stage):
+    def __init__(self, pipeline, **kwargs):
+        """
+        Thời gian truyền sóng mạch (PTT.StreamingPTT) từ đỉnh R của tầng 'r_peaks'
+        (phải đứng trước) và sóng PPG đã lọc. kwargs: search, foot_search, history.
+        """
+        super().__init__(pipeline)
+        if pipeline.stage('r_peaks') is None:
+            raise ValueError("Tầng 'ptt' cần tầng 'r_peaks' đứng trước")
+        from PTT import StreamingPTT
+        self.ptt = StreamingPTT(fs=pipeline.fs, **kwargs)
+
+    def process(self, block, ctx):
+        self.ptt.update(block, ctx.get('r_peaks', ()))
+        return block
+
+    def snapshot(self, frame):
+        frame['ptt'] = self.ptt.latest
+
+
+@register_stage('ppg_analyzer')
+class PPGAnalyzerStage(Stage):
+    def __init__(self, pipeline, window_size=None, spo2_cal_coeffs=(110, 25), raw=True):
+        """
+        BPM/SpO2 dạng luồng (PPG_analyzer.StreamingPPGAnalyzer).
+
+        Tham số:
+        - window_size (int): Cửa sổ tính BPM/SpO2 (mẫu), mặc định window_size của pipeline.
+        - raw (bool): Phân tích khối thô từ nguồn (DC cần cho SpO2) thay vì khối của tầng trước.
+        """
+        super().__init__(pipeline)
+        from PPG_analyzer import StreamingPPGAnalyzer
+        self.raw = raw
+        self.analyzer = StreamingPPGAnalyzer(fs=pipeline.fs, spo2_cal_coeffs=tuple(spo2_cal_coeffs),
+                                             window_size=window_size or pipeline.window_size)
+        self.beats = 0
+
+    def process(self, block, ctx):
+        x = ctx['raw'] if self.raw else block
+        self.analyzer.update(red_samples=x[:, COL_RED], ir_samples=x[:, COL_IR])
+        self.beats += self.analyzer.new_beat
+        return block
+
+    def snapshot(self, frame):
+        frame['result'] = dict(self.analyzer.result)
+        frame['beats'] = self.beats
+
+
+@register_stage('plot')
+class PlotSink(Stage):
+    def __init__(self, pipeline, **layout):
+        """
+        Ghi khối (ở vị trí của tầng này trong chuỗi) vào bộ đệm hiển thị của pipeline
+        (RingBuffer, hoặc SharedRingBuffer khi DSP chạy ở tiến trình riêng). Chỉ giữ
+        display_size mẫu mới nhất. Cửa sổ đồ thị do Monitor_app dựng theo 'layout'
+        (panels, figsize...), phần này không cần matplotlib.
+        """
+        super().__init__(pipeline)
+        if pipeline.display is None:
+            pipeline.display = RingBuffer(pipeline.display_size, n_channels=3)
+        self.buffer = pipeline.display
+        self.layout = layout
+
+    def process(self, block, ctx):
+        n = min(len(block), self.pipeline.display_size)
+        self.buffer.extend(block[-n:])
+        return block
+
+
+@register_stage('recorder')
+class RecorderSink(Stage):
+    def __init__(self, pipeline, path='recording_%Y%m%d_%H%M%S.rec', chunk_size=500, fsync_interval=5.0,
+                 metadata=None):
+        """
+        Ghi khối ra file .rec (Recorder.Recorder). Đặt đầu chuỗi để ghi dữ liệu thô.
+        'path' được đưa qua time.strftime (vd: 'ghi_%Y%m%d_%H%M%S.rec').
+        """
+        super().__init__(pipeline)
+        self.recorder = Recorder(time.strftime(path), fs=pipeline.fs, chunk_size=chunk_size,
+                                 fsync_interval=fsync_interval, metadata=metadata)
+
+    def process(self, block, ctx):
+        self.recorder.write(block)
+        return block
+
+    def snapshot(self, frame):
+        frame['recorded'] = self.recorder.n_samples
+
+    def close(self):
+        self.recorder.close()
+
+
+@register_stage('network')
+class NetworkSink(Stage):
+    def __init__(self, pipeline, host='127.0.0.1', port=9870, interval=0.2, samples=False):
+        """
+        Gửi kết quả qua UDP, mỗi gói một JSON: ảnh chụp không kèm dữ liệu vẽ
+        (BPM, SpO2, ECG HR, PTT, số mẫu...) và, nếu samples=True, các mẫu của khối
+        ở vị trí tầng này ('samples', danh sách [ecg, ir, red]) kể từ gói trước.
+
+        Tham số:
+        - interval (float): Khoảng cách tối thiểu giữa hai gói (giây).
+        """
+        super().__init__(pipeline)
+        self.address = (host, port)
+        self.interval = interval
+        self.samples = samples
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sent = 0
+        self.errors = 0
+        self._pending = []
+        self._last = 0.0
+
+    def process(self, block, ctx):
+        if self.samples:
+            self._pending.append(block)
+        now = time.perf_counter()
+        if now - self._last < self.interval:
+            return block
+        self._last = now
+        message = self.pipeline.snapshot(t_read=ctx.get('t_read'), copy=False)
+        if self._pending:
+            message['samples'] = np.concatenate(self._pending).tolist()
+            self._pending = []
+        try:
+            self.sock.sendto(json.dumps(message, default=_json_default).encode('utf-8'), self.address)
+            self.sent += 1
+        except OSError:
+            self.errors += 1
+        return block
+
+    def close(self):
+        self.sock.close()
+
+
+def _json_default(value):
+    # Số Numpy (np.int64, np.float32...) trong kết quả
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def build_stage(spec, pipeline):
+    """Tạo tầng từ cấu hình {'type': tên, ...tham số} (hoặc trả lại Stage có sẵn)."""
+    if isinstance(spec, Stage):
+        return spec
+    spec = dict(spec)
+    kind = spec.pop('type', None)
+    if kind not in STAGES:
+        raise ValueError(f"Tầng '{kind}' không tồn tại, chọn một trong {sorted(STAGES)}")
+    return STAGES[kind](pipeline, **spec)
+
+
+class BlockPipeline:
+    def __init__(self, stages, fs=100, window_size=500, display=None, display_size=None, metrics=None):
+        """
+        Chuỗi xử lý theo khối: mỗi khối (n, 3) 'ecg, ir, red' từ nguồn (Serial, bản
+        ghi CSV/.rec) đi qua các tầng theo thứ tự, tầng sau nhận mảng Numpy do tầng
+        trước trả về (không chuyển từng mẫu). Các script Final.py, Final_csv.py,
+        ECG.py, PPG.py... chỉ khác nhau ở danh sách tầng (xem configs/*.json).
+
+        Tham số:
+        - stages (list): Cấu hình từng tầng {'type': 'filter_bank', ...} (dict, pickle
+                         được nên dùng được cho DSP ở tiến trình riêng) hoặc Stage.
+        - window_size: Cửa sổ mặc định của tầng 'ppg_analyzer' (mẫu).
+        - display, display_size: Bộ đệm hiển thị 3 kênh cho tầng 'plot' (mặc định
+                                 RingBuffer(display_size, 3)) và độ dài của nó.
+        - metrics: Metrics.Registry để đo thời gian từng tầng (None = không đo, xem instrument()).
+        """
+        self.fs = fs
+        self.window_size = window_size
+        self.display_size = display_size or window_size
+        self.display = display
+        self.stages = []
+        for spec in stages:
+            self.stages.append(build_stage(spec, self))
+        self.n_samples = 0
+        self._timed = None
+        if metrics is not None:
+            self.instrument(metrics)
+
+    def instrument(self, metrics):
+        """
+        Đo thời gian xử lý từng khối của mỗi tầng (histogram 'vitals_stage_seconds',
+        nhãn stage = tên tầng, thêm số thứ tự nếu tên lặp lại) và số mẫu đã đi hết chuỗi.
+        Không gọi thì process() chạy vòng lặp cũ, không tốn thêm gì.
+        """
+        names = [stage.name for stage in self.stages]
+        self._timed = []
+        for i, stage in enumerate(self.stages):
+            label = stage.name if names.count(stage.name) == 1 else f"{stage.name}{i}"
+            self._timed.append((stage, metrics.histogram('vitals_stage_seconds', "Thời gian xử lý một khối của tầng",
+                                                         {'stage': label})))
+        self._samples_out = metrics.counter('vitals_dsp_samples_total', "Số mẫu đã đi hết chuỗi DSP")
+
+    def stage(self, name):
+        """Tầng đầu tiên có tên 'name' (None nếu không có)."""
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        return None
+
+    def process(self, block, t_read=None):
+        """Đưa một khối thô (n, 3) qua mọi tầng, trả về khối ở cuối chuỗi."""
+        self.n_samples += len(block)
+        ctx = {'raw': block, 't_read': t_read}
+        if self._timed is not None:
+            return self._process_timed(block, ctx)
+        for stage in self.stages:
+            block = stage.process(block, ctx)
+        return block
+
+    def _process_timed(self, block, ctx):
+        t0 = time.perf_counter()
+        for stage, elapsed in self._timed:
+            block = stage.process(block, ctx)
+            t1 = time.perf_counter()
+            elapsed.observe(t1 - t0)
+            t0 = t1
+        self._samples_out.inc(len(block))
+        return block
+
+    def snapshot(self, t_read=None, copy=True):
+        """
+        Trạng thái hiện tại (dict): 'n_samples', 't_read' và kết quả của từng tầng
+        ('result'/'beats' của ppg_analyzer, 'ecg_bpm'/'r_peaks' của r_peaks, 'ptt'...).
+        - copy=True: kèm bản sao 'ecg', 'ir', 'red' của bộ đệm hiển thị để gửi sang luồng vẽ.
+        - copy=False: chỉ gửi thông tin nhỏ (bên vẽ đọc thẳng bộ đệm chia sẻ).
+        """
+        frame = {'n_samples': self.n_samples, 't_read': t_read}
+        for stage in self.stages:
+            stage.snapshot(frame)
+        if copy and self.display is not None:
+            view = self.display.view()
+            frame['ecg'], frame['ir'], frame['red'] = view.T.copy()
+        return frame
+
+    def close(self):
+        for stage in self.stages:
+            stage.close()
+
+
+# --- NGUỒN DỮ LIỆU ---
+@register_source('serial')
+def open_serial(port, fs=100, baud=921600, timeout=0.1, ready_timeout=5.0, monitor=True, **monitor_kwargs):
+    """
+    Mở cổng Serial và trả về đối tượng đọc theo khối (SerialIngest, bọc trong
+    Rate_monitor.MonitoredIngest khi monitor=True để đo tần số/bù mất mẫu).
+
+    Tham số:
+    - ready_timeout (float): Chờ tối đa bấy nhiêu giây cho dòng dữ liệu hợp lệ đầu tiên
+                             (SerialIngest.wait_ready, ESP32 khởi động lại khi mở cổng).
+                             None/0 = không chờ.
+    - monitor_kwargs: Tham số của MonitoredIngest (fill_gaps, resample...).
+    """
+    import serial
+    ser = serial.Serial(port, baud, timeout=timeout)
+    ser.reset_input_buffer()
+    ingest = SerialIngest(ser)
+    if ready_timeout:
+        try:
+            ingest.wait_ready(ready_timeout)
+        except TimeoutError:
+            ser.close()
+            raise
+    if monitor:
+        ingest = MonitoredIngest(ingest, fs=fs, **monitor_kwargs)
+    return ingest
+
+
+@register_source('playback', 'csv', 'recording')
+class PlaybackIngest:
+    def __init__(self, path, fs=100, seek=0.0, duration=None, speed=1.0, timeout=0.1, data=None):
+        """
+        Phát lại bản ghi (CSV 'ecg,ir,red' hoặc .rec của Recorder) theo đồng hồ thật,
+        cùng giao diện read_block() với SerialIngest: mỗi lần đọc trả về các mẫu đã
+        "đến" kể từ lần trước, chờ tối đa timeout giây nếu chưa có mẫu nào.
+
+        Tham số:
+        - seek, duration (float): Chỉ phát đoạn [seek, seek + duration) giây.
+        - speed (float): Tốc độ phát (2.0 = nhanh gấp đôi thời gian thực).
+        - data: Bản ghi đã tải sẵn (mặc định Recording_loader.load_recording(path)).
+        """
+        from Offline_processing import segment
+        if data is None:
+            data = load_recording(path, verbose=True)
+        start, stop = segment(len(data), fs, seek, duration)
+        self.path = path
+        self.fs = fs
+        self.data = data[start:stop]
+        self.speed = speed
+        self.timeout = timeout
+        self.position = 0
+        self.malformed = 0
+        self._t0 = None
+
+    @property
+    def lines(self):
+        return self.position
+
+    @property
+    def finished(self):
+        return self.position >= len(self.data)
+
+    @property
+    def elapsed(self):
+        """Thời gian đã phát (giây dữ liệu)."""
+        return self.position / self.fs
+
+    def read_block(self):
+        now = time.perf_counter()
+        if self._t0 is None:
+            self._t0 = now
+        rate = self.fs * self.speed
+        deadline = now + self.timeout
+        while True:
+            due = min(int((now - self._t0) * rate), len(self.data))
+            if due > self.position:
+                block = np.array(self.data[self.position:due], dtype=np.int64)
+                self.position = due
+                return block
+            if self.finished:
+                time.sleep(self.timeout)
+                return np.empty((0, 3), dtype=np.int64)
+            wait = min(self._t0 + (self.position + 1) / rate, deadline) - now
+            if wait <= 0:
+                return np.empty((0, 3), dtype=np.int64)
+            time.sleep(wait)
+            now = time.perf_counter()
+
+    def reset_input_buffer(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def open_source(spec, fs=100):
+    """Tạo nguồn từ cấu hình {'type': 'serial' | 'playback', ...tham số}."""
+    spec = dict(spec)
+    kind = spec.pop('type', None)
+    if kind not in SOURCES:
+        raise ValueError(f"Nguồn '{kind}' không tồn tại, chọn một trong {sorted(SOURCES)}")
+    return SOURCES[kind](fs=fs, **spec)
+
+
+# --- FILE CẤU HÌNH ---
+def load_config(name):
+    """
+    Đọc cấu hình pipeline (JSON). 'name' là đường dẫn file hoặc tên một cấu hình
+    có sẵn trong configs/ (vd: 'final' -> configs/final.json).
+    """
+    path = name
+    if not os.path.exists(path):
+        path = os.path.join(CONFIG_DIR, name if name.endswith('.json') else name + '.json')
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def merge_config(config, **overrides):
+    """
+    Bản sao của config với các giá trị ghi đè (bỏ qua giá trị None). Giá trị dict
+    (vd: source={'port': 'COM4'}) được gộp vào mục tương ứng thay vì thay thế.
+    """
+    config = copy.deepcopy(config)
+    for key, value in overrides.items():
+        if value is None:
+            continue
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            config[key].update({k: v for k, v in value.items() if v is not None})
+        else:
+            config[key] = value
+    return config
@@ -0,0 +1,237 @@
+import argparse
+import collections
+import os
+import threading
+import time
+
+import numpy as np
+
+# Dòng chào firmware in ra khi khởi động (src/main.cpp)
+BANNER = b"Khoi tao he thong...\r\n"
+# Số thời điểm gửi gần nhất được giữ cho sent_time() (~17 phút @ 100Hz, 10 giây ở 100x)
+SENT_HISTORY = 100000
+
+
+class VirtualESP32:
+    def __init__(self, data, fs=100, speed=1.0, drop_rate=0.0, garbage_rate=0.0,
+                 leads_off_rate=0.0, leads_off_duration=1.0, burst=1, loop=False,
+                 banner=True, seed=None, history=SENT_HISTORY):
+        """
+        Thiết bị ESP32 ảo trên một pseudo-terminal (pty), dùng để chạy thử và đo
+        hiệu năng các script đọc Serial mà không cần board MAX30102/AD8232.
+
+        Cổng ảo (thuộc tính 'port', vd: '/dev/pts/5') được mở bằng pyserial như
+        cổng thật: serial.Serial(sim.port, 921600, timeout=0.1).
+        Mỗi mẫu được gửi đúng định dạng của firmware: "ecg,red,ir\\r\\n"
+        (Serial.print + Serial.println). Các file trong csv/ được ghi trực tiếp
+        từ Serial nên mỗi hàng CSV được gửi nguyên trạng.
+
+        Tham số:
+        - data: Đường dẫn file CSV hoặc mảng (n, 3) số nguyên.
+        - fs (int): Tần số lấy mẫu của firmware (Hz).
+        - speed (float): Hệ số tốc độ so với thời gian thực (1 = 100 mẫu/giây,
+                         100 = 10000 mẫu/giây).
+        - drop_rate (float): Xác suất mất một dòng.
+        - garbage_rate (float): Xác suất chèn byte rác trước một dòng
+                                (nhiễu lúc cắm dây, ký tự '!'...).
+        - leads_off_rate (float): Xác suất mỗi mẫu bắt đầu một đoạn tuột dây ECG,
+                                  trong đoạn đó ecg = 0 giống firmware.
+        - leads_off_duration (float): Độ dài mỗi đoạn tuột dây (giây).
+        - burst (int): Số dòng gửi gộp trong một lần ghi (mô phỏng bộ chuyển
+                       USB-Serial gom dữ liệu theo gói).
+        - loop (bool): Phát lặp lại file khi hết dữ liệu.
+        - banner (bool): Gửi dòng chào "Khoi tao he thong..." trước dữ liệu.
+        - seed: Seed cho bộ sinh số ngẫu nhiên (tái lập lỗi).
+        - history (int): Số thời điểm gửi gần nhất được giữ (sent_time), bộ nhớ
+                         không tăng theo thời gian chạy kể cả với loop=True.
+        """
+        if isinstance(data, (str, os.PathLike)):
+            data = np.loadtxt(data, delimiter=',', dtype=np.int64, ndmin=2)
+        self.data = np.asarray(data, dtype=np.int64)
+        if self.data.ndim != 2 or self.data.shape[1] != 3 or len(self.data) == 0:
+            raise ValueError("Dữ liệu phải có dạng (n, 3): ecg, red, ir")
+        if speed <= 0:
+            raise ValueError("speed phải > 0")
+
+        self.fs = fs
+        self.speed = float(speed)
+        self.drop_rate = float(drop_rate)
+        self.garbage_rate = float(garbage_rate)
+        self.leads_off_rate = float(leads_off_rate)
+        self.leads_off_samples = max(1, int(round(leads_off_duration * fs)))
+        self.burst = max(1, int(burst))
+        self.loop = loop
+        self.banner = banner
+        self._rng = np.random.default_rng(seed)
+
+        # Mở pty: master do simulator ghi, slave là cổng Serial ảo
+        self._master, self._slave = os.openpty()
+        _set_raw(self._slave)
+        self.port = os.ttyname(self._slave)
+
+        self._thread = None
+        self._stop = threading.Event()
+        self.finished = threading.Event()
+
+        # Thống kê
+        self.sent = 0          # Số dòng dữ liệu đã gửi
+        self.dropped = 0       # Số dòng bị bỏ (drop_rate)
+        self.garbage = 0       # Số lần chèn byte rác
+        self.leads_off = 0     # Số mẫu ECG = 0 do tuột dây
+        # Thời điểm (time.perf_counter) gửi 'history' dòng dữ liệu gần nhất, theo thứ tự
+        # gửi; sent_times[0] là dòng thứ sent_offset. Đọc bằng sent_time(k)
+        self.sent_times = collections.deque(maxlen=max(1, int(history)))
+        self.sent_offset = 0
+        self._sent_lock = threading.Lock()
+
+    def sent_time(self, k):
+        """
+        Thời điểm gửi dòng dữ liệu thứ k (đếm từ 0), dùng để đo độ trễ đầu-cuối:
+        dòng thứ k nhận được <-> sent_time(k). None nếu dòng đó chưa gửi hoặc đã ra
+        khỏi lịch sử 'history' dòng.
+        """
+        with self._sent_lock:
+            i = k - self.sent_offset
+            if 0 <= i < len(self.sent_times):
+                return self.sent_times[i]
+        return None
+
+    # --- Điều khiển ---
+    def start(self):
+        """Bắt đầu phát dữ liệu trong luồng nền."""
+        if self._thread is not None:
+            raise RuntimeError("Simulator đã chạy")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Dừng phát và đóng pty."""
+        self._stop.set()
+        if self._thread is not None:
+            # Không ai đọc cổng thì bộ đệm pty đầy và os.write() của luồng phát bị chặn:
+            # xả phía slave cho tới khi luồng thoát
+            os.set_blocking(self._slave, False)
+            while self._thread.is_alive():
+                try:
+                    os.read(self._slave, 65536)
+                except OSError:
+                    pass
+                self._thread.join(0.05)
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def wait(self, timeout=None):
+        """Chờ phát hết dữ liệu (không dùng với loop=True)."""
+        return self.finished.wait(timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- Luồng phát ---
+    def _run(self):
+        try:
+            if self.banner:
+                os.write(self._master, BANNER)
+            period = 1.0 / (self.fs * self.speed)
+            t0 = time.perf_counter()
+            k = 0  # Số mẫu đã đến lượt phát (kể cả mẫu bị bỏ)
+            leads_off_left = 0
+            while not self._stop.is_set():
+                for start in range(0, len(self.data), self.burst):
+                    rows = self.data[start:start + self.burst]
+                    k += len(rows)
+                    # Chờ tới thời điểm mẫu cuối cùng của gói được "đo"
+                    delay = t0 + k * period - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    if self._stop.is_set():
+                        return
+
+                    chunk = []
+                    n_lines = 0
+                    for ecg, red, ir in rows:
+                        r = self._rng.random(3)
+                        if leads_off_left == 0 and r[0] < self.leads_off_rate:
+                            leads_off_left = self.leads_off_samples
+                        if leads_off_left:
+                            leads_off_left -= 1
+                            ecg = 0
+                            self.leads_off += 1
+                        if r[1] < self.garbage_rate:
+                            chunk.append(_garbage(self._rng))
+                            self.garbage += 1
+                        if r[2] < self.drop_rate:
+                            self.dropped += 1
+                            continue
+                        chunk.append(b"%d,%d,%d\r\n" % (ecg, red, ir))
+                        n_lines += 1
+                    # Ghi thời điểm trước khi gửi để bên đọc luôn thấy đủ sent_times
+                    t_sent = time.perf_counter()
+                    with self._sent_lock:
+                        self.sent_offset += max(0, len(self.sent_times) + n_lines - self.sent_times.maxlen)
+                        self.sent_times.extend([t_sent] * n_lines)
+                    self.sent += n_lines
+                    if chunk:
+                        os.write(self._master, b''.join(chunk))
+                if not self.loop:
+                    break
+        except OSError:
+            # pty đã bị đóng (stop())
+            pass
+        finally:
+            self.finished.set()
+
+
+def _set_raw(fd):
+    """Đặt pty ở chế độ raw (không echo, không đổi '\\n' -> '\\r\\n')."""
+    import tty
+    tty.setraw(fd)
+
+
+def _garbage(rng):
+    """Sinh vài byte rác: ký tự '!' như khi tuột dây hoặc byte ngẫu nhiên."""
+    if rng.random() < 0.5:
+        return b'!'
+    return rng.integers(0, 256, size=int(rng.integers(1, 8)), dtype=np.uint8).tobytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ESP32 ảo: phát file CSV qua cổng Serial ảo (pty).")
+    parser.add_argument('file', help="File CSV (vd: ../csv/data2.csv)")
+    parser.add_argument('--fs', type=int, default=100, help="Tần số lấy mẫu (Hz)")
+    parser.add_argument('--speed', type=float, default=1.0, help="Tốc độ so với thời gian thực (1-100)")
+    parser.add_argument('--drop', type=float, default=0.0, help="Xác suất mất dòng")
+    parser.add_argument('--garbage', type=float, default=0.0, help="Xác suất chèn byte rác")
+    parser.add_argument('--leads-off', type=float, default=0.0, help="Xác suất bắt đầu đoạn tuột dây ECG")
+    parser.add_argument('--leads-off-duration', type=float, default=1.0, help="Độ dài đoạn tuột dây (giây)")
+    parser.add_argument('--burst', type=int, default=1, help="Số dòng gửi gộp mỗi lần ghi")
+    parser.add_argument('--loop', action='store_true', help="Phát lặp lại")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    sim = VirtualESP32(args.file, fs=args.fs, speed=args.speed, drop_rate=args.drop,
+                       garbage_rate=args.garbage, leads_off_rate=args.leads_off,
+                       leads_off_duration=args.leads_off_duration, burst=args.burst,
+                       loop=args.loop, seed=args.seed)
+    print(f"-> ESP32 ảo đang phát '{args.file}' tại {sim.port} ({args.speed:g}x). Ctrl+C để dừng.")
+    sim.start()
+    try:
+        while not sim.wait(1.0):
+            pass
+        print("-> Đã phát hết dữ liệu.")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+        print(f"-> Đã gửi {sim.sent} dòng (bỏ {sim.dropped}, rác {sim.garbage}, tuột dây {sim.leads_off} mẫu).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import numpy as np
+from scipy.signal import lfilter, lfilter_zi, sosfilt_zi
+
+from Notch import RealTimeNotchFilter
+from BandPass_filter import RealTimeBandpassFilter
+from SOS_filter import RealTimeSOSFilter, sosfilt_inplace
+
+
+class FilterBank:
+    def __init__(self):
+        """
+        Bộ lọc nhiều kênh (Filter Bank) xử lý cả khối dữ liệu 2 chiều.
+
+        Mỗi kênh có một chuỗi bộ lọc riêng (vd: Notch -> Bandpass cho ECG,
+        Bandpass -> đảo dấu cho PPG) và một hệ số nhân (gain) ở cuối chuỗi.
+        Các kênh có cùng chuỗi hệ số được gom thành một nhóm và lọc chung
+        bằng một lần gọi lfilter/sosfilt, nên thêm kênh mới
+        (cảm biến PPG thứ 2, thêm đạo trình ECG) gần như không tốn thêm chi phí.
+        """
+        self.names = []
+        self.gains = np.empty(0)
+        # Mỗi nhóm: {'cols': chỉ số cột, 'coeffs': [hệ số, ...], 'zi': [zi, ...]}
+        # Hệ số của một bước là (b, a) cho lfilter hoặc mảng sos cho sosfilt
+        self._groups = []
+
+    @property
+    def n_channels(self):
+        return len(self.names)
+
+    def add_channel(self, name, stages, gain=1.0):
+        """
+        Thêm một kênh vào bộ lọc.
+
+        Tham số:
+        - name (str): Tên kênh (vd: 'ecg', 'ir', 'red').
+        - stages (list): Các bộ lọc theo thứ tự xử lý. Mỗi phần tử là một đối
+                         tượng có thuộc tính b, a, zi (RealTimeNotchFilter,
+                         RealTimeBandpassFilter) hoặc sos, zi (RealTimeSOSFilter).
+                         Trạng thái zi hiện tại của đối tượng được sao chép
+                         làm trạng thái ban đầu.
+        - gain (float): Hệ số nhân sau cùng (vd: 2 cho ECG, -1 để đảo dấu PPG).
+
+        Trả về: chỉ số cột của kênh trong khối dữ liệu.
+        """
+        coeffs = [_stage_coeffs(s) for s in stages]
+        states = [np.asarray(s.zi, dtype=np.float64) for s in stages]
+        col = len(self.names)
+
+        group = self._find_group(coeffs)
+        if group is None:
+            group = {'cols': [], 'coeffs': coeffs, 'zi': [np.empty((0,) + z.shape) for z in states]}
+            self._groups.append(group)
+        group['cols'].append(col)
+        # Trục đầu tiên của zi là trục kênh: nhóm được lọc ở dạng (n_channels, n_samples)
+        group['zi'] = [np.concatenate((zi, z[None])) for zi, z in zip(group['zi'], states)]
+
+        self.names.append(name)
+        self.gains = np.append(self.gains, float(gain))
+        return col
+
+    def _find_group(self, coeffs):
+        """Tìm nhóm có cùng chuỗi hệ số."""
+        for group in self._groups:
+            if len(group['coeffs']) != len(coeffs):
+                continue
+            if all(_same_coeffs(c0, c1) for c0, c1 in zip(group['coeffs'], coeffs)):
+                return group
+        return None
+
+    def channel_index(self, name):
+        """Trả về chỉ số cột của kênh theo tên."""
+        return self.names.index(name)
+
+    def process(self, block):
+        """
+        Lọc một khối dữ liệu có dạng (n_samples, n_channels).
+        Trạng thái được giữ giữa các lần gọi (giống filter_block của từng bộ lọc).
+
+        Input: mảng 2 chiều (hoặc list các hàng), thứ tự cột theo add_channel.
+        Output: Numpy array (n_samples, n_channels) đã lọc và nhân gain.
+        """
+        x = np.asarray(block, dtype=np.float64)
+        if x.ndim == 1:
+            x = x.reshape(-1, self.n_channels)
+        if x.shape[1] != self.n_channels:
+            raise ValueError(f"Khối dữ liệu có {x.shape[1]} cột, bộ lọc có {self.n_channels} kênh")
+
+        out = np.empty_like(x)
+        if x.shape[0] == 0:
+            return out
+
+        for group in self._groups:
+            # Mỗi kênh là một hàng liên tục trong bộ nhớ (bản sao, có thể ghi đè)
+            y = np.ascontiguousarray(x[:, group['cols']].T)
+            for i, c in enumerate(group['coeffs']):
+                if isinstance(c, tuple):
+                    y, group['zi'][i] = lfilter(c[0], c[1], y, axis=-1, zi=group['zi'][i])
+                else:
+                    sosfilt_inplace(c, y, group['zi'][i])
+            out[:, group['cols']] = y.T
+
+        out *= self.gains
+        return out
+
+    def reset(self):
+        """Reset trạng thái tất cả các kênh về ban đầu (lfilter_zi / sosfilt_zi)."""
+        for group in self._groups:
+            n = len(group['cols'])
+            group['zi'] = [np.repeat(_initial_zi(c)[None], n, axis=0) for c in group['coeffs']]
+
+
+def _stage_coeffs(stage):
+    """Lấy hệ số của một bước lọc: mảng sos hoặc tuple (b, a)."""
+    if hasattr(stage, 'sos'):
+        return np.ascontiguousarray(stage.sos, dtype=np.float64)
+    return (np.asarray(stage.b, dtype=np.float64), np.asarray(stage.a, dtype=np.float64))
+
+
+def _same_coeffs(c0, c1):
+    if isinstance(c0, tuple) != isinstance(c1, tuple):
+        return False
+    if isinstance(c0, tuple):
+        return np.array_equal(c0[0], c1[0]) and np.array_equal(c0[1], c1[1])
+    return np.array_equal(c0, c1)
+
+
+def _initial_zi(coeffs):
+    if isinstance(coeffs, tuple):
+        return lfilter_zi(*coeffs)
+    return sosfilt_zi(coeffs)
+
+
+def create_vital_signs_bank(fs=100, use_sos=False, ecg_gain=2.0, ppg_gain=-1.0):
+    """
+    Tạo bộ lọc chuẩn cho 3 kênh ECG, IR, RED (đúng thứ tự cột Serial).
+    - ECG: Notch 50Hz -> Bandpass 0.5-40Hz, nhân 2 để tăng biên độ hiển thị.
+    - IR, RED: Bandpass 0.5-12Hz, đảo dấu (tín hiệu hấp thụ quang học ngược pha).
+
+    use_sos=True: dùng dạng Second-Order Sections, Notch và Bandpass của ECG
+    được ghép thành một chuỗi duy nhất (một lần sosfilt thay vì hai lần lfilter).
+    Kết quả khớp dạng (b, a) trong sai số làm tròn, nhưng ổn định ở bậc cao.
+
+    ecg_gain, ppg_gain: Hệ số nhân sau lọc (mặc định x2 cho ECG, đảo dấu cho PPG).
+    """
+    notch_ecg = RealTimeNotchFilter(fs=fs, freq=50.0, Q=30.0)
+    bandpass_ecg = RealTimeBandpassFilter(lowcut=0.5, highcut=40.0, fs=fs, order=2)
+    bandpass_ir = RealTimeBandpassFilter(lowcut=0.5, highcut=12.0, fs=fs, order=2)
+    bandpass_red = RealTimeBandpassFilter(lowcut=0.5, highcut=12.0, fs=fs, order=2)
+
+    bank = FilterBank()
+    if use_sos:
+        bank.add_channel('ecg', [RealTimeSOSFilter.cascade(notch_ecg, bandpass_ecg)], gain=ecg_gain)
+        bank.add_channel('ir', [RealTimeSOSFilter(bandpass_ir.to_sos())], gain=ppg_gain)
+        bank.add_channel('red', [RealTimeSOSFilter(bandpass_red.to_sos())], gain=ppg_gain)
+    else:
+        bank.add_channel('ecg', [notch_ecg, bandpass_ecg], gain=ecg_gain)
+        bank.add_channel('ir', [bandpass_ir], gain=ppg_gain)
+        bank.add_channel('red', [bandpass_red], gain=ppg_gain)
+    return bank
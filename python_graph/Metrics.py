@@ -0,0 +1,308 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+# Ngưỡng (giây) của histogram thời gian: 50 µs (tách dòng một khối nhỏ) tới 1 s (frame bị treo)
+TIME_BUCKETS = (5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+PORT = 9871  # Cổng HTTP mặc định của /metrics (9870 là cổng UDP của tầng 'network')
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, fn=None):
+        """
+        Bộ đếm chỉ tăng. fn: hàm trả về giá trị khi đọc, dùng cho các bộ đếm sẵn có
+        (LineParser.malformed, BoundedQueue.dropped...) nên đường xử lý không tốn thêm gì.
+        """
+        self.fn = fn
+        self.count = 0
+
+    def inc(self, n=1):
+        self.count += n
+
+    def get(self):
+        return self.fn() if self.fn is not None else self.count
+
+    def state(self):
+        return self.get()
+
+    def load(self, state):
+        self.fn = None
+        self.count = state
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value):
+        self.count = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, buckets=TIME_BUCKETS):
+        """
+        Histogram theo ngưỡng cố định (kiểu Prometheus): observe() chỉ là một lần
+        bisect và ba phép cộng, không cấp phát bộ nhớ. Phân vị được ước lượng từ các ô
+        (nội suy tuyến tính trong ô), đủ để thấy tầng nào chậm dần trong cả ca đo.
+        """
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)  # Ô cuối: lớn hơn ngưỡng lớn nhất
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Ước lượng phân vị q (0-1), None nếu chưa có giá trị nào."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                low = self.bounds[i - 1] if i else 0.0
+                return low + (self.bounds[i] - low) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+    def get(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+    def state(self):
+        return self.bounds, list(self.counts), self.sum, self.count
+
+    def load(self, state):
+        bounds, counts, total, count = state
+        self.bounds, self.counts, self.sum, self.count = tuple(bounds), list(counts), total, count
+
+
+KINDS = {cls.kind: cls for cls in (Counter, Gauge, Histogram)}
+
+
+def _format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class Registry:
+    def __init__(self):
+        """
+        Tập các số đo của một tiến trình. Tắt đo đạc = không tạo Registry: các lớp nhận
+        tham số metrics=None (BlockPipeline, AcquisitionPipeline, LiveRenderer...) chạy
+        đúng đường xử lý cũ, không gọi perf_counter() thêm lần nào.
+
+        Các số đo được ghi từ nhiều luồng (đọc, DSP, vẽ) và đọc từ luồng HTTP không
+        khóa: mỗi số đo chỉ có một luồng ghi, bên đọc có thể thấy 'count' và 'sum' của
+        histogram lệch nhau một lần observe(), chấp nhận được cho theo dõi.
+        """
+        self.started = time.time()
+        self._families = {}   # tên -> (loại, mô tả, {nhãn: số đo})
+        self._lock = threading.Lock()
+        self._collectors = []
+        self.gauge('vitals_uptime_seconds', "Thời gian chạy của tiến trình", fn=lambda: time.time() - self.started)
+
+    def _get(self, kind, name, help, labels, fn=None, **kwargs):
+        labels = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            family = self._families.setdefault(name, (kind, help, {}))
+            if family[0] != kind:
+                raise ValueError(f"'{name}' đã được đăng ký là {family[0]}")
+            metric = family[2].get(labels)
+            if metric is None:
+                metric = family[2][labels] = KINDS[kind](**kwargs)
+            if fn is not None:
+                metric.fn = fn
+            return metric
+
+    def counter(self, name, help='', labels=None, fn=None):
+        """Bộ đếm (tên nên kết thúc bằng '_total'), tạo mới hoặc trả lại cái đã có."""
+        return self._get('counter', name, help, labels, fn=fn)
+
+    def gauge(self, name, help='', labels=None, fn=None):
+        return self._get('gauge', name, help, labels, fn=fn)
+
+    def histogram(self, name, help='', labels=None, buckets=TIME_BUCKETS):
+        return self._get('histogram', name, help, labels, buckets=buckets)
+
+    def add_collector(self, fn):
+        """fn() được gọi trước mỗi lần đọc số đo (vd: nạp số đo gửi về từ tiến trình khác)."""
+        self._collectors.append(fn)
+
+    def _items(self):
+        for fn in self._collectors:
+            fn()
+        with self._lock:
+            return [(name, kind, help, list(series.items())) for name, (kind, help, series) in self._families.items()]
+
+    def prometheus(self):
+        """Mọi số đo theo định dạng văn bản của Prometheus (text/plain; version=0.0.4)."""
+        lines = []
+        for name, kind, help, series in self._items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in series:
+                if kind == 'histogram':
+                    total = 0
+                    for bound, n in zip(metric.bounds + (float('inf'),), metric.counts):
+                        total += n
+                        lines.append(f"{name}_bucket{_format_labels(labels, le=_format_value(bound))} {total}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(metric.sum)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+                    continue
+                value = metric.get()
+                if value is not None:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """
+        Ảnh chụp dạng dict (ghi JSON được): 'time' (Unix), 'metrics' với khóa kiểu
+        Prometheus 'tên{nhãn="giá trị"}'. Histogram gồm count, sum, mean, p50, p95, p99 (giây).
+        """
+        metrics = {}
+        for name, kind, help, series in self._items():
+            for labels, metric in series:
+                metrics[name + _format_labels(labels)] = metric.get()
+        return {'time': time.time(), 'metrics': metrics}
+
+    def state(self):
+        """Giá trị thô của mọi số đo (pickle được), để gửi từ tiến trình DSP về tiến trình chính."""
+        return [(name, kind, help, labels, metric.state())
+                for name, kind, help, series in self._items() if name != 'vitals_uptime_seconds'
+                for labels, metric in series]
+
+    def load_state(self, state):
+        """Ghi đè các số đo bằng state() của Registry khác (tiến trình DSP là nơi ghi duy nhất)."""
+        for name, kind, help, labels, value in state:
+            self._get(kind, name, help, dict(labels)).load(value)
+
+
+class MetricsServer:
+    def __init__(self, registry, host='127.0.0.1', port=PORT):
+        """
+        HTTP trên localhost cho Prometheus: GET /metrics (định dạng văn bản) và
+        GET /metrics.json (Registry.snapshot()). Chạy ở luồng nền riêng, mỗi lần lấy
+        số liệu chỉ đọc các số đo, không chạm vào dữ liệu tín hiệu.
+
+        Tham số:
+        - host: Mặc định chỉ nghe trên 127.0.0.1 (đặt '0.0.0.0' để máy khác lấy được).
+        - port (int): 0 = chọn cổng trống (xem thuộc tính 'port' sau start()).
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/metrics':
+                    body = registry.prometheus().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif path == '/metrics.json':
+                    body = json.dumps(registry.snapshot()).encode('utf-8')
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Không in một dòng cho mỗi lần Prometheus lấy số liệu
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class SnapshotWriter:
+    def __init__(self, registry, path='metrics_%Y%m%d_%H%M%S.jsonl', interval=10.0):
+        """
+        Ghi Registry.snapshot() ra file mỗi 'interval' giây ở luồng nền, và một lần cuối khi stop().
+        'path' được đưa qua time.strftime.
+        - '.jsonl': thêm một dòng JSON mỗi lần (lịch sử cả ca đo, đọc lại bằng pandas.read_json(lines=True)).
+        - Đuôi khác: ghi đè nguyên tử (file tạm + os.replace), luôn là ảnh chụp mới nhất.
+        """
+        self.registry = registry
+        self.path = time.strftime(path)
+        self.interval = interval
+        self.append = self.path.endswith('.jsonl')
+        self.written = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self):
+        line = json.dumps(self.registry.snapshot())
+        if self.append:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        else:
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(line)
+            os.replace(tmp, self.path)
+        self.written += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self.write()
@@ -0,0 +1,321 @@
+import argparse
+import time
+
+import numpy as np
+
+from Acquisition_pipeline import AcquisitionPipeline
+from Block_pipeline import load_config, merge_config, open_source
+
+# Số frame giữa hai lần cập nhật: dòng tần số lấy mẫu, tự co giãn trục Y,
+# chữ "Analyzing...", thời gian đã phát
+RATE_EVERY = 50
+AUTOSCALE_EVERY = 10
+STATUS_EVERY = 30
+ELAPSED_EVERY = 10
+
+
+def _source_name(spec):
+    return spec.get('port') or spec.get('path') or spec.get('type', '')
+
+
+def display_size(config):
+    """Số mẫu hiển thị: 'display_size' hoặc fs * 'display_seconds' (mặc định = window_size)."""
+    if config.get('display_size'):
+        return int(config['display_size'])
+    if config.get('display_seconds'):
+        return int(config['fs'] * config['display_seconds'])
+    return config['window_size']
+
+
+def plot_layout(config):
+    """Bố cục đồ thị của tầng 'plot' (None nếu cấu hình không vẽ)."""
+    for spec in config['stages']:
+        if spec.get('type') == 'plot':
+            return {k: v for k, v in spec.items() if k != 'type'}
+    return None
+
+
+def status_text(data, elapsed=None):
+    """Dòng BPM/SpO2 (kèm ECG HR, PTT nếu có) và màu tương ứng, từ ảnh chụp của DSP."""
+    result = data['result']
+    prefix = f"Time: {elapsed:.1f}s | " if elapsed is not None else ""
+    if result['status'] != "Success":
+        return f"{prefix}Analyzing... ({result['status']})", 'orange'
+    text = f"{prefix}BPM: {result['bpm']} | SpO2: {result['spo2']}%"
+    if data.get('ecg_bpm') is not None:
+        text += f" | ECG HR: {data['ecg_bpm']:.0f}"
+    ptt = data.get('ptt')
+    if ptt is not None and np.isfinite(ptt['ir_foot']):
+        text += f" | PTT: {ptt['ir_foot'] * 1e3:.0f} ms"
+    return text, 'green' if result['spo2'] > 94 else 'red'
+
+
+class PlotWindow:
+    def __init__(self, layout, pipeline, ingest, fs, n_points, source_name='', analyzer=True):
+        """
+        Cửa sổ vẽ của tầng 'plot' (LiveRenderer, blitting): mỗi panel là một kênh của
+        bộ đệm hiển thị, cùng dòng BPM/SpO2 và dòng tần số lấy mẫu đo được.
+
+        Khóa của layout (đều tùy chọn):
+        - window_title: Tiêu đề cửa sổ, '{source}' được thay bằng cổng/tên file.
+        - figsize, hspace, interval (ms), sharex, xlabel.
+        - seconds_axis (bool): Nhãn trục X theo giây thay vì chỉ số mẫu.
+        - panels: [{channel, title, ylabel, ylim, color, linewidth, label, legend, autoscale}]
+        - status: {panel, text, fontsize, color, elapsed} dòng BPM/SpO2 (elapsed: kèm thời
+                  gian đã phát, cho nguồn phát lại). Chỉ có khi analyzer=True (chuỗi có 'ppg_analyzer').
+        - rate: {panel} dòng tần số lấy mẫu (khi nguồn là MonitoredIngest).
+        """
+        import matplotlib.pyplot as plt
+        import matplotlib.ticker as ticker
+        from Renderer import LiveRenderer
+
+        self.pipeline = pipeline
+        self.ingest = ingest
+        self.fs = fs
+        panels = layout.get('panels') or [{'channel': 'ecg'}, {'channel': 'red'}, {'channel': 'ir'}]
+        fig, axes = plt.subplots(len(panels), 1, figsize=tuple(layout.get('figsize', (10, 8))),
+                                 sharex=layout.get('sharex', True), squeeze=False)
+        self.axes = axes = axes[:, 0]
+        plt.subplots_adjust(hspace=layout.get('hspace', 0.3))
+        fig.canvas.manager.set_window_title(layout.get('window_title', '{source}').format(source=source_name))
+        self.renderer = LiveRenderer(fig, interval=layout.get('interval', 20), metrics=pipeline.metrics)
+
+        self.lines = []
+        self.autoscale = []
+        for ax, panel in zip(axes, panels):
+            style = {k: panel[k] for k in ('color', 'linewidth', 'label') if k in panel}
+            self.lines.append((self.renderer.add_line(ax, n_points, **style), panel['channel']))
+            if panel.get('title'):
+                ax.set_title(panel['title'], fontweight='bold')
+            if panel.get('ylabel'):
+                ax.set_ylabel(panel['ylabel'])
+            if panel.get('ylim'):
+                ax.set_ylim(*panel['ylim'])
+            if panel.get('legend'):
+                ax.legend(loc='upper right')
+            ax.grid(True, linestyle=':', alpha=0.6)
+            if panel.get('autoscale'):
+                self.autoscale.append((ax, panel['channel']))
+        if layout.get('seconds_axis', True):
+            step = fs * max(1, n_points // fs // 10)
+            for ax in axes:
+                ax.xaxis.set_major_locator(ticker.MultipleLocator(step))
+                ax.xaxis.set_major_formatter(ticker.FuncFormatter(lambda x, pos: f"{int(x / fs)}"))
+        if layout.get('xlabel'):
+            axes[-1].set_xlabel(layout['xlabel'])
+
+        status = layout.get('status', {})
+        self.status = None
+        if analyzer:
+            style = {k: status[k] for k in ('fontsize',) if k in status}
+            self.status = self.renderer.add_text(axes[status.get('panel', -1)], status.get('text', "Waiting..."),
+                                                 color=status.get('color', 'gray'), **style)
+        self.show_elapsed = status.get('elapsed', False)
+        self.rate = None
+        if 'rate' in layout and hasattr(ingest, 'stats'):
+            self.rate = self.renderer.add_text(axes[layout['rate'].get('panel', 0)], "", x=0.99, ha='right',
+                                               fontsize=9, color='gray')
+        self.frames = 0
+        self.last_beats = 0
+        self.finished_shown = False
+
+    def update(self):
+        self.frames += 1
+        renderer = self.renderer
+
+        # Tần số lấy mẫu đo được (cập nhật mỗi giây), đỏ khi lệch quá 2% hoặc có mất mẫu
+        if self.rate is not None and self.frames % RATE_EVERY == 0:
+            rate = self.ingest.stats()
+            bad = abs(rate['rate'] / self.fs - 1) > 0.02 or rate['lost']
+            renderer.set_text(self.rate, f"Fs: {rate['rate']:.1f} Hz | mất {rate['lost']} mẫu",
+                              color='red' if bad else 'gray')
+
+        # Chỉ lấy ảnh chụp mới nhất do luồng DSP tạo ra (không đọc nguồn, không lọc ở đây)
+        data = self.pipeline.latest_frame()
+        if data is None:
+            if getattr(self.ingest, 'finished', False) and self.status is not None and not self.finished_shown:
+                self.finished_shown = True
+                renderer.set_text(self.status, "PLAYBACK FINISHED", color='gray')
+            return
+
+        for line, channel in self.lines:
+            renderer.set_line(line, data[channel])
+
+        # Tự co giãn trục Y mỗi vài frame (tránh vẽ lại toàn bộ hình liên tục)
+        if self.autoscale and self.frames % AUTOSCALE_EVERY == 0:
+            for ax, channel in self.autoscale:
+                y = data[channel]
+                mn, mx = float(y.min()), float(y.max())
+                if mx - mn > 10:  # Chỉ scale nếu có tín hiệu thực
+                    renderer.set_ylim(ax, mn - (mx - mn) * 0.2, mx + (mx - mn) * 0.2)
+
+        # SpO2/BPM được cập nhật khi nạp mẫu, chỉ hiển thị lại khi có nhịp mới
+        # (trạng thái lỗi vẫn hiển thị định kỳ)
+        if self.status is not None:
+            success = data['result']['status'] == "Success"
+            elapsed = getattr(self.ingest, 'elapsed', None) if self.show_elapsed else None
+            if (data['beats'] != self.last_beats if success else self.frames % STATUS_EVERY == 0) \
+                    or (elapsed is not None and self.frames % ELAPSED_EVERY == 0):
+                renderer.set_text(self.status, *status_text(data, elapsed))
+            self.last_beats = data['beats']
+
+
+def print_stats(pipeline):
+    stats = pipeline.stats()
+    print(f"-> Đã nhận {stats['lines']} dòng (bỏ qua {stats['malformed']} dòng lỗi), "
+          f"bỏ {stats['raw']['dropped']} khối thô do DSP chậm, hàng đợi sâu nhất {stats['raw']['max_depth']}.")
+    rate = stats['rate']
+    if rate is not None:
+        print(f"-> Tần số đo được {rate['rate']:.2f} Hz (lệch {rate['drift_ppm']:+.0f} ppm), mất {rate['lost']} mẫu "
+              f"trong {rate['gaps']} lần, bỏ {rate['duplicates']} dòng lặp.")
+
+
+def run(config, **overrides):
+    """
+    Chạy một pipeline khai báo trong file cấu hình: nguồn -> các tầng (luồng/tiến trình
+    DSP của AcquisitionPipeline) -> cửa sổ vẽ nếu chuỗi có tầng 'plot', ngược lại in
+    kết quả mỗi giây cho tới Ctrl+C, hết bản ghi hoặc hết 'duration' giây (khóa cấp cao
+    nhất của cấu hình, chỉ dùng khi không vẽ).
+
+    Khóa 'metrics' (tùy chọn) bật đo đạc (Metrics.py), không có khóa này thì không đo gì:
+    {'port': 9871, 'host': '127.0.0.1', 'json': 'metrics_%Y%m%d.jsonl', 'interval': 10}
+    - port: HTTP /metrics cho Prometheus (None = không mở cổng).
+    - json, interval: Ghi ảnh chụp số đo ra file mỗi 'interval' giây (xem Metrics.SnapshotWriter).
+
+    Tham số:
+    - config: Tên cấu hình trong configs/ (vd: 'final'), đường dẫn file JSON hoặc dict.
+    - overrides: Ghi đè khóa cấp cao nhất (fs, window_size, display_seconds, dsp_mode...);
+                 source=dict được gộp vào mục 'source' (vd: source={'port': 'COM4'}).
+                 Giá trị None bị bỏ qua.
+    """
+    if not isinstance(config, dict):
+        config = load_config(config)
+    config = merge_config(config, **overrides)
+    fs = config.setdefault('fs', 100)
+    config.setdefault('window_size', 500)
+    source = config['source']
+    name = _source_name(source)
+    t_start = time.perf_counter()
+
+    try:
+        ingest = open_source(source, fs=fs)
+    except FileNotFoundError:
+        print(f"LỖI: Không tìm thấy file '{name}'.")
+        return None
+    except Exception as e:
+        print(f"LỖI: Không thể mở nguồn {name}. Chi tiết: {e}")
+        return None
+    print(f"-> Nguồn dữ liệu: {name}" + (f" ({config['title']})" if config.get('title') else ""))
+
+    n_points = display_size(config)
+    # Thu thập (luồng đọc) -> DSP (các tầng của cấu hình) -> vẽ, nối bằng hàng đợi có giới hạn:
+    # vẽ chậm không làm chậm việc đọc nguồn (xem pipeline.stats())
+    metrics, exporters = start_metrics(config.get('metrics'))
+    pipeline = AcquisitionPipeline(ingest, fs=fs, window_size=config['window_size'],
+                                   dsp_mode=config.get('dsp_mode', 'thread'), display_size=n_points,
+                                   stages=config['stages'], metrics=metrics)
+    layout = plot_layout(config)
+    view = None
+    try:
+        if layout is not None:
+            import matplotlib.pyplot as plt
+            analyzer = any(spec.get('type') == 'ppg_analyzer' for spec in config['stages'])
+            view = PlotWindow(layout, pipeline, ingest, fs, n_points, source_name=name, analyzer=analyzer)
+            _ready(t_start)
+            print("-> Đang vẽ đồ thị... (Đóng cửa sổ đồ thị để dừng)")
+            view.renderer.start(view.update)
+            pipeline.start()
+            plt.show()
+        else:
+            _ready(t_start)
+            pipeline.start()
+            _watch(pipeline, ingest, duration=config.get('duration'))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+        for exporter in exporters:
+            exporter.stop()
+        print_stats(pipeline)
+        ingest.close()
+        if view is not None:
+            frames = view.renderer.frame_stats()
+            print(f"-> Đã vẽ {frames['frames']} frame: trung bình {frames['mean_ms']:.1f} ms, "
+                  f"p95 {frames['p95_ms']:.1f} ms, vẽ lại toàn bộ {frames['full_redraws']} lần.")
+        print("Đã ngắt kết nối.")
+    return pipeline
+
+
+def metrics_override(port=None, json=None):
+    """Giá trị ghi đè khóa 'metrics' từ dòng lệnh (None nếu không bật gì)."""
+    if port is None and json is None:
+        return None
+    return {'port': port, 'json': json}
+
+
+def start_metrics(spec):
+    """Tạo Registry và các đầu ra (HTTP, file JSON) theo khóa 'metrics' của cấu hình. Trả về (registry, [đầu ra])."""
+    if not spec:
+        return None, []
+    from Metrics import PORT, MetricsServer, Registry, SnapshotWriter
+    registry = Registry()
+    exporters = []
+    if spec.get('port', PORT) is not None:
+        server = MetricsServer(registry, host=spec.get('host', '127.0.0.1'), port=spec.get('port', PORT)).start()
+        exporters.append(server)
+        print(f"-> Số đo cho Prometheus: {server.url}")
+    if spec.get('json'):
+        writer = SnapshotWriter(registry, spec['json'], interval=spec.get('interval', 10.0)).start()
+        exporters.append(writer)
+        print(f"-> Ghi số đo vào {writer.path} mỗi {writer.interval:g} giây")
+    return registry, exporters
+
+
+def _ready(t_start):
+    # Nguồn đã có dữ liệu, mọi tầng đã tạo (benchmark_startup.py chờ dòng này)
+    print(f"-> Sẵn sàng sau {(time.perf_counter() - t_start) * 1e3:.0f} ms", flush=True)
+
+
+def _watch(pipeline, ingest, interval=1.0, duration=None):
+    """Không vẽ: in kết quả mới nhất mỗi 'interval' giây."""
+    deadline = None if duration is None else time.perf_counter() + duration
+    while not getattr(ingest, 'finished', False):
+        wait = interval
+        if deadline is not None:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            wait = min(interval, remaining)
+        time.sleep(wait)
+        data = pipeline.latest_frame()
+        if data is None:
+            continue
+        line = f"{data['n_samples']:>8} mẫu"
+        if 'result' in data:
+            line += " | " + status_text(data)[0]
+        if 'recorded' in data:
+            line += f" | đã ghi {data['recorded']} mẫu"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy pipeline ECG/PPG theo file cấu hình (configs/*.json).")
+    parser.add_argument('config', help="Tên cấu hình có sẵn (final, final_csv, final_csv_raw, ecg, ppg, record) "
+                                       "hoặc đường dẫn file JSON")
+    parser.add_argument('--port', default=None, help="Cổng Serial (nguồn 'serial')")
+    parser.add_argument('--file', default=None, help="File CSV/.rec (nguồn 'playback')")
+    parser.add_argument('--seek', type=float, default=None, help="Phát lại từ giây thứ")
+    parser.add_argument('--duration', type=float, default=None, help="Chỉ phát bấy nhiêu giây")
+    parser.add_argument('--dsp-mode', choices=('thread', 'process'), default=None)
+    parser.add_argument('--display-seconds', type=float, default=None, help="Độ dài hiển thị (giây)")
+    parser.add_argument('--metrics-port', type=int, default=None, help="Bật đo đạc, HTTP /metrics trên cổng này")
+    parser.add_argument('--metrics-json', default=None, help="Bật đo đạc, ghi số đo ra file này (.jsonl: cả ca)")
+    args = parser.parse_args()
+
+    run(args.config, dsp_mode=args.dsp_mode, display_seconds=args.display_seconds,
+        metrics=metrics_override(args.metrics_port, args.metrics_json),
+        source={'port': args.port, 'path': args.file, 'seek': args.seek, 'duration': args.duration})
+
+
+if __name__ == "__main__":
+    main()
@@ -40,6 +40,19 @@ class RealTimeNotchFilter:
         filtered_val, self.zi = signal.lfilter(self.b, self.a, [sample_val], zi=self.zi)
         return filtered_val[0]
 
+    def filter_block(self, samples):
+        """
+        Lọc một khối nhiều mẫu liên tiếp (Block processing có trạng thái).
+        Khác với apply(): trạng thái zi được lưu lại sau mỗi lần gọi,
+        nên kết quả giống hệt việc gọi process_sample() cho từng mẫu.
+        Dùng cho vòng lặp đọc hết bộ đệm Serial trong mỗi frame.
+        """
+        x = np.asarray(samples, dtype=np.float64)
+        if x.size == 0:
+            return x
+        filtered_data, self.zi = signal.lfilter(self.b, self.a, x, zi=self.zi)
+        return filtered_data
+
     def apply(self, data_array):
         """
         Lọc cả một mảng dữ liệu (Block processing).
@@ -48,6 +61,13 @@ class RealTimeNotchFilter:
         filtered_data, _ = signal.lfilter(self.b, self.a, data_array, zi=self.zi * data_array[0])
         return filtered_data
 
+    def to_sos(self):
+        """
+        Xuất bộ lọc dưới dạng Second-Order Sections (1 khâu bậc 2).
+        Dùng để ghép với bộ lọc khác: RealTimeSOSFilter.cascade(notch, bandpass).
+        """
+        return signal.tf2sos(self.b, self.a)
+
     def reset(self):
         """Reset trạng thái bộ lọc về ban đầu"""
         self.zi = signal.lfilter_zi(self.b, self.a)
\ No newline at end of file
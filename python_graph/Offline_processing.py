@@ -0,0 +1,171 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from Filter_bank import create_vital_signs_bank
+from SGS import StreamingSmoother
+from PPG_analyzer import PPGAnalyzer
+from Recording_loader import load_recording
+from Serial_ingest import COL_ECG, COL_IR, COL_RED
+
+# Số mẫu xử lý mỗi lần (bộ nhớ dùng không phụ thuộc độ dài bản ghi)
+BLOCK_SIZE = 8192
+
+
+def segment(n_samples, fs, seek=0.0, duration=None):
+    """
+    Đổi --seek/--duration (giây) thành chỉ số mẫu [start, stop) trong bản ghi n_samples mẫu.
+    """
+    if seek < 0 or (duration is not None and duration <= 0):
+        raise ValueError("seek phải >= 0 và duration phải > 0")
+    start = min(int(round(seek * fs)), n_samples)
+    stop = n_samples if duration is None else min(start + int(round(duration * fs)), n_samples)
+    return start, stop
+
+
+def process_recording(data, fs=100, seek=0.0, duration=None, window=5.0, hop=1.0,
+                      spo2_cal_coeffs=(110, 25), use_sos=False, block_size=BLOCK_SIZE, out=None):
+    """
+    Chạy chuỗi xử lý của Final_csv.py (FilterBank: notch -> bandpass, làm mượt ECG,
+    PPGAnalyzer) trên cả bản ghi, không chờ đồng hồ, không vẽ.
+
+    - Lọc theo từng khối block_size mẫu (trạng thái bộ lọc giữ giữa các khối, kết quả
+      giống hệt khi phát lại theo thời gian thực).
+    - BPM/SpO2 tính theo cửa sổ trượt bằng PPGAnalyzer.analyze_batch trên tín hiệu thô,
+      mỗi khối tính các cửa sổ đã đủ dữ liệu. Kết quả giống hệt analyze() trên từng
+      cửa sổ (và analyze_batch trên cả bản ghi).
+
+    Tham số:
+    - data: Mảng (n, 3) 'ecg, ir, red' (vd: kết quả load_recording, có thể là memmap).
+    - seek, duration (float): Chỉ xử lý đoạn [seek, seek + duration) giây.
+    - window, hop (float): Độ dài cửa sổ và bước tính BPM/SpO2 (giây).
+                           window=5 giống WINDOW_SECONDS của Final_csv.py.
+    - use_sos (bool): Dùng dạng SOS cho bộ lọc (mặc định giống Final_csv.py).
+    - out: Mảng (stop - start, 3) float64 để ghi tín hiệu đã lọc (vd: np.memmap khi
+           bản ghi rất dài). None = tự cấp phát.
+
+    Trả về dict:
+    - 'fs', 'start': Tần số lấy mẫu và chỉ số mẫu đầu đoạn trong bản ghi.
+    - 'filtered': (n, 3) 'ecg, ir, red' đã lọc; ECG đã làm mượt (trễ smoother.delay mẫu
+                  như khi hiển thị).
+    - 'time', 'bpm', 'spo2': Chuỗi kết quả, 'time' là thời điểm cuối mỗi cửa sổ
+                              (giây, tính từ đầu bản ghi). NaN khi không đủ đỉnh.
+    - 'elapsed': Thời gian xử lý (giây).
+    """
+    start, stop = segment(len(data), fs, seek, duration)
+    n = stop - start
+    if out is None:
+        out = np.empty((n, 3), dtype=np.float64)
+    elif out.shape != (n, 3):
+        raise ValueError(f"out phải có dạng ({n}, 3)")
+
+    bank = create_vital_signs_bank(fs=fs, use_sos=use_sos)
+    smoother = StreamingSmoother(window_length=9, polyorder=2, capacity=block_size)
+    analyzer = PPGAnalyzer(fs=fs, spo2_cal_coeffs=spo2_cal_coeffs)
+    w = int(round(window * fs))
+    h = max(int(round(hop * fs)), 1)
+
+    times, bpm, spo2 = [], [], []
+    next_window = start  # Chỉ số mẫu đầu của cửa sổ BPM/SpO2 tiếp theo
+    t0 = time.perf_counter()
+    for pos in range(start, stop, block_size):
+        end = min(pos + block_size, stop)
+        block = data[pos:end]
+        filtered = bank.process(block)
+        smoother.update(filtered[:, COL_ECG])
+        filtered[:, COL_ECG] = smoother.buffer.latest(end - pos)
+        out[pos - start:end - start] = filtered
+
+        # Đỉnh gần hai đầu đoạn tìm đỉnh có thể khác khi tìm trên toàn bộ bản ghi
+        # (điều kiện khoảng cách giữa các đỉnh), nên lấy thêm tối đa một cửa sổ phía
+        # trước làm ngữ cảnh và giữ lại các cửa sổ sát cuối khối cho lần sau
+        margin = 0 if end == stop else w
+        if end - next_window >= w + margin:
+            ctx = min(w, next_window - start) // h * h  # Bội số của bước để giữ lưới cửa sổ
+            seg = data[next_window - ctx:end]
+            r = analyzer.analyze_batch(red_signal=seg[:, COL_RED], ir_signal=seg[:, COL_IR],
+                                       window=window, hop=hop)
+            keep = (r['start'] >= ctx) & (r['start'] + w <= len(seg) - margin)
+            if keep.any():
+                times.append((next_window - ctx + r['start'][keep] + w) / fs)
+                bpm.append(r['bpm'][keep])
+                spo2.append(r['spo2'][keep])
+                next_window += int(r['start'][keep][-1]) - ctx + h
+    elapsed = time.perf_counter() - t0
+
+    def join(parts):
+        return np.concatenate(parts) if parts else np.empty(0)
+
+    return {
+        'fs': fs,
+        'start': start,
+        'filtered': out,
+        'time': join(times),
+        'bpm': join(bpm),
+        'spo2': join(spo2),
+        'elapsed': elapsed,
+    }
+
+
+def save_result(path, result):
+    """Ghi kết quả ra file .npz (đọc lại bằng np.load(path))."""
+    f = result['filtered']
+    np.savez(path, fs=result['fs'], start=result['start'],
+             ecg=f[:, COL_ECG], ir=f[:, COL_IR], red=f[:, COL_RED],
+             time=result['time'], bpm=result['bpm'], spo2=result['spo2'])
+
+
+def run(path, output=None, fs=100, seek=0.0, duration=None, verbose=True, data=None, **kwargs):
+    """
+    Tải bản ghi (CSV/.rec), xử lý headless và ghi ra output (.npz, mặc định cùng tên
+    file gốc). Tín hiệu đã lọc được ghi vào file tạm ánh xạ bộ nhớ nên bộ nhớ dùng
+    không phụ thuộc độ dài bản ghi. Trả về dict kết quả của process_recording
+    (không kèm 'filtered') và 'output'.
+
+    data: Bản ghi đã tải sẵn (bỏ qua bước tải file).
+    """
+    output = output or os.path.splitext(path)[0] + '_processed.npz'
+    if data is None:
+        data = load_recording(path, verbose=verbose)
+    start, stop = segment(len(data), fs, seek, duration)
+
+    folder = os.path.dirname(os.path.abspath(output))
+    with tempfile.TemporaryFile(dir=folder) as tmp:
+        filtered = np.memmap(tmp, mode='w+', dtype=np.float64, shape=(stop - start, 3)) if stop > start else None
+        result = process_recording(data, fs=fs, seek=seek, duration=duration, out=filtered, **kwargs)
+        save_result(output, result)
+    result.pop('filtered')
+    result['output'] = output
+
+    if verbose:
+        n = stop - start
+        rate = n / result['elapsed'] if result['elapsed'] > 0 else float('inf')
+        print(f"-> Đã xử lý {n} mẫu ({n / fs:.1f} giây dữ liệu) trong {result['elapsed']:.2f} giây: "
+              f"{rate:,.0f} mẫu/giây ({rate / fs:,.0f}x thời gian thực)")
+        print(f"-> {len(result['bpm'])} giá trị BPM/SpO2, BPM trung vị "
+              f"{np.nanmedian(result['bpm']) if np.isfinite(result['bpm']).any() else float('nan'):.1f}. "
+              f"Đã ghi {output}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Xử lý bản ghi không giao diện, nhanh nhất có thể (cùng chuỗi lọc với Final_csv.py).")
+    parser.add_argument('file', help="File CSV hoặc .rec")
+    parser.add_argument('-o', '--output', default=None, help="File kết quả .npz")
+    parser.add_argument('--fs', type=int, default=100, help="Tần số lấy mẫu (Hz)")
+    parser.add_argument('--seek', type=float, default=0.0, help="Bắt đầu từ giây thứ")
+    parser.add_argument('--duration', type=float, default=None, help="Chỉ xử lý bấy nhiêu giây")
+    parser.add_argument('--window', type=float, default=5.0, help="Cửa sổ tính BPM/SpO2 (giây)")
+    parser.add_argument('--hop', type=float, default=1.0, help="Bước tính BPM/SpO2 (giây)")
+    args = parser.parse_args()
+
+    run(args.file, args.output, fs=args.fs, seek=args.seek, duration=args.duration,
+        window=args.window, hop=args.hop)
+
+
+if __name__ == "__main__":
+    main()
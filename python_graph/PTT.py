@@ -0,0 +1,232 @@
+import argparse
+import os
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from Filter_bank import create_vital_signs_bank
+from R_peak_detector import StreamingRPeakDetector
+from Recording_loader import load_recording
+from Ring_buffer import RingBuffer
+from Serial_ingest import COL_ECG, COL_IR, COL_RED
+
+# Khoảng tìm điểm dốc nhất của sóng PPG sau đỉnh R (giây)
+SEARCH = (0.1, 0.5)
+# Khoảng tìm đáy sóng (chân) trước điểm dốc nhất (giây)
+FOOT_SEARCH = 0.25
+CHANNELS = (('ir', COL_IR), ('red', COL_RED))
+KEYS = ('r', 'time', 'ir_foot', 'ir_slope', 'red_foot', 'red_slope')
+
+
+def match_beats(r_peaks, ppg, fs, search=SEARCH, foot_search=FOOT_SEARCH, offset=0):
+    """
+    Ghép mỗi đỉnh R với điểm dốc nhất và chân sóng PPG ngay sau nó (vector hóa).
+
+    - Điểm dốc nhất: cực đại cục bộ của đạo hàm PPG (sai phân trung tâm) lớn nhất
+      trong [R + search[0], R + search[1]]. Các cực đại được sắp xếp sẵn theo chỉ số,
+      mỗi đỉnh R chỉ cần 2 lần searchsorted để lấy khoảng ứng viên, cực đại trong
+      khoảng tính bằng np.maximum.reduceat (không có vòng lặp lồng nhau).
+    - Chân sóng: giao của tiếp tuyến tại điểm dốc nhất với đường ngang qua đáy sóng
+      (giá trị nhỏ nhất trong foot_search giây trước điểm dốc nhất), có độ phân giải
+      dưới một mẫu.
+
+    Tham số:
+    - r_peaks (array): Chỉ số mẫu của đỉnh R (tăng dần).
+    - ppg (array): PPG đã lọc, sóng mạch hướng lên (cột IR/RED của FilterBank).
+    - offset (int): Chỉ số mẫu của ppg[0] (khi ppg là một đoạn của tín hiệu dài).
+
+    Trả về (slope, foot): chỉ số mẫu (float, cùng gốc với r_peaks) của điểm dốc nhất
+    và chân sóng cho từng đỉnh R, NaN khi không tìm được trong khoảng.
+    """
+    r = np.asarray(r_peaks, dtype=np.int64) - offset
+    y = np.asarray(ppg, dtype=np.float64)
+    slope = np.full(len(r), np.nan)
+    foot = np.full(len(r), np.nan)
+    if len(r) == 0 or len(y) < 3:
+        return slope, foot
+
+    d = np.zeros_like(y)
+    d[1:-1] = (y[2:] - y[:-2]) / 2
+    # Cực đại cục bộ của đạo hàm, chỉ xét đoạn đi lên (đạo hàm > 0)
+    k = np.flatnonzero((d[1:-1] > d[:-2]) & (d[1:-1] >= d[2:]) & (d[1:-1] > 0)) + 1
+    if len(k) == 0:
+        return slope, foot
+
+    lo = np.searchsorted(k, r + int(round(search[0] * fs)), side='left')
+    hi = np.searchsorted(k, r + int(round(search[1] * fs)), side='right')
+    has = hi > lo
+    if not has.any():
+        return slope, foot
+
+    # Cực đại trong từng khoảng [lo, hi): dùng thứ hạng của giá trị để lấy luôn vị trí
+    order = np.argsort(d[k], kind='stable')
+    rank = np.empty(len(k), dtype=np.int64)
+    rank[order] = np.arange(len(k))
+    bounds = np.column_stack((lo[has], hi[has])).ravel()
+    best = np.maximum.reduceat(np.append(rank, -1), bounds)[::2]
+    m = k[order[best]]
+    slope[has] = m + offset
+
+    # Chân sóng: đáy trong [m - L, m], tiếp tuyến tại m cắt đường ngang qua đáy
+    L = max(int(round(foot_search * fs)), 1)
+    ok = m >= L
+    if ok.any():
+        mm = m[ok]
+        windows = sliding_window_view(y, L + 1)[mm - L]
+        i_min = windows.argmin(axis=1)
+        y_min = windows[np.arange(len(mm)), i_min]
+        t = mm - (y[mm] - y_min) / d[mm]
+        t = np.clip(t, mm - L + i_min, mm)
+        f = np.full(len(m), np.nan)
+        f[ok] = t + offset
+        foot[has] = f
+    return slope, foot
+
+
+def _beats(r_peaks, filtered, fs, search, foot_search, offset=0):
+    """Kết quả cho các đỉnh R: dict các mảng theo KEYS (độ trễ tính bằng giây)."""
+    r = np.asarray(r_peaks, dtype=np.int64)
+    out = {'r': r, 'time': r / fs}
+    for name, col in CHANNELS:
+        slope, foot = match_beats(r, filtered[:, col], fs, search, foot_search, offset)
+        out[f'{name}_foot'] = (foot - r) / fs
+        out[f'{name}_slope'] = (slope - r) / fs
+    return out
+
+
+def ptt_batch(data, fs=100, search=SEARCH, foot_search=FOOT_SEARCH):
+    """
+    Thời gian truyền sóng mạch (PTT/PAT) theo từng nhịp cho cả bản ghi.
+
+    Lọc bằng FilterBank của Final.py (ECG: Notch -> Bandpass, PPG: Bandpass, đảo
+    dấu), tìm đỉnh R bằng StreamingRPeakDetector trên cả bản ghi, rồi ghép với PPG
+    bằng match_beats (vector hóa).
+
+    Lưu ý: bộ lọc PPG (0.5-12Hz) trễ nhóm nhiều hơn bộ lọc ECG (0.5-40Hz) vài chục ms
+    ở tần số sóng mạch, nên giá trị tuyệt đối lệch một hằng số; xu hướng theo thời
+    gian và so sánh giữa các bản ghi cùng fs không bị ảnh hưởng.
+
+    Tham số:
+    - data: Mảng (n, 3) 'ecg, ir, red' thô (vd: load_recording).
+    - search (tuple): Khoảng tìm điểm dốc nhất sau đỉnh R (giây).
+    - foot_search (float): Khoảng tìm đáy trước điểm dốc nhất (giây).
+
+    Trả về dict các Numpy array (một phần tử mỗi nhịp):
+    - 'r': Chỉ số mẫu đỉnh R, 'time': thời điểm đỉnh R (giây).
+    - 'ir_foot', 'red_foot': R -> chân sóng PPG (giây).
+    - 'ir_slope', 'red_slope': R -> điểm dốc nhất của PPG (giây).
+      NaN khi không tìm được sóng PPG trong khoảng tìm.
+    """
+    filtered = create_vital_signs_bank(fs=fs, use_sos=True).process(data)
+    r = StreamingRPeakDetector(fs=fs).update(filtered[:, COL_ECG])
+    return _beats(r, filtered, fs, search, foot_search)
+
+
+class StreamingPTT:
+    def __init__(self, fs=100, search=SEARCH, foot_search=FOOT_SEARCH, history=5.0):
+        """
+        PTT dạng luồng: nhận từng khối đã lọc (đầu ra FilterBank) cùng các đỉnh R mới
+        xác nhận (StreamingRPeakDetector.update), trả về kết quả của các nhịp đã đủ
+        dữ liệu PPG phía sau (trễ search[1] giây so với đỉnh R).
+
+        Chỉ giữ 'history' giây PPG gần nhất trong RingBuffer (đỉnh R có thể được xác
+        nhận trễ: thời gian trơ, search-back). Mỗi lần có nhịp đủ dữ liệu, các nhịp đó
+        được ghép bằng match_beats trên đoạn đệm, nên kết quả giống hệt ptt_batch trên
+        cả bản ghi. Đỉnh R cũ hơn đoạn đệm cho kết quả NaN.
+
+        Tham số: giống ptt_batch, thêm
+        - history (float): Độ dài đoạn PPG giữ lại (giây).
+        """
+        self.fs = fs
+        self.search = search
+        self.foot_search = foot_search
+        # Cực đại của đạo hàm (sai phân trung tâm) ở cuối khoảng tìm cần thêm 2 mẫu sau nó
+        self._need = int(round(search[1] * fs)) + 3
+        # Số mẫu cần có trước đỉnh R (đáy trước điểm dốc nhất, sai phân)
+        self._before = max(int(round(foot_search * fs)) - int(round(search[0] * fs)), 0) + 2
+        self._buffer = RingBuffer(int(round(history * fs)) + self._need + self._before, n_channels=3)
+        self.reset()
+
+    def reset(self):
+        """Xóa toàn bộ trạng thái."""
+        self._buffer.clear()
+        self._pending = np.empty(0, dtype=np.int64)
+        self.n_samples = 0
+        self.n_beats = 0
+        self.latest = None  # Kết quả của nhịp gần nhất (dict, mỗi khóa một giá trị)
+
+    def update(self, filtered_block, r_peaks=()):
+        """
+        Nạp khối (n, 3) 'ecg, ir, red' đã lọc và các đỉnh R mới (chỉ số mẫu tuyệt đối,
+        cùng gốc với khối đầu tiên). Trả về dict các mảng (KEYS) của các nhịp vừa có
+        đủ dữ liệu (có thể rỗng).
+        """
+        block = np.asarray(filtered_block, dtype=np.float64).reshape(-1, 3)
+        if len(r_peaks):
+            self._pending = np.concatenate((self._pending, np.asarray(r_peaks, dtype=np.int64)))
+        total = self.n_samples + len(block)
+
+        ready = self._pending[self._pending + self._need <= total]
+        out = _beats(ready, np.empty((0, 3)), self.fs, self.search, self.foot_search)
+        if len(ready):
+            self._pending = self._pending[len(ready):]
+            # Đoạn đệm + khối mới (chỉ ghép khi có nhịp cần tính, ~1 lần mỗi nhịp)
+            kept = len(self._buffer)
+            segment = np.concatenate((self._buffer.view()[self._buffer.capacity - kept:], block))
+            offset = total - len(segment)
+            out = _beats(ready, segment, self.fs, self.search, self.foot_search, offset)
+            # Dữ liệu trước đỉnh R đã bị đẩy khỏi bộ đệm (offset > 0: đã mất mẫu cũ)
+            stale = (ready - offset < self._before) & (offset > 0)
+            for name, _ in CHANNELS:
+                out[f'{name}_foot'][stale] = np.nan
+                out[f'{name}_slope'][stale] = np.nan
+            self.n_beats += len(ready)
+            self.latest = {key: out[key][-1] for key in KEYS}
+
+        self._buffer.extend(block)
+        self.n_samples = total
+        return out
+
+
+def save_csv(path, result):
+    """Ghi chuỗi PTT theo nhịp ra CSV (mỗi dòng một nhịp, độ trễ tính bằng ms)."""
+    columns = [result['time']] + [result[key] * 1e3 for key in KEYS[2:]]
+    header = "time_s,r_sample," + ",".join(f"{key}_ms" for key in KEYS[2:])
+    rows = np.column_stack([columns[0], result['r']] + columns[1:])
+    np.savetxt(path, rows, delimiter=',', header=header, comments='', fmt=['%.3f', '%d'] + ['%.1f'] * 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Thời gian truyền sóng mạch (R -> chân sóng/điểm dốc nhất PPG) theo từng nhịp.")
+    parser.add_argument('files', nargs='+', help="File CSV hoặc .rec")
+    parser.add_argument('--fs', type=int, default=100, help="Tần số lấy mẫu (Hz)")
+    parser.add_argument('-o', '--out-dir', default=None, help="Ghi <tên>_<mã>_ptt.csv vào thư mục này")
+    args = parser.parse_args()
+
+    print(f"{'File':<16}{'Nhịp':>7}{'Hợp lệ':>8}{'IR chân (ms)':>14}{'IR dốc (ms)':>13}"
+          f"{'RED chân (ms)':>15}{'Thời gian (ms)':>16}")
+    for path in args.files:
+        data = load_recording(path)
+        t0 = time.perf_counter()
+        result = ptt_batch(data, fs=args.fs)
+        elapsed = time.perf_counter() - t0
+        valid = np.isfinite(result['ir_foot'])
+
+        def median_ms(key):
+            x = result[key][np.isfinite(result[key])]
+            return f"{np.median(x) * 1e3:.0f} +-{np.std(x) * 1e3:.0f}" if len(x) else "-"
+
+        print(f"{os.path.basename(path):<16}{len(result['r']):>7}{int(valid.sum()):>8}"
+              f"{median_ms('ir_foot'):>14}{median_ms('ir_slope'):>13}{median_ms('red_foot'):>15}"
+              f"{elapsed * 1e3:>16.1f}")
+        if args.out_dir:
+            from batch_process import output_stem
+            os.makedirs(args.out_dir, exist_ok=True)
+            name = output_stem(path) + '_ptt.csv'
+            save_csv(os.path.join(args.out_dir, name), result)
+
+
+if __name__ == "__main__":
+    main()
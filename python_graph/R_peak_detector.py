@@ -0,0 +1,242 @@
+from collections import deque
+
+import numpy as np
+from scipy.signal import lfilter, lfilter_zi
+
+
+class StreamingRPeakDetector:
+    def __init__(self, fs=100, integration_window=0.15, refractory=0.2, learning_time=2.0, history=8):
+        """
+        Phát hiện đỉnh R của ECG dạng luồng theo Pan-Tompkins, nhận tín hiệu ECG
+        đã lọc (RealTimeNotchFilter -> RealTimeBandpassFilter, hoặc cột ECG của
+        FilterBank) theo từng khối.
+
+        Mỗi khối (chi phí cố định cho mỗi mẫu, không quét lại cửa sổ cũ):
+        1. Đạo hàm 5 điểm: y = (2x[n] + x[n-1] - x[n-3] - 2x[n-4]) * fs / 8
+           (lfilter có trạng thái giữa các khối).
+        2. Bình phương.
+        3. Tích phân cửa sổ trượt 150 ms (tổng tích lũy trên khối + đuôi khối trước).
+        4. Các cực đại cục bộ của tín hiệu tích phân được xét lần lượt với ngưỡng
+           thích nghi:
+           SPKI/NPKI = mức đỉnh tín hiệu/nhiễu (trung bình mũ 1/8),
+           THRESHOLD1 = NPKI + 0.25 * (SPKI - NPKI), THRESHOLD2 = 0.5 * THRESHOLD1.
+           - Đỉnh > THRESHOLD1: ứng viên QRS, trừ khi cách QRS trước < 360 ms và
+             độ dốc lớn nhất < 1/2 độ dốc của QRS trước (sóng T).
+           - Không có QRS trong 166% RR trung bình: tìm lại (search-back) đỉnh nhiễu
+             cao nhất > THRESHOLD2 kể từ QRS trước.
+           - Thời gian trơ 200 ms: đỉnh cao hơn trong thời gian này thay thế ứng viên,
+             ứng viên chỉ được xác nhận khi hết thời gian trơ.
+        5. Vị trí đỉnh R = cực đại của ECG đã lọc trong cửa sổ tích phân trước đỉnh.
+
+        2 giây đầu dùng để khởi tạo ngưỡng (SPKI = 1/3 cực đại, NPKI = 1/2 trung bình
+        tín hiệu tích phân).
+
+        Tham số:
+        - fs (int): Tần số lấy mẫu (Hz), 100-500Hz.
+        - integration_window (float): Độ dài cửa sổ tích phân (giây).
+        - refractory (float): Thời gian trơ (giây).
+        - learning_time (float): Thời gian khởi tạo ngưỡng (giây).
+        - history (int): Số khoảng RR gần nhất dùng để tính RR trung bình / BPM.
+        """
+        self.fs = fs
+        self._n_win = max(int(round(integration_window * fs)), 1)
+        self._refractory = int(round(refractory * fs))
+        self._t_wave = int(round(0.36 * fs))
+        self._learning = int(round(learning_time * fs))
+        self._history = history
+        self._window_offsets = np.arange(self._n_win + 2)  # Cửa sổ tìm vị trí R (gồm trễ đạo hàm)
+        # Hệ số đạo hàm 5 điểm (trễ 2 mẫu)
+        self._b = np.array([2.0, 1.0, 0.0, -1.0, -2.0]) * fs / 8.0
+        self.reset()
+
+    def reset(self):
+        """Xóa toàn bộ trạng thái."""
+        self._zi = lfilter_zi(self._b, [1.0]) * 0.0
+        # Đuôi khối trước: ECG, |đạo hàm| (tìm vị trí R, độ dốc) và bình phương (tích phân)
+        tail = self._n_win + 3
+        self._ecg_tail = np.zeros(tail)
+        self._slope_tail = np.zeros(tail)
+        self._sq_tail = np.zeros(self._n_win)
+        self._mwi_tail = np.zeros(2)  # Hai giá trị tích phân cuối (tìm cực đại ở biên khối)
+        self.n_samples = 0
+
+        # Khởi tạo ngưỡng
+        self._learn_max = 0.0
+        self._learn_sum = 0.0
+        self._learn_peaks = []
+        self.spki = self.npki = 0.0
+        self.threshold1 = self.threshold2 = 0.0
+        self.ready = False
+
+        self._pending = None        # Ứng viên QRS chờ hết thời gian trơ
+        self._last_qrs = None       # (chỉ số đỉnh tích phân, độ dốc) của QRS trước
+        self._noise = []            # Đỉnh nhiễu kể từ QRS trước (cho search-back)
+        self._rr = deque(maxlen=self._history)
+        self._last_r = None
+
+        self.n_peaks = 0
+        self.new_peaks = np.empty(0, dtype=np.int64)
+        self.new_rr = np.empty(0)
+        self._out_peaks, self._out_rr = [], []
+
+    # --- Giao diện chính ---
+    def update(self, samples):
+        """
+        Nạp khối ECG đã lọc, trả về mảng chỉ số mẫu (tính từ mẫu đầu tiên từng nạp)
+        của các đỉnh R vừa được xác nhận. Khoảng RR tương ứng (giây, NaN cho đỉnh
+        đầu tiên) nằm trong new_rr; đỉnh được xác nhận trễ khoảng thời gian trơ.
+        """
+        x = np.asarray(samples, dtype=np.float64)
+        self._out_peaks, self._out_rr = [], []
+        if x.size:
+            self._process(x)
+        self.new_peaks = np.array(self._out_peaks, dtype=np.int64)
+        self.new_rr = np.array(self._out_rr)
+        self.n_peaks += len(self.new_peaks)
+        return self.new_peaks
+
+    @property
+    def rr_mean(self):
+        """RR trung bình (giây) của 'history' khoảng gần nhất, None nếu chưa có."""
+        return sum(self._rr) / len(self._rr) / self.fs if self._rr else None
+
+    @property
+    def bpm(self):
+        """Nhịp tim (BPM) từ RR trung bình."""
+        rr = self.rr_mean
+        return round(60.0 / rr, 2) if rr else None
+
+    # --- Xử lý khối ---
+    def _process(self, x):
+        n = len(x)
+        base = self.n_samples  # Chỉ số tuyệt đối của x[0]
+
+        # 1-2. Đạo hàm, bình phương
+        d, self._zi = lfilter(self._b, [1.0], x, zi=self._zi)
+        sq = d * d
+
+        # 3. Tích phân cửa sổ trượt: tổng tích lũy trên (đuôi khối trước + khối mới)
+        ext = np.concatenate((self._sq_tail, sq))
+        cs = np.cumsum(ext)
+        N = self._n_win
+        mwi = (cs[N:] - cs[:n]) / N
+
+        # Đuôi cho lần sau (tìm vị trí R và độ dốc quanh đỉnh)
+        ecg_ext = np.concatenate((self._ecg_tail, x))
+        slope_ext = np.concatenate((self._slope_tail, np.abs(d)))
+        ext_base = base - len(self._ecg_tail)
+
+        # 4. Cực đại cục bộ của tín hiệu tích phân (kể cả mẫu cuối khối trước)
+        m = np.concatenate((self._mwi_tail, mwi))
+        k = np.flatnonzero((m[1:-1] > m[:-2]) & (m[1:-1] >= m[2:])) + 1
+        idx = base - 2 + k  # Chỉ số tuyệt đối của các cực đại
+
+        r, slope = self._locate(idx, ecg_ext, slope_ext, ext_base)
+        peaks = zip(idx.tolist(), m[k].tolist(), r.tolist(), slope.tolist())
+        if not self.ready:
+            self._learn(mwi, base, peaks)
+        else:
+            for peak in peaks:
+                self._candidate(*peak)
+
+        self.n_samples = base + n
+        if self.ready:
+            self._advance(self.n_samples - 1)
+
+        self._sq_tail = ext[-N:]
+        self._ecg_tail = ecg_ext[-len(self._ecg_tail):]
+        self._slope_tail = slope_ext[-len(self._slope_tail):]
+        self._mwi_tail = m[-2:]
+
+    def _locate(self, idx, ecg_ext, slope_ext, ext_base):
+        """
+        Vị trí đỉnh R (cực đại ECG) và độ dốc lớn nhất trong cửa sổ tích phân trước
+        mỗi đỉnh idx (tính cho cả khối một lần).
+        """
+        if len(idx) == 0:
+            return idx, np.empty(0)
+        lo = idx - ext_base + 1 - self._window_offsets.size  # Luôn >= 0 nhờ đuôi dài hơn cửa sổ 1 mẫu
+        rows = lo[:, None] + self._window_offsets
+        r = ext_base + lo + ecg_ext[rows].argmax(axis=1)
+        return r, slope_ext[rows].max(axis=1)
+
+    def _learn(self, mwi, base, peaks):
+        """Gom 'learning_time' giây đầu để khởi tạo SPKI/NPKI, sau đó xét lại các đỉnh đã gom."""
+        take = max(min(self._learning - base, len(mwi)), 0)
+        if take:
+            self._learn_max = max(self._learn_max, float(mwi[:take].max()))
+            self._learn_sum += float(mwi[:take].sum())
+        self._learn_peaks.extend(peaks)
+        if base + len(mwi) < self._learning:
+            return
+
+        self.spki = self._learn_max / 3.0
+        self.npki = self._learn_sum / self._learning / 2.0
+        self._update_thresholds()
+        self.ready = True
+        peaks, self._learn_peaks = self._learn_peaks, []
+        for i, v, r, slope in peaks:
+            self._candidate(i, v, r, slope)
+
+    def _update_thresholds(self):
+        self.threshold1 = self.npki + 0.25 * (self.spki - self.npki)
+        self.threshold2 = 0.5 * self.threshold1
+
+    # --- Quyết định QRS / nhiễu ---
+    def _candidate(self, i, v, r, slope):
+        self._advance(i)
+        pending = self._pending
+        if pending is not None and i - pending[0] < self._refractory:
+            # Trong thời gian trơ: đỉnh cao hơn thay thế ứng viên
+            if v > pending[1]:
+                self._pending = (i, v, r, slope)
+            return
+
+        if v > self.threshold1:
+            last = self._last_qrs
+            if last is not None and i - last[0] < self._t_wave and slope < 0.5 * last[1]:
+                self._noise_peak(i, v, r, slope)  # Sóng T
+            else:
+                self._pending = (i, v, r, slope)
+        else:
+            self._noise_peak(i, v, r, slope)
+
+    def _noise_peak(self, i, v, r, slope):
+        self.npki = 0.125 * v + 0.875 * self.npki
+        self._update_thresholds()
+        if v > self.threshold2:
+            self._noise.append((i, v, r, slope))
+
+    def _advance(self, now):
+        """Xác nhận ứng viên đã hết thời gian trơ; search-back khi quá lâu không có QRS."""
+        pending = self._pending
+        if pending is not None and now - pending[0] >= self._refractory:
+            self._pending = None
+            self._confirm(pending, 0.125)
+        if self._pending is not None or self._last_qrs is None or not self._rr:
+            return
+        limit = 1.66 * sum(self._rr) / len(self._rr)
+        if now - self._last_qrs[0] <= limit:
+            return
+        start = self._last_qrs[0] + self._refractory
+        found = [c for c in self._noise if c[0] >= start and c[1] > self.threshold2]
+        if found:
+            best = max(found, key=lambda c: c[1])
+            self._noise = [c for c in self._noise if c[0] > best[0]]
+            self._confirm(best, 0.25)
+            # Đỉnh nhiễu còn lại sau đỉnh vừa tìm lại có thể là QRS kế tiếp
+            self._advance(now)
+
+    def _confirm(self, peak, weight):
+        i, v, r, slope = peak
+        self.spki = weight * v + (1 - weight) * self.spki
+        self._update_thresholds()
+        self._last_qrs = (i, slope)
+        self._noise = [c for c in self._noise if c[0] > i]
+        rr = np.nan
+        if self._last_r is not None:
+            self._rr.append(r - self._last_r)
+            rr = (r - self._last_r) / self.fs
+        self._last_r = r
+        self._out_peaks.append(r)
+        self._out_rr.append(rr)
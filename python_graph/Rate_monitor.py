@@ -0,0 +1,453 @@
+import argparse
+import collections
+import math
+import time
+from fractions import Fraction
+
+import numpy as np
+
+from Serial_ingest import SerialIngest, COL_ECG, COL_IR, COL_RED
+
+# Số dòng gần nhất dùng để tìm khối dữ liệu bị gửi lặp
+DUP_HISTORY = 32
+# Khối lặp phải dài ít nhất bấy nhiêu dòng, và các dòng trong đó phải khác nhau từng đôi
+# (tuột dây: ECG kịch 4094/4095, IR = RED = 0 lặp lại thường xuyên nhưng là mẫu thật)
+DUP_MIN_RUN = 4
+
+
+class PolyphaseResampler:
+    def __init__(self, up, down, n_channels=3, taps_per_phase=16, beta=5.0):
+        """
+        Đổi tần số lấy mẫu dạng luồng theo tỉ lệ hữu tỉ up/down (bộ lọc đa pha),
+        cho cùng kết quả dù khối vào được chia thế nào.
+
+        Bộ lọc thông thấp FIR (cửa sổ Kaiser) dài up * taps_per_phase được tách thành
+        'up' pha, mỗi mẫu ra chỉ tính đúng taps_per_phase phép nhân cho mỗi kênh (tính
+        cho cả khối bằng một lần gom chỉ số, không có vòng lặp Python theo mẫu).
+
+        Mẫu ra thứ m nằm đúng thời điểm m * down / up (tính theo mẫu vào): trễ nhóm của
+        bộ lọc được bù bằng cách chờ thêm ~taps_per_phase / 2 mẫu vào, nên trục thời gian
+        không bị lệch (chỉ có độ trễ xử lý). Trước mẫu đầu tiên, tín hiệu được coi là
+        giữ nguyên giá trị mẫu đầu (PPG thô có thành phần DC rất lớn, đệm 0 sẽ gây
+        dao động ở đầu).
+
+        Tham số:
+        - up, down (int): Tỉ lệ fs_ra / fs_vào = up / down (tự rút gọn).
+        - n_channels (int): Số kênh.
+        - taps_per_phase (int): Số hệ số mỗi pha (dài hơn -> dốc hơn, trễ hơn).
+        - beta (float): Tham số cửa sổ Kaiser.
+        """
+        self.n_channels = int(n_channels)
+        self.taps = int(taps_per_phase)
+        self.beta = beta
+        self.up = self.down = 1
+        self._pos = 0  # Vị trí mẫu ra kế tiếp (đơn vị 1/up mẫu vào), tính từ mẫu vào đầu khối kế tiếp
+        self._tail = None
+        self.set_ratio(up, down)
+
+    def set_ratio(self, up, down):
+        """
+        Đổi tỉ lệ mà không làm gián đoạn luồng: giữ các mẫu vào gần nhất và thời điểm
+        của mẫu ra kế tiếp (sai lệch tối đa 1/up mẫu).
+        """
+        up, down = int(up), int(down)
+        if up < 1 or down < 1:
+            raise ValueError("up, down phải >= 1")
+        g = math.gcd(up, down)
+        up, down = up // g, down // g
+        length = up * self.taps
+        # scipy.signal chỉ cần khi thật sự đổi tần số (tránh ~1 giây import lúc khởi động)
+        from scipy.signal import firwin
+        h = firwin(length, 1.0 / max(up, down), window=('kaiser', self.beta)) * up
+        # Pha p gồm các hệ số h[p], h[p + up], h[p + 2up]...
+        phases = h.reshape(self.taps, up).T
+        # Chuẩn hóa từng pha về hệ số DC = 1: PPG thô có DC ~1e5, sai lệch 0.1% giữa các pha
+        # đã thành gợn hàng trăm đơn vị
+        self._phases = phases / phases.sum(axis=1, keepdims=True)
+        delay = (length - 1) // 2
+        self._pos = max(int(round(self._pos * up / self.up)), -delay)
+        self.up, self.down, self._delay = up, down, delay
+
+    @property
+    def ratio(self):
+        return self.up / self.down
+
+    def prime(self, rows):
+        """Đặt các mẫu vào trước đó (vd: đuôi dữ liệu chưa đổi tần số) làm lịch sử của bộ lọc."""
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, self.n_channels)
+        if len(rows):
+            pad = max(self.taps - 1 - len(rows), 0)
+            self._tail = np.concatenate((np.repeat(rows[:1], pad, axis=0), rows[-(self.taps - 1):]))
+
+    def process(self, block):
+        """Nạp khối (n, n_channels), trả về các mẫu ra đã đủ dữ liệu (float64)."""
+        x = np.asarray(block, dtype=np.float64).reshape(-1, self.n_channels)
+        n = len(x)
+        if n == 0:
+            return np.empty((0, self.n_channels))
+        if self._tail is None:
+            self._tail = np.repeat(x[:1], self.taps - 1, axis=0)
+        ext = np.concatenate((self._tail, x))  # ext[taps - 1] = x[0]
+        up, down, delay = self.up, self.down, self._delay
+
+        # Mẫu ra ở vị trí u cần mẫu vào thứ (u + delay) // up
+        u = np.arange(self._pos, n * up - delay, down)
+        self._tail = ext[len(ext) - (self.taps - 1):]
+        if not len(u):
+            self._pos -= n * up
+            return np.empty((0, self.n_channels))
+        v = u + delay
+        rows = (v // up + self.taps - 1)[:, None] - np.arange(self.taps)
+        y = np.einsum('mk,mkc->mc', self._phases[v % up], ext[rows])
+        self._pos = int(u[-1]) + down - n * up
+        return y
+
+
+class RateMonitor:
+    def __init__(self, fs=100, window=10.0, gap_threshold=0.05, settle=0.25):
+        """
+        Theo dõi tần số lấy mẫu thực của thiết bị từ thời điểm (đồng hồ đơn điệu của
+        máy tính) và số mẫu của mỗi lần đọc khối, thay cho việc đếm số dòng mỗi giây.
+
+        - rate: Tần số đo trong 'window' giây gần nhất (Hz).
+        - drift_ppm: Độ lệch đồng hồ thiết bị so với fs, tính từ lần đọc đầu tiên
+          (phần triệu, càng đo lâu càng chính xác).
+        - Mất mẫu (gap): Mỗi lần đọc có độ trễ lag = t - k / rate, với k là chỉ số mẫu
+          trên trục thời gian của thiết bị. Độ trễ USB chỉ làm dữ liệu đến muộn tạm thời
+          (lần đọc sau lại đủ), còn mẫu bị mất làm lag tăng hẳn một bậc. Bậc được xác
+          nhận khi lag nhỏ nhất trong 'settle' giây gần nhất lớn hơn lag nhỏ nhất của
+          'settle' giây trước đó quá gap_threshold; số mẫu mất = độ cao bậc x rate.
+          Lệch tần số chỉ làm lag thay đổi chậm nên không bị nhầm là mất mẫu.
+        - Thừa mẫu: ngược lại, lag giảm hẳn một bậc (dữ liệu nhiều hơn thời gian cho phép).
+
+        Mất lẻ tẻ từng mẫu (ngắn hơn gap_threshold) không tách được khỏi độ trễ USB,
+        chúng chỉ làm rate thấp hơn một chút.
+
+        Tham số:
+        - fs (int): Tần số danh định (Hz).
+        - window (float): Cửa sổ đo tần số (giây).
+        - gap_threshold (float): Bậc lag nhỏ nhất coi là mất/thừa mẫu (giây).
+        - settle (float): Thời gian bậc phải giữ nguyên trước khi được xác nhận (giây).
+        """
+        self.fs = fs
+        self.window = window
+        self.gap_threshold = gap_threshold
+        self.settle = settle
+        self.reset()
+
+    def reset(self):
+        """Xóa toàn bộ trạng thái (vd: sau reset_input_buffer)."""
+        self.rate = float(self.fs)
+        self.reads = 0       # Số lần đọc có dữ liệu
+        self.samples = 0     # Số mẫu đã nhận
+        self.lost = 0        # Tổng số mẫu mất đã phát hiện
+        self.extra = 0       # Tổng số mẫu thừa đã phát hiện
+        self.new_gap = 0     # Số mẫu mất phát hiện trong lần update gần nhất
+        self.gaps = collections.deque(maxlen=100)  # (thời điểm, chỉ số mẫu, số mẫu mất) gần nhất
+        self._first = None
+        self._checked = None
+        self._window = collections.deque()  # (t, k) trong 'window' giây
+        self._recent = collections.deque()  # (t, k, số mẫu trước lần đọc) trong 2 x settle giây
+
+    @property
+    def position(self):
+        """Chỉ số trên trục thời gian thiết bị sau mẫu cuối (đã cộng mẫu mất, trừ mẫu thừa)."""
+        return self.samples + self.lost - self.extra
+
+    @property
+    def span(self):
+        """Thời gian đã theo dõi (giây)."""
+        return self._window[-1][0] - self._first[0] if self._first else 0.0
+
+    @property
+    def drift_ppm(self):
+        if not self._first or self.span < 1.0:
+            return 0.0
+        t0, k0 = self._first
+        return ((self.position - k0) / self.span / self.fs - 1.0) * 1e6
+
+    def update(self, t, n):
+        """
+        Ghi nhận lần đọc tại thời điểm t (giây, time.perf_counter) nhận n mẫu.
+        Trả về số mẫu mất vừa được xác nhận (0 nếu không có).
+        """
+        self.new_gap = 0
+        if n <= 0:
+            return 0
+        before = self.samples
+        self.reads += 1
+        self.samples += int(n)
+        k = self.position
+        if self._first is None:
+            self._first = (t, k)
+
+        recent = self._recent
+        recent.append((t, k, before))
+        # Luôn giữ ít nhất một lần đọc cũ hơn 'settle' giây làm mốc (kể cả sau khi thiết bị ngừng gửi)
+        while len(recent) > 1 and t - recent[0][0] > 2 * self.settle and recent[1][0] <= t - self.settle:
+            recent.popleft()
+
+        # Tần số tính tới lần đọc cũ nhất của _recent: mất mẫu chưa được xác nhận
+        # (trong 2 x settle giây gần nhất) không làm sai tần số
+        win = self._window
+        win.append((t, k))
+        while len(win) > 2 and t - win[1][0] >= self.window:
+            win.popleft()
+        t_ref, k_ref = recent[0][:2]
+        if t_ref - win[0][0] >= min(1.0, self.window):
+            self.rate = (k_ref - win[0][1]) / (t_ref - win[0][0])
+        # Kiểm tra bậc tối đa 5 lần mỗi 'settle' giây (nhiều lần đọc nhỏ liên tiếp không tốn thêm)
+        if self._checked is None or t - self._checked >= self.settle / 5:
+            self._checked = t
+            self._check_step(t)
+        return self.new_gap
+
+    def _check_step(self, t):
+        arr = np.array(self._recent)
+        new = arr[:, 0] > t - self.settle
+        if new.all() or not new.any():
+            return
+        lag = arr[:, 0] - arr[:, 1] / self.rate
+        base = lag[~new].min()
+        step = lag[new].min() - base
+        if abs(step) <= self.gap_threshold:
+            return
+        n = int(round(abs(step) * self.rate))
+        if not n:
+            return
+        shift = n if step > 0 else -n
+        if step > 0:
+            # Lần đọc đầu tiên thấy bậc: mẫu mất nằm ngay trước dữ liệu của lần đọc đó
+            first = int(np.argmax(new & (lag > base + self.gap_threshold)))
+            t_gap = arr[first, 0]
+            self.lost += n
+            self.new_gap += n
+            self.gaps.append((t_gap, int(arr[first, 2]), n))
+        else:
+            t_gap = arr[new][0, 0]
+            self.extra += n
+        # Dời trục thời gian của các lần đọc sau bậc để không phát hiện lại
+        self._recent = collections.deque((a, b + shift if a >= t_gap else b, c) for a, b, c in self._recent)
+        self._window = collections.deque((a, b + shift if a >= t_gap else b) for a, b in self._window)
+
+    def stats(self):
+        return {'rate': round(self.rate, 3), 'drift_ppm': round(self.drift_ppm, 1), 'samples': self.samples,
+                'lost': self.lost, 'gaps': len(self.gaps), 'extra': self.extra, 'reads': self.reads}
+
+
+class MonitoredIngest:
+    def __init__(self, ingest, fs=100, fill_gaps=False, resample=False, drop_duplicates=False,
+                 tolerance=0.002, max_denominator=200, **monitor_kwargs):
+        """
+        Tầng giữa SerialIngest và DSP: gắn thời điểm cho mỗi lần đọc khối, đo tần số
+        thực (RateMonitor), bỏ khối bị gửi lặp, tùy chọn chèn mẫu bù chỗ mất và đổi về
+        đúng tần số danh định. Cùng giao diện với SerialIngest (read_block, poll, lines,
+        malformed...) nên dùng thay trực tiếp trong AcquisitionPipeline.
+
+        - drop_duplicates: Bỏ khối lặp (gói USB bị gửi lại), mặc định tắt: chuỗi
+          >= DUP_MIN_RUN dòng liên tiếp, khác nhau từng đôi, trùng y hệt một chuỗi trong
+          DUP_HISTORY dòng trước. Dòng trùng dòng ngay trước (tín hiệu phẳng) và các giá
+          trị lặp lại khi tuột dây (ECG kịch, IR = RED = 0) được giữ. Tín hiệu lặp
+          đúng chu kỳ ngắn vẫn có thể bị bỏ nhầm, chỉ bật khi biết bộ chuyển USB-Serial
+          gửi lặp gói.
+        - fill_gaps: Khi RateMonitor xác nhận mất mẫu, chèn đủ số mẫu đó (giữ giá trị mẫu
+          cuối) trước khối hiện tại để bộ lọc và BPM không bị lệch thời gian. Việc xác
+          nhận cần 'settle' giây nên mẫu bù nằm muộn hơn chỗ mất tối đa chừng đó.
+        - resample: Sau 'window' giây đầu, nếu tần số đo lệch fs quá 'tolerance', đổi tần
+          số bằng PolyphaseResampler theo tỉ lệ fs / rate (phân số mẫu <= max_denominator,
+          sai số < 1/max_denominator^2). Tỉ lệ được chỉnh lại khi tần số đo thay đổi.
+          Kết quả được làm tròn về int64 như dữ liệu thô.
+
+        Tham số:
+        - ingest: SerialIngest (hoặc đối tượng có read_block()/poll()).
+        - fs (int): Tần số danh định (Hz).
+        - monitor_kwargs: Tham số của RateMonitor (window, gap_threshold, settle).
+        """
+        self.ingest = ingest
+        self.fs = fs
+        self.fill_gaps = fill_gaps
+        self.resample = resample
+        self.drop_duplicates = drop_duplicates
+        self.tolerance = tolerance
+        self.max_denominator = max_denominator
+        self.monitor = RateMonitor(fs=fs, **monitor_kwargs)
+        self.resampler = None
+        self.t_read = None
+        self.duplicates = 0  # Số dòng lặp đã bỏ
+        self.filled = 0      # Số mẫu đã chèn bù
+        self._keys = np.empty(0, dtype=np.int64)
+        self._last = None
+
+    @property
+    def lines(self):
+        return self.ingest.lines
+
+    @property
+    def malformed(self):
+        return self.ingest.malformed
+
+    @property
+    def rate(self):
+        return self.monitor.rate
+
+    def read_block(self):
+        block = self.ingest.read_block()
+        return self._process(time.perf_counter(), block)
+
+    def poll(self):
+        block = self.ingest.poll()
+        return self._process(time.perf_counter(), block)
+
+    def reset_input_buffer(self):
+        """Xóa bộ đệm Serial và bắt đầu đo lại từ đầu."""
+        self.ingest.reset_input_buffer()
+        self.monitor.reset()
+        self.resampler = None
+        self._keys = np.empty(0, dtype=np.int64)
+        self._last = None
+
+    def close(self):
+        self.ingest.close()
+
+    def instrument(self, metrics):
+        """Tần số đo được, số mẫu mất/chèn bù, số dòng lặp (Metrics.Registry, đọc khi lấy số liệu)."""
+        if hasattr(self.ingest, 'instrument'):
+            self.ingest.instrument(metrics)
+        metrics.gauge('vitals_sample_rate_hz', "Tần số lấy mẫu đo được", fn=lambda: self.monitor.rate)
+        metrics.counter('vitals_lost_samples_total', "Số mẫu bị mất (theo đồng hồ)", fn=lambda: self.monitor.lost)
+        metrics.counter('vitals_filled_samples_total', "Số mẫu đã chèn bù", fn=lambda: self.filled)
+        metrics.counter('vitals_duplicate_lines_total', "Số dòng bị gửi lặp đã bỏ", fn=lambda: self.duplicates)
+
+    def _process(self, t, block):
+        self.t_read = t
+        if self.drop_duplicates and len(block):
+            block = self._drop_duplicates(block)
+        lost = self.monitor.update(t, len(block))
+        if lost and self.fill_gaps and self._last is not None:
+            block = np.concatenate((np.repeat(self._last[None], lost, axis=0), block))
+            self.filled += lost
+        if len(block):
+            self._last = block[-1]
+        if self.resample:
+            block = self._resample(block)
+        return block
+
+    def _drop_duplicates(self, block):
+        # Mỗi dòng thành một khóa: ECG 12 bit, IR/RED 18 bit (ADC của AD8232/MAX30102)
+        keys = (block[:, COL_ECG] << 36) ^ (block[:, COL_IR] << 18) ^ block[:, COL_RED]
+        if len(keys) <= DUP_HISTORY:
+            # Đường nhanh cho khối nhỏ (1-2 dòng mỗi lần đọc): không khóa nào lặp lại
+            unique = set(keys.tolist())
+            if len(unique) == len(keys) and unique.isdisjoint(self._keys.tolist()):
+                self._keys = np.concatenate((self._keys, keys))[-DUP_HISTORY:]
+                return block
+        allk = np.concatenate((self._keys, keys))
+        h = len(self._keys)
+        # Lần xuất hiện gần nhất trước đó của cùng khóa (sắp xếp ổn định giữ thứ tự)
+        order = np.argsort(allk, kind='stable')
+        same = allk[order[1:]] == allk[order[:-1]]
+        prev = np.full(len(allk), -1)
+        prev[order[1:][same]] = order[:-1][same]
+        dist = np.arange(len(allk)) - prev
+        ok = (prev >= 0) & (dist > 1) & (dist <= DUP_HISTORY)
+        # Dòng lặp phải thuộc một chuỗi lặp liên tiếp (cùng khoảng cách với dòng kề)
+        # dài >= DUP_MIN_RUN dòng, các dòng khác nhau từng đôi
+        cont = np.zeros(len(allk), dtype=bool)
+        cont[1:] = ok[1:] & ok[:-1] & (dist[1:] == dist[:-1])
+        run_id = np.cumsum(ok & ~cont)
+        run = np.zeros(len(allk), dtype=bool)
+        lengths = np.bincount(run_id[ok])
+        for r in np.flatnonzero(lengths >= DUP_MIN_RUN):
+            idx = np.flatnonzero(ok & (run_id == r))
+            if len(np.unique(allk[idx])) == len(idx):
+                run[idx] = True
+        dup = run[h:]
+        if dup.any():
+            self.duplicates += int(dup.sum())
+            block, keys = block[~dup], keys[~dup]
+        self._keys = np.concatenate((self._keys, keys))[-DUP_HISTORY:]
+        return block
+
+    def _resample(self, block):
+        m = self.monitor
+        if m.span >= m.window:
+            rate = m.rate
+            current = self.fs / self.resampler.ratio if self.resampler is not None else self.fs
+            if abs(rate / current - 1) > self.tolerance:
+                frac = Fraction(self.fs / rate).limit_denominator(self.max_denominator)
+                if self.resampler is None:
+                    self.resampler = PolyphaseResampler(frac.numerator, frac.denominator, n_channels=block.shape[1])
+                    if self._last is not None:
+                        # Nối tiếp dữ liệu chưa đổi tần số (không lệch trục thời gian)
+                        self.resampler.prime(self._last[None])
+                else:
+                    self.resampler.set_ratio(frac.numerator, frac.denominator)
+        if self.resampler is None or not len(block):
+            return block
+        return np.rint(self.resampler.process(block)).astype(np.int64)
+
+    def stats(self):
+        """Thống kê của RateMonitor kèm số dòng lặp đã bỏ, số mẫu đã chèn, tỉ lệ đổi tần số."""
+        s = self.monitor.stats()
+        s.update(duplicates=self.duplicates, filled=self.filled,
+                 ratio=f"{self.resampler.up}/{self.resampler.down}" if self.resampler is not None else None)
+        return s
+
+
+def watch(ser, fs=100, interval=1.0, duration=None, **kwargs):
+    """
+    In tần số thực, độ lệch đồng hồ và số mẫu mất mỗi 'interval' giây
+    (Ctrl+C để dừng). ser: serial.Serial đã mở (timeout nhỏ, vd: 0.1).
+    """
+    ingest = MonitoredIngest(SerialIngest(ser), fs=fs, **kwargs)
+    start = last = time.perf_counter()
+    try:
+        while duration is None or last - start < duration:
+            ingest.read_block()
+            now = time.perf_counter()
+            if now - last >= interval:
+                last = now
+                s = ingest.stats()
+                print(f"Toc do thuc te: {s['rate']:.2f} Hz | lệch {s['drift_ppm']:+.0f} ppm | "
+                      f"mất {s['lost']} mẫu ({s['gaps']} lần) | lặp {s['duplicates']} | "
+                      f"dòng lỗi {ingest.malformed}")
+    except KeyboardInterrupt:
+        pass
+    return ingest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo tần số lấy mẫu thực, độ lệch đồng hồ và mất mẫu của ESP32.")
+    parser.add_argument('--port', default='COM3', help="Cổng Serial")
+    parser.add_argument('--baud', type=int, default=921600)
+    parser.add_argument('--fs', type=int, default=100, help="Tần số danh định (Hz)")
+    parser.add_argument('--duration', type=float, default=None, help="Thời gian đo (giây), mặc định tới khi Ctrl+C")
+    parser.add_argument('--sim', default=None,
+                        help="Không cần phần cứng: phát file CSV này qua ESP32 ảo (ESP32_simulator.py)")
+    parser.add_argument('--sim-fs', type=float, default=None, help="Tần số thật của ESP32 ảo (mặc định = --fs)")
+    parser.add_argument('--sim-burst', type=int, default=1, help="Số dòng ESP32 ảo gửi gộp mỗi lần")
+    args = parser.parse_args()
+
+    import serial
+
+    sim = None
+    port = args.port
+    if args.sim:
+        from ESP32_simulator import VirtualESP32
+        sim = VirtualESP32(args.sim, fs=args.sim_fs or args.fs, burst=args.sim_burst, loop=True).start()
+        port = sim.port
+    ser = serial.Serial(port, args.baud, timeout=0.1)
+    print(f"-> Đang đo tốc độ lấy mẫu trên {port}...")
+    try:
+        ingest = watch(ser, fs=args.fs, duration=args.duration)
+    finally:
+        ser.close()
+        if sim is not None:
+            sim.stop()
+    s = ingest.stats()
+    print(f"-> {s['samples']} mẫu, {s['rate']:.3f} Hz, lệch {s['drift_ppm']:+.0f} ppm, "
+          f"mất {s['lost']} mẫu, thừa {s['extra']}, lặp {s['duplicates']}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+# --- ĐỊNH DẠNG FILE .rec ---
+# [MAGIC][độ dài header: uint32][header JSON]
+# [chunk]...[chunk]                      mỗi chunk: [CHUNK_MAGIC][n: uint32][crc32: uint32][dữ liệu theo cột]
+# [INDEX_MAGIC][số chunk: uint32][offset từng chunk: uint64...][tổng số mẫu: uint64][offset index: uint64][END_MAGIC]
+#
+# Dữ liệu một chunk lưu theo cột, mỗi cột liên tục: t (float64, giờ máy tính),
+# ecg (int16), ir (int32), red (int32). Thứ tự ecg, ir, red giống cột CSV và
+# Serial_ingest (COL_ECG, COL_IR, COL_RED).
+# Phần index ở cuối chỉ được ghi khi đóng file; nếu chương trình bị tắt đột ngột,
+# bên đọc quét lại các chunk và bỏ chunk cuối nếu chưa ghi xong (sai CRC).
+MAGIC = b'PPGREC\x00\x01'
+END_MAGIC = b'PPGEND\x00\x01'
+CHUNK_MAGIC = b'CHNK'
+INDEX_MAGIC = b'INDX'
+COLUMNS = (('t', '<f8'), ('ecg', '<i2'), ('ir', '<i4'), ('red', '<i4'))
+SIGNALS = ('ecg', 'ir', 'red')
+
+_CHUNK_HEAD = struct.Struct('<4sII')
+_TRAILER = struct.Struct('<QQ8s')
+_ITEMSIZE = sum(np.dtype(dt).itemsize for _, dt in COLUMNS)
+
+
+class Recorder:
+    def __init__(self, path, fs=100, chunk_size=500, fsync_interval=5.0, metadata=None):
+        """
+        Ghi dữ liệu ECG/PPG thô ra file nhị phân .rec theo từng chunk cố định,
+        thay cho ghi CSV từng dòng (mỗi dòng một lần ghi/flush).
+
+        - Mẫu được giữ trong bộ đệm Numpy, đủ chunk_size mẫu mới ghi một lần.
+        - Mỗi chunk có CRC32 riêng; fsync theo chu kỳ fsync_interval giây.
+        - Bị tắt đột ngột chỉ mất tối đa một chunk (đang nằm trong bộ đệm),
+          các chunk đã ghi vẫn đọc được (xem read_chunks).
+        - Chuyển sang CSV bằng export_csv() hoặc: python Recorder.py file.rec
+
+        Tham số:
+        - path (str): Đường dẫn file (.rec).
+        - fs (int): Tần số lấy mẫu (Hz), lưu trong header.
+        - chunk_size (int): Số mẫu mỗi chunk (500 = 5 giây ở 100 Hz).
+        - fsync_interval (float): Chu kỳ fsync (giây). 0 = fsync sau mỗi chunk,
+                                  None = để hệ điều hành tự ghi xuống đĩa.
+        - metadata (dict): Thông tin thêm lưu trong header (cổng Serial, người đo...).
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size phải > 0")
+        self.path = path
+        self.fs = fs
+        self.chunk_size = int(chunk_size)
+        self.fsync_interval = fsync_interval
+
+        self._buffer = {name: np.zeros(self.chunk_size, dtype=dt) for name, dt in COLUMNS}
+        self._fill = 0
+        self._offsets = []
+        self._last_sync = time.monotonic()
+
+        # Thống kê
+        self.n_samples = 0   # Tổng số mẫu đã nhận
+        self.clipped = 0     # Số giá trị ngoài khoảng của kiểu lưu (bị chặn lại)
+
+        header = {
+            'version': 1,
+            'fs': fs,
+            'chunk_size': self.chunk_size,
+            'columns': [[name, dt] for name, dt in COLUMNS],
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'metadata': metadata or {},
+        }
+        blob = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        self._f = open(path, 'wb')
+        self._f.write(MAGIC + struct.pack('<I', len(blob)) + blob)
+        self._f.flush()
+
+    def write(self, rows, t=None):
+        """
+        Thêm một khối mẫu (n, 3) 'ecg, ir, red' (vd: kết quả SerialIngest.read_block()).
+
+        Tham số:
+        - t (float): Thời điểm máy tính nhận khối (time.time()), dùng cho mọi mẫu
+                     trong khối. Mặc định là lúc gọi write().
+        """
+        rows = np.asarray(rows)
+        if rows.ndim != 2 or rows.shape[1] != 3:
+            raise ValueError("Khối dữ liệu phải có dạng (n, 3): ecg, ir, red")
+        n = len(rows)
+        if n == 0:
+            return
+        t = time.time() if t is None else t
+        self.n_samples += n
+
+        start = 0
+        while start < n:
+            take = min(n - start, self.chunk_size - self._fill)
+            dst = slice(self._fill, self._fill + take)
+            part = rows[start:start + take]
+            self._buffer['t'][dst] = t
+            for i, name in enumerate(SIGNALS):
+                self._store(name, dst, part[:, i])
+            self._fill += take
+            start += take
+            if self._fill == self.chunk_size:
+                self._write_chunk()
+
+    def _store(self, name, dst, values):
+        info = np.iinfo(self._buffer[name].dtype)
+        clipped = np.clip(values, info.min, info.max)
+        self.clipped += int(np.count_nonzero(clipped != values))
+        self._buffer[name][dst] = clipped
+
+    def _write_chunk(self):
+        n = self._fill
+        if n == 0:
+            return
+        payload = b''.join(self._buffer[name][:n].tobytes() for name, _ in COLUMNS)
+        self._offsets.append(self._f.tell())
+        self._f.write(_CHUNK_HEAD.pack(CHUNK_MAGIC, n, zlib.crc32(payload)) + payload)
+        self._f.flush()
+        self._fill = 0
+        if self.fsync_interval is not None and time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """Đẩy dữ liệu đã ghi xuống đĩa (fsync)."""
+        os.fsync(self._f.fileno())
+        self._last_sync = time.monotonic()
+
+    @property
+    def n_chunks(self):
+        return len(self._offsets)
+
+    def close(self):
+        """Ghi phần còn trong bộ đệm, ghi index và đóng file."""
+        if self._f.closed:
+            return
+        self._write_chunk()
+        index_offset = self._f.tell()
+        self._f.write(INDEX_MAGIC + struct.pack('<I', len(self._offsets)))
+        self._f.write(np.asarray(self._offsets, dtype='<u8').tobytes())
+        self._f.write(_TRAILER.pack(self.n_samples, index_offset, END_MAGIC))
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_header(f):
+    """Đọc header JSON ở đầu file .rec (f đã mở 'rb'). Trả về (header, offset chunk đầu tiên)."""
+    f.seek(0)
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"'{f.name}' không phải file .rec")
+    (size,) = struct.unpack('<I', f.read(4))
+    header = json.loads(f.read(size).decode('utf-8'))
+    return header, len(MAGIC) + 4 + size
+
+
+def _read_index(f, file_size):
+    """Offset các chunk theo index ở cuối file, hoặc None nếu file chưa được đóng đúng cách."""
+    if file_size < _TRAILER.size:
+        return None
+    f.seek(file_size - _TRAILER.size)
+    _, index_offset, end = _TRAILER.unpack(f.read(_TRAILER.size))
+    if end != END_MAGIC:
+        return None
+    f.seek(index_offset)
+    if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+        return None
+    (n_chunks,) = struct.unpack('<I', f.read(4))
+    return np.frombuffer(f.read(8 * n_chunks), dtype='<u8').tolist()
+
+
+def read_chunks(path):
+    """
+    Đọc lần lượt từng chunk của file .rec, trả về (t, rows) với rows (n, 3) int64
+    'ecg, ir, red'. Nếu file không có index (chương trình ghi bị tắt đột ngột),
+    quét tuần tự và dừng ở chunk đầu tiên bị cắt dở hoặc sai CRC.
+    """
+    with open(path, 'rb') as f:
+        header, first = read_header(f)
+        file_size = os.fstat(f.fileno()).st_size
+        offsets = _read_index(f, file_size)
+        scanning = offsets is None
+        pos = first
+        i = 0
+        while True:
+            if not scanning:
+                if i == len(offsets):
+                    return
+                pos = offsets[i]
+                i += 1
+            f.seek(pos)
+            head = f.read(_CHUNK_HEAD.size)
+            if len(head) < _CHUNK_HEAD.size:
+                return
+            magic, n, crc = _CHUNK_HEAD.unpack(head)
+            payload = f.read(n * _ITEMSIZE)
+            if magic != CHUNK_MAGIC or len(payload) < n * _ITEMSIZE or zlib.crc32(payload) != crc:
+                if scanning:
+                    return
+                raise ValueError(f"Chunk tại byte {pos} của '{path}' bị hỏng")
+            pos += _CHUNK_HEAD.size + len(payload)
+            yield _decode(payload, n)
+
+
+def _decode(payload, n):
+    cols = {}
+    offset = 0
+    for name, dt in COLUMNS:
+        cols[name] = np.frombuffer(payload, dtype=dt, count=n, offset=offset)
+        offset += n * np.dtype(dt).itemsize
+    rows = np.empty((n, 3), dtype=np.int64)
+    for i, name in enumerate(SIGNALS):
+        rows[:, i] = cols[name]
+    return cols['t'], rows
+
+
+def load_recording(path):
+    """Đọc toàn bộ file .rec. Trả về (header, t, rows)."""
+    with open(path, 'rb') as f:
+        header, _ = read_header(f)
+    chunks = list(read_chunks(path))
+    if not chunks:
+        return header, np.zeros(0), np.zeros((0, 3), dtype=np.int64)
+    t = np.concatenate([c[0] for c in chunks])
+    rows = np.concatenate([c[1] for c in chunks])
+    return header, t, rows
+
+
+def export_csv(path, out_path=None, timestamps=False):
+    """
+    Chuyển file .rec sang CSV cùng định dạng các file trong csv/ ('ecg,ir,red'
+    mỗi dòng, không có tiêu đề), để các script cũ (Final_csv.py...) đọc được.
+
+    Tham số:
+    - timestamps (bool): Thêm cột thời gian (giây, Unix time) ở đầu mỗi dòng.
+    Trả về số dòng đã ghi.
+    """
+    out_path = out_path or os.path.splitext(path)[0] + '.csv'
+    n = 0
+    with open(out_path, 'w', newline='') as f:
+        for t, rows in read_chunks(path):
+            if timestamps:
+                f.writelines(f"{ti:.3f},{a},{b},{c}\n" for ti, (a, b, c) in zip(t, rows.tolist()))
+            else:
+                np.savetxt(f, rows, fmt='%d', delimiter=',')
+            n += len(rows)
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chuyển file ghi .rec sang CSV (định dạng csv/*.csv).")
+    parser.add_argument('file', help="File .rec")
+    parser.add_argument('-o', '--output', default=None, help="File CSV (mặc định: cùng tên, đuôi .csv)")
+    parser.add_argument('--timestamps', action='store_true', help="Thêm cột thời gian ở đầu mỗi dòng")
+    args = parser.parse_args()
+
+    n = export_csv(args.file, args.output, timestamps=args.timestamps)
+    print(f"-> Đã ghi {n} dòng vào {args.output or os.path.splitext(args.file)[0] + '.csv'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import glob
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+
+from Serial_ingest import LineParser
+from Recorder import MAGIC, read_chunks
+
+# Đọc CSV theo khối 4 MB (bộ nhớ dùng khi chuyển đổi không phụ thuộc độ dài file)
+BLOCK_BYTES = 1 << 22
+N_FIELDS = 3
+
+
+class _Overflow(Exception):
+    pass
+
+
+def sidecar_path(path, suffix='.npy'):
+    """
+    Đường dẫn file cache .npy cho một bản ghi, gắn với kích thước và thời điểm
+    sửa file gốc: file gốc thay đổi thì tên cache đổi theo, cache cũ không bao giờ
+    bị dùng nhầm. Ví dụ: csv/data2.csv -> csv/.data2.csv.52000-1718000000000000000.npy
+
+    suffix: Phân biệt các loại file đi kèm (vd: '.ovr.npy' của Overview_index).
+    """
+    st = os.stat(path)
+    folder, name = os.path.split(os.path.abspath(path))
+    return os.path.join(folder, f".{name}.{st.st_size}-{st.st_mtime_ns}{suffix}")
+
+
+def remove_stale_caches(path, keep, suffix='.npy'):
+    """
+    Xóa file đi kèm (cùng suffix) của các phiên bản cũ của cùng file gốc, giữ lại 'keep'
+    (thường là sidecar_path(path, suffix) vừa tạo). File của suffix khác không bị đụng tới.
+    """
+    folder, name = os.path.split(os.path.abspath(path))
+    own = re.compile(re.escape(f".{name}.") + r"\d+-\d+" + re.escape(suffix) + "$")
+    for old in glob.glob(os.path.join(glob.escape(folder), f".{glob.escape(name)}.*-*{suffix}")):
+        if old != keep and own.match(os.path.basename(old)):
+            try:
+                os.unlink(old)
+            except OSError:
+                pass
+
+
+def load_recording(path, cache=True, verbose=False):
+    """
+    Tải bản ghi (CSV 'ecg,ir,red' hoặc file .rec của Recorder) thành mảng (n, 3)
+    số nguyên, thứ tự cột ECG, IR, RED (COL_ECG, COL_IR, COL_RED).
+
+    Lần đầu: đọc file theo khối, tách dòng bằng LineParser (Numpy, không tạo
+    tuple Python cho từng mẫu) và ghi ra file cache .npy cạnh file gốc.
+    Các lần sau: ánh xạ file cache vào bộ nhớ (np.load(mmap_mode='r')), khởi động
+    gần như tức thì và chỉ các trang thực sự được phát mới nằm trong RAM.
+
+    Dòng lỗi trong CSV (tiêu đề, dòng bị cắt...) bị bỏ qua như khi đọc Serial.
+
+    Tham số:
+    - cache (bool): Dùng/ghi file cache. False = luôn đọc lại vào RAM.
+    - verbose (bool): In thông tin (dùng cache hay đọc lại, số dòng lỗi).
+
+    Trả về np.memmap chỉ đọc (hoặc np.ndarray nếu không ghi được cache).
+    """
+    if not cache:
+        return _to_array(path)
+
+    cached = sidecar_path(path)
+    if os.path.exists(cached):
+        if verbose:
+            print(f"-> Dùng cache {os.path.basename(cached)}")
+        return np.load(cached, mmap_mode='r')
+
+    try:
+        malformed = _build_sidecar(path, cached)
+    except OSError as e:
+        # Thư mục chỉ đọc, hết dung lượng...: vẫn phát được, chỉ không có cache
+        if verbose:
+            print(f"-> Không ghi được cache ({e}), đọc vào bộ nhớ")
+        return _to_array(path)
+    remove_stale_caches(path, cached)
+    if verbose:
+        print(f"-> Đã tạo cache {os.path.basename(cached)}"
+              + (f" (bỏ qua {malformed} dòng lỗi)" if malformed else ""))
+    return np.load(cached, mmap_mode='r')
+
+
+def _iter_blocks(path, dtype):
+    """Sinh các khối (n, 3) của file, trả về (qua StopIteration.value) số dòng lỗi."""
+    with open(path, 'rb') as f:
+        is_rec = f.read(len(MAGIC)) == MAGIC
+    if is_rec:
+        for _, rows in read_chunks(path):
+            yield _check(rows, dtype)
+        return 0
+
+    parser = LineParser(n_fields=N_FIELDS)
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(BLOCK_BYTES)
+            if not data:
+                break
+            rows = parser.feed(data)
+            if len(rows):
+                yield _check(rows, dtype)
+    # Dòng cuối không có '\n'
+    rows = parser.feed(b'\n')
+    if len(rows):
+        yield _check(rows, dtype)
+    return parser.malformed
+
+
+def _check(rows, dtype):
+    info = np.iinfo(dtype)
+    if rows.min(initial=0) < info.min or rows.max(initial=0) > info.max:
+        raise _Overflow
+    return rows.astype(dtype, copy=False)
+
+
+def _to_array(path):
+    """Đọc cả file vào RAM (không cache)."""
+    blocks = list(_iter_blocks(path, np.int64))
+    if not blocks:
+        return np.empty((0, N_FIELDS), dtype=np.int64)
+    return np.concatenate(blocks)
+
+
+def _build_sidecar(path, cached):
+    """
+    Chuyển file gốc thành .npy: ghi dữ liệu ra file tạm theo từng khối, sau đó
+    ghi header .npy (cần biết số dòng) và chép dữ liệu sang, đổi tên nguyên tử.
+    Dữ liệu lưu int32 (ECG 12 bit, PPG 18 bit), chỉ dùng int64 khi giá trị vượt int32.
+    """
+    for dtype in (np.int32, np.int64):
+        try:
+            return _write_npy(path, cached, np.dtype(dtype))
+        except _Overflow:
+            continue
+
+
+def _write_npy(path, cached, dtype):
+    folder = os.path.dirname(cached)
+    n_rows = 0
+    with tempfile.TemporaryFile(dir=folder) as raw:
+        blocks = _iter_blocks(path, dtype)
+        while True:
+            try:
+                rows = next(blocks)
+            except StopIteration as stop:
+                malformed = stop.value
+                break
+            raw.write(rows.tobytes())
+            n_rows += len(rows)
+
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix='.npy.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                header = {'descr': np.lib.format.dtype_to_descr(dtype),
+                          'fortran_order': False, 'shape': (n_rows, N_FIELDS)}
+                np.lib.format.write_array_header_1_0(out, header)
+                raw.seek(0)
+                shutil.copyfileobj(raw, out, BLOCK_BYTES)
+            os.replace(tmp, cached)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    return malformed
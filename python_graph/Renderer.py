@@ -0,0 +1,239 @@
+import collections
+import time
+
+import numpy as np
+
+
+class EnvelopeDecimator:
+    def __init__(self, n_points, n_buckets):
+        """
+        Giảm số điểm vẽ bằng bao min/max: chia n_points mẫu thành n_buckets nhóm
+        (mỗi nhóm ~ một cột pixel), mỗi nhóm vẽ 2 đỉnh (min, max). Khác với lấy mẫu
+        thưa (y[::k]), đỉnh R của ECG hay đỉnh PPG không bao giờ bị mất.
+
+        Số đỉnh vẽ = 2 * n_buckets, không phụ thuộc độ dài cửa sổ (60 giây @ 250 Hz
+        vẫn chỉ ~1500 đỉnh với trục rộng 750 pixel). Khi n_points <= 2 * n_buckets
+        thì vẽ nguyên dữ liệu.
+
+        Tham số:
+        - n_points (int): Số mẫu của cửa sổ hiển thị.
+        - n_buckets (int): Số nhóm (thường = độ rộng trục tính bằng pixel).
+        """
+        self.n_points = int(n_points)
+        self.n_buckets = max(1, int(n_buckets))
+        self.passthrough = self.n_points <= 2 * self.n_buckets
+        if self.passthrough:
+            self.x = np.arange(self.n_points, dtype=np.float64)
+            return
+        # Biên các nhóm (chỉ số mẫu đầu mỗi nhóm)
+        self._starts = np.linspace(0, self.n_points, self.n_buckets + 1).astype(np.intp)[:-1]
+        self.x = np.repeat(self._starts.astype(np.float64), 2)
+        self._out = np.empty(2 * self.n_buckets)
+
+    def __call__(self, y):
+        """Trả về tọa độ Y đã giảm điểm (cùng độ dài với self.x)."""
+        y = np.asarray(y, dtype=np.float64)
+        if self.passthrough:
+            return y
+        lo = np.minimum.reduceat(y, self._starts)
+        hi = np.maximum.reduceat(y, self._starts)
+        # Nhóm chẵn vẽ min -> max, nhóm lẻ max -> min: đường nối giữa các nhóm ngắn hơn
+        pairs = self._out.reshape(-1, 2)
+        pairs[0::2, 0], pairs[0::2, 1] = lo[0::2], hi[0::2]
+        pairs[1::2, 0], pairs[1::2, 1] = hi[1::2], lo[1::2]
+        return self._out
+
+    @property
+    def n_vertices(self):
+        return len(self.x)
+
+
+class LiveRenderer:
+    def __init__(self, fig, interval=20, show_frame_time=True, history=300, metrics=None):
+        """
+        Vẽ thời gian thực bằng blitting thay cho FuncAnimation(blit=False).
+
+        - Chỉ các đường tín hiệu và dòng chữ BPM/SpO2 (artist 'animated') được vẽ lại
+          mỗi frame, trên nền (trục, lưới, nhãn...) đã lưu sẵn.
+        - Tiêu đề, giới hạn trục chỉ được đổi khi giá trị thật sự thay đổi; khi đó
+          mới vẽ lại toàn bộ hình một lần và lưu lại nền.
+        - Mỗi đường dùng EnvelopeDecimator theo độ rộng trục (pixel), tự tính lại khi
+          đổi kích thước cửa sổ.
+        - Đo thời gian mỗi frame (cập nhật + vẽ), xem frame_stats().
+
+        Cách dùng:
+            renderer = LiveRenderer(fig)
+            line = renderer.add_line(ax, n_points, color='green')
+            status = renderer.add_text(ax, "Waiting...")
+            def update():
+                renderer.set_line(line, y)
+                renderer.set_text(status, "BPM: 80", color='green')
+            renderer.start(update)
+            plt.show()
+
+        Tham số:
+        - fig: Figure của matplotlib.
+        - interval (int): Chu kỳ frame (ms).
+        - show_frame_time (bool): Hiện thời gian frame ở góc dưới hình.
+        - history (int): Số frame gần nhất dùng để tính thống kê.
+        - metrics: Metrics.Registry: thời gian cập nhật và vẽ mỗi frame
+                   ('vitals_render_seconds', nhãn phase = update/draw). None = không đo.
+        """
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.interval = interval
+        self._lines = []      # [Line2D, ax, n_points, EnvelopeDecimator, dữ liệu Y mới nhất]
+        self._texts = []
+        self._bg = None
+        self._dirty = True    # Cần vẽ lại toàn bộ (đổi tiêu đề, trục...)
+        self._timer = None
+        self._update = None
+        self.frame_times = collections.deque(maxlen=history)
+        self.full_redraws = 0
+        self.frames = 0
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+        self._frame_text = None
+        if show_frame_time:
+            self._frame_text = fig.text(0.99, 0.005, "", ha='right', va='bottom', fontsize=8,
+                                        color='gray', animated=True)
+            self._texts.append(self._frame_text)
+        self._last_report = 0.0
+        self._phase_times = None
+        if metrics is not None:
+            help = "Thời gian một frame: cập nhật dữ liệu (update) và vẽ (draw)"
+            self._phase_times = (metrics.histogram('vitals_render_seconds', help, {'phase': 'update'}),
+                                 metrics.histogram('vitals_render_seconds', help, {'phase': 'draw'}))
+
+    # --- Khai báo artist ---
+    def add_line(self, ax, n_points, **kwargs):
+        """Thêm một đường tín hiệu n_points mẫu (trục X: chỉ số mẫu 0..n_points). Trả về chỉ số đường."""
+        decimator = EnvelopeDecimator(n_points, self._axes_width(ax))
+        line, = ax.plot(decimator.x, np.zeros(decimator.n_vertices), animated=True, **kwargs)
+        ax.set_xlim(0, n_points)
+        self._lines.append([line, ax, n_points, decimator, None])
+        return len(self._lines) - 1
+
+    def add_text(self, ax, text="", x=0.01, y=0.97, **kwargs):
+        """Dòng chữ riêng (vd: BPM/SpO2) vẽ bằng blitting, tọa độ theo trục (0-1)."""
+        kwargs.setdefault('fontweight', 'bold')
+        kwargs.setdefault('ha', 'left')
+        artist = ax.text(x, y, text, transform=ax.transAxes, va='top', animated=True,
+                         bbox=dict(facecolor='white', alpha=0.8, edgecolor='none'), **kwargs)
+        self._texts.append(artist)
+        return artist
+
+    # --- Cập nhật trong mỗi frame ---
+    def set_line(self, index, y):
+        """Đặt dữ liệu mới cho đường 'index' (mảng n_points mẫu, cũ -> mới)."""
+        entry = self._lines[index]
+        entry[4] = y
+        entry[0].set_ydata(entry[3](y))
+
+    def set_text(self, artist, text, color=None):
+        """Đổi nội dung/màu chữ nếu khác hiện tại (không gây vẽ lại toàn bộ)."""
+        if artist.get_text() != text:
+            artist.set_text(text)
+        if color is not None and artist.get_color() != color:
+            artist.set_color(color)
+
+    def set_title(self, ax, text, **kwargs):
+        """Đổi tiêu đề trục, chỉ vẽ lại toàn bộ khi nội dung thay đổi."""
+        if ax.get_title() != text:
+            ax.set_title(text, **kwargs)
+            self._dirty = True
+
+    def set_ylim(self, ax, bottom, top):
+        """Đổi giới hạn trục Y, chỉ vẽ lại toàn bộ khi giá trị thay đổi."""
+        if ax.get_ylim() != (bottom, top):
+            ax.set_ylim(bottom, top)
+            self._dirty = True
+
+    # --- Vẽ ---
+    def _axes_width(self, ax):
+        return max(1, int(round(ax.get_window_extent().width)))
+
+    def _on_draw(self, event):
+        """Sau mỗi lần vẽ toàn bộ (lần đầu, đổi kích thước, đổi tiêu đề...): lưu nền mới."""
+        if event is not None and event.canvas is not self.canvas:
+            return
+        # Đổi kích thước cửa sổ: tính lại số nhóm giảm điểm theo độ rộng trục mới
+        for entry in self._lines:
+            line, ax, n_points, decimator, y = entry
+            width = self._axes_width(ax)
+            if width != decimator.n_buckets:
+                entry[3] = decimator = EnvelopeDecimator(n_points, width)
+                line.set_data(decimator.x, decimator(y) if y is not None else np.zeros(decimator.n_vertices))
+        self._bg = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_animated()
+        self.full_redraws += 1
+
+    def _draw_animated(self):
+        for entry in self._lines:
+            entry[1].draw_artist(entry[0])
+        for artist in self._texts:
+            self.fig.draw_artist(artist)
+
+    def draw(self):
+        """Vẽ một frame: blit nếu nền còn dùng được, ngược lại vẽ lại toàn bộ."""
+        if self._dirty or self._bg is None or not self.canvas.supports_blit:
+            self._dirty = False
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self._bg)
+            self._draw_animated()
+            self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()
+
+    def step(self):
+        """Một frame: gọi hàm update rồi vẽ. Trả về thời gian frame (giây)."""
+        t0 = time.perf_counter()
+        if self._update is not None:
+            self._update()
+        if self._phase_times is not None:
+            t1 = time.perf_counter()
+            self._phase_times[0].observe(t1 - t0)
+        self.draw()
+        dt = time.perf_counter() - t0
+        if self._phase_times is not None:
+            self._phase_times[1].observe(t0 + dt - t1)
+        self.frame_times.append(dt)
+        self.frames += 1
+        if self._frame_text is not None and t0 - self._last_report >= 0.5:
+            self._last_report = t0
+            s = self.frame_stats()
+            self._frame_text.set_text(f"frame {s['mean_ms']:.1f} ms (p95 {s['p95_ms']:.1f}), "
+                                      f"{self.n_vertices} điểm vẽ")
+        return dt
+
+    def start(self, update):
+        """Gắn hàm update (không tham số) và chạy bộ hẹn giờ của cửa sổ (gọi trước plt.show())."""
+        self._update = update
+        self._timer = self.canvas.new_timer(interval=self.interval)
+        self._timer.add_callback(self.step)
+        self._timer.start()
+        return self
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.stop()
+
+    # --- Thống kê ---
+    @property
+    def n_vertices(self):
+        """Tổng số đỉnh vẽ mỗi frame của mọi đường."""
+        return sum(entry[3].n_vertices for entry in self._lines)
+
+    def frame_stats(self):
+        """Thời gian frame (ms) trên các frame gần nhất: trung bình, p95, lớn nhất."""
+        if not self.frame_times:
+            return {'frames': self.frames, 'mean_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0,
+                    'full_redraws': self.full_redraws}
+        t = np.fromiter(self.frame_times, dtype=np.float64) * 1e3
+        return {
+            'frames': self.frames,
+            'mean_ms': float(t.mean()),
+            'p95_ms': float(np.percentile(t, 95)),
+            'max_ms': float(t.max()),
+            'full_redraws': self.full_redraws,
+        }
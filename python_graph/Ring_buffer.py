@@ -0,0 +1,90 @@
+import numpy as np
+
+
+class RingBuffer:
+    def __init__(self, capacity, n_channels=1, dtype=np.float64, fill=0):
+        """
+        Bộ đệm vòng (Ring Buffer) nhiều kênh dựa trên Numpy, dung lượng cố định.
+        Dùng thay cho deque(maxlen=...) + list(...) mỗi frame.
+
+        - extend(): Thêm một khối mẫu, chi phí O(số mẫu mới), không cấp phát.
+        - channel(i) / view(): Trả về view theo đúng thứ tự thời gian (cũ -> mới)
+          mà KHÔNG copy, có thể đưa thẳng vào line.set_ydata,
+          RealTimeSmoother.apply hay PPGAnalyzer.analyze.
+
+        Cách làm: mỗi kênh được lưu trong một hàng dài 2 * capacity và mỗi mẫu
+        được ghi 2 lần (ở vị trí i và i + capacity), nên cửa sổ
+        [head, head + capacity) luôn liên tục trong bộ nhớ.
+
+        Tham số:
+        - capacity (int): Số mẫu giữ lại (vd: WINDOW_SIZE = 500).
+        - n_channels (int): Số kênh (vd: 2 cho IR, RED).
+        - dtype: Kiểu lưu trữ, np.float32 (tiết kiệm bộ nhớ) hoặc np.float64.
+        - fill: Giá trị ban đầu (giống deque([0] * capacity)).
+        """
+        self.capacity = int(capacity)
+        self.n_channels = int(n_channels)
+        self.dtype = np.dtype(dtype)
+        self._data = np.full((self.n_channels, 2 * self.capacity), fill, dtype=self.dtype)
+        self._head = 0
+        # Tổng số mẫu đã ghi từ đầu (dùng để biết dữ liệu mới/cũ)
+        self.total_written = 0
+
+    def __len__(self):
+        """Số mẫu thật đã ghi (tối đa capacity)."""
+        return min(self.total_written, self.capacity)
+
+    def extend(self, block):
+        """
+        Thêm một khối mẫu vào cuối bộ đệm (mẫu cũ nhất tự bị đẩy ra).
+        Input: (n,) nếu chỉ có 1 kênh, hoặc (n, n_channels).
+        """
+        x = np.asarray(block, dtype=self.dtype)
+        if x.ndim == 1:
+            x = x.reshape(-1, 1) if self.n_channels == 1 else x.reshape(1, -1)
+        n = x.shape[0]
+        if n == 0:
+            return
+        if x.shape[1] != self.n_channels:
+            raise ValueError(f"Khối dữ liệu có {x.shape[1]} kênh, bộ đệm có {self.n_channels} kênh")
+
+        self.total_written += n
+        cap = self.capacity
+        if n > cap:
+            x = x[-cap:]
+            n = cap
+        x = x.T
+
+        start = self._head
+        first = min(n, cap - start)
+        self._data[:, start:start + first] = x[:, :first]
+        self._data[:, start + cap:start + cap + first] = x[:, :first]
+        rest = n - first
+        if rest:
+            self._data[:, :rest] = x[:, first:]
+            self._data[:, cap:cap + rest] = x[:, first:]
+        self._head = (start + n) % cap
+
+    def append(self, sample):
+        """Thêm một mẫu (1 giá trị mỗi kênh)."""
+        self.extend(np.reshape(sample, (1, self.n_channels)))
+
+    def channel(self, index=0):
+        """View 1 chiều liên tục (capacity,) của một kênh, cũ -> mới."""
+        return self._data[index, self._head:self._head + self.capacity]
+
+    def view(self):
+        """View (capacity, n_channels) của toàn bộ kênh, cũ -> mới (không copy)."""
+        return self._data[:, self._head:self._head + self.capacity].T
+
+    def latest(self, n, index=0):
+        """View n mẫu mới nhất của một kênh."""
+        n = min(int(n), self.capacity)
+        end = self._head + self.capacity
+        return self._data[index, end - n:end]
+
+    def clear(self, fill=0):
+        """Xóa bộ đệm về giá trị ban đầu."""
+        self._data[:] = fill
+        self._head = 0
+        self.total_written = 0
@@ -1,5 +1,7 @@
 import numpy as np
-from scipy.signal import savgol_filter
+from scipy.signal import savgol_filter, savgol_coeffs
+
+from Ring_buffer import RingBuffer
 
 class RealTimeSmoother:
     def __init__(self, window_length=7, polyorder=3, mode='interp'):
@@ -32,11 +34,11 @@ class RealTimeSmoother:
     def apply(self, data_input):
         """
         Hàm xử lý chính. 
-        Input: List, Deque hoặc Numpy Array.
+        Input: List, Deque, Numpy Array hoặc view của RingBuffer.
         Output: Numpy Array đã làm mượt.
         """
-        # Chuyển đổi sang numpy array để xử lý
-        x = np.array(data_input)
+        # Chuyển đổi sang numpy array để xử lý (không copy nếu đã là array)
+        x = np.asarray(data_input)
         
         # KIỂM TRA AN TOÀN:
         # Scipy yêu cầu độ dài dữ liệu (x.size) phải lớn hơn window_length
@@ -57,4 +59,76 @@ class RealTimeSmoother:
             
         except Exception as e:
             print(f"Lỗi SGS: {e}")
-            return x
\ No newline at end of file
+            return x
+
+
+class StreamingSmoother(RealTimeSmoother):
+    def __init__(self, window_length=7, polyorder=3, capacity=500, dtype=np.float64):
+        """
+        Bộ làm mượt Savitzky-Golay dạng luồng (Streaming).
+
+        Khác với RealTimeSmoother.apply() (lọc lại toàn bộ cửa sổ mỗi frame),
+        lớp này tính trước hệ số tích chập SG một lần, chỉ làm mượt các mẫu
+        mới đến và ghi vào bộ đệm đầu ra cố định. Chi phí mỗi frame tỉ lệ với
+        số mẫu nhận được, không phụ thuộc độ dài cửa sổ hiển thị (30-60 giây).
+
+        Độ trễ nhóm cố định: mẫu làm mượt ở cuối bộ đệm ứng với mẫu đầu vào
+        cách đó 'delay' = (window_length - 1) / 2 mẫu (vd: 4 mẫu = 40ms @ 100Hz
+        với window_length=9), vì SG cần dữ liệu ở cả hai phía của điểm giữa.
+
+        Tham số:
+        - window_length, polyorder: Giống RealTimeSmoother.
+        - capacity: Số điểm giữ trong bộ đệm đầu ra (độ dài cửa sổ hiển thị).
+        - dtype: Kiểu lưu trữ của bộ đệm đầu ra (np.float32 hoặc np.float64).
+        """
+        super().__init__(window_length, polyorder)
+        if self.polyorder >= self.window_length:
+            raise ValueError("Polyorder phải nhỏ hơn Window Length.")
+
+        self.capacity = capacity
+        self.delay = (self.window_length - 1) // 2
+        self.coeffs = savgol_coeffs(self.window_length, self.polyorder)
+
+        # (window_length - 1) mẫu đầu vào gần nhất, cần để tính mẫu mới
+        self._history = np.zeros(self.window_length - 1)
+
+        # Bộ đệm đầu ra: output luôn là một view liên tục theo thứ tự thời gian
+        self.buffer = RingBuffer(capacity, dtype=dtype)
+
+    def update(self, new_samples):
+        """
+        Làm mượt các mẫu mới đến và ghi vào bộ đệm đầu ra.
+        Input: List hoặc Numpy Array các mẫu mới (đã lọc).
+        Output: View của bộ đệm đầu ra (xem thuộc tính output).
+        """
+        smoothed = self.smooth(new_samples)
+        if smoothed.size:
+            self.buffer.extend(smoothed)
+        return self.output
+
+    def smooth(self, new_samples):
+        """
+        Giống update() nhưng trả về các mẫu đã làm mượt (cùng độ dài đầu vào,
+        trễ 'delay' mẫu) và không ghi vào bộ đệm đầu ra. Dùng khi tầng sau cần
+        toàn bộ khối (vd: Block_pipeline.SmootherStage) chứ không chỉ cửa sổ hiển thị.
+        """
+        x = np.asarray(new_samples, dtype=np.float64)
+        if x.size == 0:
+            return x
+
+        window = np.concatenate((self._history, x))
+        # Hệ số SG đối xứng nên tích chập 'valid' cho đúng len(x) mẫu mới
+        smoothed = np.convolve(window, self.coeffs, mode='valid')
+        # Cắt từ đầu: window[-0:] sẽ giữ cả khối khi window_length = 1
+        self._history = window[len(window) - (self.window_length - 1):]
+        return smoothed
+
+    @property
+    def output(self):
+        """capacity mẫu đã làm mượt gần nhất (cũ -> mới), view không copy."""
+        return self.buffer.channel(0)
+
+    def reset(self):
+        """Xóa lịch sử và bộ đệm đầu ra."""
+        self._history[:] = 0
+        self.buffer.clear()
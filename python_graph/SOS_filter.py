@@ -0,0 +1,123 @@
+import numpy as np
+from scipy.signal import sosfilt, sosfilt_zi
+
+# Nhân C bên trong scipy.signal.sosfilt (scipy.signal._sosfilt._sosfilt). Là API riêng
+# của SciPy, có thể đổi hoặc biến mất giữa các phiên bản: chỉ dùng khi được bật bằng
+# use_fast_kernel(True) và qua được phép thử. None = dùng hàm public sosfilt.
+_fast_kernel = None
+
+
+def use_fast_kernel(enable=True):
+    """
+    Bật/tắt nhân C riêng của SciPy cho sosfilt_inplace (mặc định tắt). Hàm public
+    sosfilt tốn ~60us mỗi lần gọi cho việc kiểm tra kiểu/đổi trục, lớn hơn nhiều so
+    với thời gian lọc một khối 1-2 mẫu.
+
+    Trước khi bật, nhân được gọi thử trên một khối nhỏ và so với sosfilt: không
+    import được, sai chữ ký (TypeError...) hoặc khác kết quả thì vẫn dùng sosfilt.
+    Áp dụng cho cả tiến trình. Trả về True nếu nhân riêng đang được dùng.
+    """
+    global _fast_kernel
+    _fast_kernel = _load_fast_kernel() if enable else None
+    return _fast_kernel is not None
+
+
+def _load_fast_kernel():
+    try:
+        from scipy.signal._sosfilt import _sosfilt as kernel
+    except ImportError:
+        return None
+    sos = np.array([[0.2, 0.4, 0.2, 1.0, -0.5, 0.2], [1.0, -1.0, 0.0, 1.0, -0.3, 0.0]])
+    x = np.arange(14, dtype=np.float64).reshape(2, 7) % 5
+    zi = np.linspace(-1, 1, 8).reshape(2, 2, 2)
+    y, zf = sosfilt(sos, x, axis=-1, zi=zi.transpose(1, 0, 2))
+    try:
+        kernel(sos, x, zi)
+    except (TypeError, ValueError):
+        return None
+    if not (np.allclose(x, y, rtol=1e-12, atol=0) and np.allclose(zi, zf.transpose(1, 0, 2), rtol=1e-12, atol=0)):
+        return None
+    return kernel
+
+
+def sosfilt_inplace(sos, x, zi):
+    """
+    Lọc SOS tại chỗ (dùng cho vòng lặp real-time): x và zi được ghi đè bằng kết quả.
+
+    Mặc định gọi hàm public scipy.signal.sosfilt(sos, x, zi=...) rồi chép kết quả vào
+    x, zi. Sau use_fast_kernel(True) (đã qua phép thử), gọi thẳng nhân C riêng của
+    SciPy, không cấp phát gì.
+
+    Tham số:
+    - sos: Mảng float64 (n_sections, 6), C-contiguous.
+    - x: Mảng float64 (n_signals, n_samples), C-contiguous. Bị ghi đè bằng kết quả.
+    - zi: Mảng float64 (n_signals, n_sections, 2), C-contiguous. Được cập nhật tại chỗ.
+    """
+    if _fast_kernel is not None:
+        _fast_kernel(sos, x, zi)
+        return
+    y, zf = sosfilt(sos, x, axis=-1, zi=zi.transpose(1, 0, 2))
+    x[...] = y
+    zi[...] = zf.transpose(1, 0, 2)
+
+
+class RealTimeSOSFilter:
+    def __init__(self, sos):
+        """
+        Bộ lọc IIR dạng Second-Order Sections (SOS) chạy Real-time.
+        Dựa trên: scipy.signal.sosfilt + sosfilt_zi
+
+        Mỗi hàng của 'sos' là một khâu bậc 2 [b0, b1, b2, a0, a1, a2].
+        So với dạng hàm truyền (b, a), dạng SOS ổn định số học hơn nhiều khi
+        bậc lọc cao hoặc tần số lấy mẫu cao (các cực nằm sát vòng tròn đơn vị).
+
+        Tham số:
+        - sos (array): Mảng (n_sections, 6). Có thể ghép nhiều bộ lọc bằng
+                       RealTimeSOSFilter.cascade(...).
+        """
+        self.sos = np.ascontiguousarray(np.atleast_2d(np.asarray(sos, dtype=np.float64)))
+        if self.sos.ndim != 2 or self.sos.shape[1] != 6:
+            raise ValueError("sos phải có dạng (n_sections, 6)")
+
+        # Trạng thái ban đầu ứng với đầu vào bậc thang đơn vị (giống lfilter_zi)
+        self.zi = sosfilt_zi(self.sos)
+
+    @classmethod
+    def cascade(cls, *filters):
+        """
+        Ghép nhiều bộ lọc thành một chuỗi SOS duy nhất.
+        Vd: RealTimeSOSFilter.cascade(notch, bandpass) -> mỗi mẫu chỉ đi qua
+        một lần gọi sosfilt thay vì hai lần lfilter.
+
+        Mỗi phần tử có thể là đối tượng có hàm to_sos() (RealTimeNotchFilter,
+        RealTimeBandpassFilter, RealTimeSOSFilter) hoặc một mảng sos.
+        """
+        sections = [f.to_sos() if hasattr(f, 'to_sos') else np.atleast_2d(f) for f in filters]
+        return cls(np.vstack(sections))
+
+    @property
+    def n_sections(self):
+        return self.sos.shape[0]
+
+    def to_sos(self):
+        """Xuất các khâu bậc 2 (bản sao)."""
+        return self.sos.copy()
+
+    def filter(self, new_sample):
+        """Lọc một mẫu đơn lẻ (giữ nguyên giao diện của RealTimeBandpassFilter)."""
+        return self.filter_block([new_sample])[0]
+
+    def filter_block(self, samples):
+        """
+        Lọc một khối nhiều mẫu liên tiếp, trạng thái zi được giữ giữa các lần gọi.
+        """
+        x = np.array(samples, dtype=np.float64, ndmin=2, order='C')
+        if x.size == 0:
+            return x.ravel()
+        # self.zi có dạng (n_sections, 2) -> thêm trục n_signals = 1 (view, không copy)
+        sosfilt_inplace(self.sos, x, self.zi[None])
+        return x[0]
+
+    def reset(self):
+        """Reset trạng thái bộ lọc về ban đầu"""
+        self.zi = sosfilt_zi(self.sos)
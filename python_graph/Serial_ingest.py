@@ -0,0 +1,236 @@
+import time
+
+import numpy as np
+
+# Thứ tự cột trong mỗi dòng Serial "ecg,ir,red"
+# (firmware in "ecg,red,ir" nhưng MAX30102 bị đảo Red/IR, xem src/main.cpp)
+COL_ECG, COL_IR, COL_RED = 0, 1, 2
+
+_NL, _COMMA = ord('\n'), ord(',')
+_MAX_DIGITS = 18                  # Số có hơn 18 chữ số sẽ tràn int64
+_ALLOWED = b'0123456789,\r\n'
+_DIGITS_COMMA = b'0123456789,'
+_SEPARATORS = b',\r\n'
+# Dưới ngưỡng này tách từng dòng nhanh hơn (chi phí cố định của mỗi lệnh Numpy)
+_MIN_VECTOR_LINES = 16
+
+
+class LineParser:
+    def __init__(self, n_fields=3, max_line=64):
+        """
+        Bộ tách dòng CSV số nguyên theo khối, thay cho
+        readline().decode().strip().split(',') + float() cho từng dòng.
+
+        feed() nhận một khối byte bất kỳ (có thể cắt ngang dòng), phần dòng
+        chưa trọn được giữ lại cho lần gọi sau. Khi khối đủ lớn, toàn bộ các dòng
+        trọn vẹn được kiểm tra và chuyển thành số bằng Numpy trong một lần,
+        không có vòng lặp Python theo dòng. Khối nhỏ hoặc có dòng lỗi được tách
+        từng dòng trên bytes (không decode, không float()).
+
+        Dòng hợp lệ: đúng n_fields số nguyên không âm, ngăn cách bằng dấu phẩy,
+        kết thúc bằng '\\n' hoặc '\\r\\n'. Các dòng khác (dòng chào
+        "Khoi tao he thong...", ký tự '!' khi tuột dây, dòng bị cắt cụt...)
+        bị bỏ qua và được đếm trong 'malformed'. Dòng trống bị bỏ qua, không đếm.
+
+        Tham số:
+        - n_fields (int): Số cột mỗi dòng (3 cho ECG, IR, RED).
+        - max_line (int): Độ dài tối đa một dòng (byte). Dòng dài hơn bị coi là lỗi,
+                          tránh phần dư phình to khi mất '\\n'.
+        """
+        self.n_fields = int(n_fields)
+        self.max_line = int(max_line)
+        self._pending = b''
+        # Bộ đếm thống kê
+        self.lines = 0       # Số dòng hợp lệ đã tách
+        self.malformed = 0   # Số dòng lỗi đã bỏ qua
+
+    def feed(self, data):
+        """
+        Nạp một khối byte, trả về mảng int64 (n, n_fields) các dòng hợp lệ trọn vẹn.
+        """
+        buf = self._pending + bytes(data) if self._pending else bytes(data)
+        end = buf.rfind(b'\n') + 1
+        if end == 0:
+            # Chưa có dòng trọn vẹn nào
+            if len(buf) > self.max_line:
+                self.malformed += 1
+                buf = b''
+            self._pending = buf
+            return np.empty((0, self.n_fields), dtype=np.int64)
+
+        self._pending = buf[end:]
+        if len(self._pending) > self.max_line:
+            self.malformed += 1
+            self._pending = b''
+        return self._parse(buf[:end])
+
+    def _parse(self, block):
+        n_lines = block.count(b'\n')
+        if n_lines >= _MIN_VECTOR_LINES:
+            values = self._parse_clean(block, n_lines)
+            if values is not None:
+                self.lines += n_lines
+                return values
+        # Khối nhỏ (1-2 dòng mỗi frame) hoặc có dòng lỗi: tách từng dòng trên bytes
+        return self._parse_lines(block)
+
+    def _parse_clean(self, block, n_lines):
+        """
+        Đường nhanh: kiểm tra cả khối bằng các phép toán trên bytes/Numpy, nếu
+        mọi dòng đều hợp lệ thì chuyển toàn bộ thành số bằng một lần np.fromstring.
+        Trả về None nếu khối có dòng lỗi.
+        """
+        if block.translate(None, _ALLOWED):
+            return None
+        if b'\r' in block:
+            if block.count(b'\r') != block.count(b'\r\n'):
+                return None
+            block = block.replace(b'\r', b'')
+        # Trường rỗng hoặc dòng trống
+        if block[0] in _SEPARATORS or b',,' in block or b',\n' in block \
+                or b'\n,' in block or b'\n\n' in block:
+            return None
+
+        arr = np.frombuffer(block, dtype=np.uint8)
+        sep = np.flatnonzero((arr == _COMMA) | (arr == _NL))
+        # Mỗi dòng đúng n_fields trường: dấu phân cách thứ n_fields của mỗi dòng là '\n'
+        if len(sep) != n_lines * self.n_fields or not np.all(arr[sep[self.n_fields - 1::self.n_fields]] == _NL):
+            return None
+        # Độ rộng mỗi trường (tránh tràn int64)
+        if sep[0] > _MAX_DIGITS or np.diff(sep).max(initial=0) > _MAX_DIGITS + 1:
+            return None
+
+        values = np.fromstring(block[:-1].replace(b'\n', b','), dtype=np.int64, sep=',')
+        return values.reshape(n_lines, self.n_fields)
+
+    def _parse_lines(self, block):
+        good = []
+        for line in block.split(b'\n')[:-1]:
+            if line.endswith(b'\r'):
+                line = line[:-1]
+            if not line:
+                continue
+            if (line.count(b',') == self.n_fields - 1 and not line.translate(None, _DIGITS_COMMA)
+                    and line[0] != _COMMA and line[-1] != _COMMA and b',,' not in line
+                    and (len(line) <= _MAX_DIGITS or max(map(len, line.split(b','))) <= _MAX_DIGITS)):
+                good.append(line)
+            else:
+                # Dòng chào, '!' khi tuột dây, dòng bị cắt cụt...
+                self.malformed += 1
+        self.lines += len(good)
+        if not good:
+            return np.empty((0, self.n_fields), dtype=np.int64)
+        values = np.fromstring(b','.join(good), dtype=np.int64, sep=',')
+        return values.reshape(len(good), self.n_fields)
+
+    def reset(self):
+        """Bỏ phần dòng đang dở và xóa bộ đếm."""
+        self._pending = b''
+        self.lines = 0
+        self.malformed = 0
+
+
+class SerialIngest:
+    def __init__(self, ser, n_fields=3, max_line=64):
+        """
+        Đọc dữ liệu Serial theo khối: mỗi lần gọi chỉ một lần ser.read() lấy
+        toàn bộ ser.in_waiting, sau đó tách dòng bằng LineParser.
+
+        Tham số:
+        - ser: Đối tượng serial.Serial (hoặc bất kỳ đối tượng nào có
+               in_waiting, read(), reset_input_buffer()).
+        """
+        self.ser = ser
+        self.parser = LineParser(n_fields=n_fields, max_line=max_line)
+        self.bytes_read = 0
+        self._parse_time = None
+        self._ready_rows = None  # Mẫu nhận được trong wait_ready(), trả về ở lần đọc kế tiếp
+
+    @property
+    def lines(self):
+        return self.parser.lines
+
+    @property
+    def malformed(self):
+        return self.parser.malformed
+
+    def poll(self):
+        """
+        Không chặn: đọc hết những gì đang có trong bộ đệm.
+        Trả về mảng int64 (n, n_fields), n có thể bằng 0.
+        """
+        if self._ready_rows is not None:
+            return self._take_ready()
+        waiting = self.ser.in_waiting
+        if not waiting:
+            return self.parser.feed(b'')
+        return self._feed(self.ser.read(waiting))
+
+    def read_block(self):
+        """
+        Chặn tối đa ser.timeout giây chờ byte đầu tiên, sau đó đọc luôn phần
+        còn lại trong bộ đệm. Dùng cho luồng đọc nền (tránh vòng lặp bận).
+        """
+        if self._ready_rows is not None:
+            return self._take_ready()
+        data = self.ser.read(1)
+        waiting = self.ser.in_waiting
+        if waiting:
+            data += self.ser.read(waiting)
+        return self._feed(data)
+
+    def wait_ready(self, timeout=5.0):
+        """
+        Chờ dòng dữ liệu hợp lệ đầu tiên (thay cho time.sleep cố định sau khi mở cổng):
+        ESP32 khởi động lại khi mở cổng, in dòng chào rồi mới gửi mẫu; các dòng chào/rác
+        bị bỏ qua như mọi dòng lỗi. Các mẫu đã nhận trong lúc chờ không bị bỏ: lần
+        read_block()/poll() kế tiếp trả về chúng. Trả về số mẫu đó, hoặc raise
+        TimeoutError nếu sau 'timeout' giây vẫn chưa có dòng hợp lệ nào.
+
+        Cổng mở với timeout=None (read() chặn mãi) được đặt tạm timeout đọc 0.1 giây
+        trong lúc chờ để hạn 'timeout' luôn được kiểm tra.
+        """
+        deadline = time.perf_counter() + timeout
+        read_timeout = getattr(self.ser, 'timeout', 0)
+        if read_timeout is None:
+            self.ser.timeout = 0.1
+        try:
+            while True:
+                rows = self.read_block()
+                if len(rows):
+                    self._ready_rows = rows
+                    return len(rows)
+                if time.perf_counter() >= deadline:
+                    raise TimeoutError(f"Không nhận được dòng dữ liệu hợp lệ nào sau {timeout:g} giây "
+                                       f"({self.bytes_read} byte, {self.malformed} dòng lỗi)")
+        finally:
+            if read_timeout is None:
+                self.ser.timeout = None
+
+    def _take_ready(self):
+        rows, self._ready_rows = self._ready_rows, None
+        return rows
+
+    def instrument(self, metrics):
+        """Đo thời gian tách dòng mỗi lần đọc (Metrics.Registry) và số byte đã đọc."""
+        self._parse_time = metrics.histogram('vitals_parse_seconds', "Thời gian tách dòng một khối byte Serial")
+        metrics.counter('vitals_serial_bytes_total', "Số byte đã đọc từ cổng Serial", fn=lambda: self.bytes_read)
+
+    def _feed(self, data):
+        self.bytes_read += len(data)
+        if self._parse_time is None or not data:
+            return self.parser.feed(data)
+        t0 = time.perf_counter()
+        rows = self.parser.feed(data)
+        self._parse_time.observe(time.perf_counter() - t0)
+        return rows
+
+    def reset_input_buffer(self):
+        """Xóa bộ đệm Serial và phần dòng đang dở."""
+        self.ser.reset_input_buffer()
+        self.parser._pending = b''
+        self._ready_rows = None
+
+    def close(self):
+        """Đóng cổng Serial."""
+        self.ser.close()
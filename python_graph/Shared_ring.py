@@ -0,0 +1,253 @@
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# --- BỐ CỤC VÙNG NHỚ CHIA SẺ ---
+# [header: 8 x int64][dtype: 16 byte ASCII][căn lề 64 byte][data: (n_channels, 2 * capacity)]
+_MAGIC = 0x50504745434752  # "PPGECGR"
+_H_MAGIC, _H_CAPACITY, _H_CHANNELS, _H_SEQ, _H_CLOSED = range(5)
+_HEADER_SLOTS = 8
+_DTYPE_OFFSET = _HEADER_SLOTS * 8
+_DTYPE_BYTES = 16
+_DATA_OFFSET = 128
+
+
+class SharedRingBuffer:
+    def __init__(self, capacity, n_channels=3, dtype=np.int64, name=None):
+        """
+        Bộ đệm vòng nhiều kênh trong bộ nhớ chia sẻ (multiprocessing.shared_memory),
+        một tiến trình ghi - nhiều tiến trình đọc, không pickle, không copy.
+
+        Cùng cách lưu với RingBuffer (mỗi mẫu ghi 2 lần, cửa sổ luôn liên tục),
+        nên view()/channel()/latest() trả về view Numpy trực tiếp trên vùng nhớ chung.
+
+        Giao thức (bộ đếm tuần tự):
+        - Bên ghi chép dữ liệu vào các ô trước, sau đó mới tăng bộ đếm 'seq'
+          (tổng số mẫu đã ghi) trong header. Bên đọc chỉ đọc các mẫu < seq.
+        - Mẫu thứ k nằm ở ô k % capacity và chỉ bị ghi đè khi seq > k + capacity.
+          Bên đọc dùng read_new() (tự theo dõi con trỏ, báo số mẫu bị mất nếu đọc
+          chậm hơn capacity) và is_valid(start) để kiểm tra lại sau khi dùng view.
+
+        Tạo (bên ghi):  ring = SharedRingBuffer(capacity, n_channels, dtype)
+        Gắn vào (bên đọc, tiến trình khác):  SharedRingBuffer.attach(ring.name)
+
+        Tham số:
+        - capacity (int): Số mẫu giữ lại.
+        - n_channels (int): Số kênh (3 cho ECG, IR, RED thô).
+        - dtype: Kiểu dữ liệu (np.int64 cho dữ liệu thô từ Serial, np.float64 cho dữ liệu đã lọc).
+        - name (str): Tên vùng nhớ (None = tự sinh).
+        """
+        capacity, n_channels, dtype = int(capacity), int(n_channels), np.dtype(dtype)
+        if capacity <= 0 or n_channels <= 0:
+            raise ValueError("capacity và n_channels phải > 0")
+        size = _DATA_OFFSET + n_channels * 2 * capacity * dtype.itemsize
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._owner = True
+        self.writable = True
+        self._setup()
+        self._header[:] = 0
+        self._header[_H_CAPACITY] = capacity
+        self._header[_H_CHANNELS] = n_channels
+        self._shm.buf[_DTYPE_OFFSET:_DTYPE_OFFSET + _DTYPE_BYTES] = dtype.str.encode('ascii').ljust(_DTYPE_BYTES, b'\0')
+        self._map_data(capacity, n_channels, dtype)
+        self._data[:] = 0
+        # Ghi magic sau cùng: bên đọc chỉ gắn vào khi header đã đầy đủ
+        self._header[_H_MAGIC] = _MAGIC
+
+    @classmethod
+    def attach(cls, name, writer=False):
+        """
+        Gắn vào vùng nhớ đã có (không sở hữu: close() không xóa vùng nhớ).
+        writer=True khi tiến trình gắn vào là bên ghi duy nhất (vd: tiến trình DSP
+        ghi dữ liệu hiển thị vào bộ đệm do tiến trình chính tạo).
+        """
+        self = cls.__new__(cls)
+        self._shm = _attach_shm(name)
+        self._owner = False
+        self.writable = writer
+        self._setup()
+        if self._header[_H_MAGIC] != _MAGIC:
+            self._shm.close()
+            raise ValueError(f"'{name}' không phải SharedRingBuffer")
+        dtype = np.dtype(bytes(self._shm.buf[_DTYPE_OFFSET:_DTYPE_OFFSET + _DTYPE_BYTES]).rstrip(b'\0').decode('ascii'))
+        self._map_data(int(self._header[_H_CAPACITY]), int(self._header[_H_CHANNELS]), dtype)
+        # Bên đọc mới gắn vào bắt đầu từ dữ liệu mới nhất
+        self.cursor = self.total_written
+        return self
+
+    def _setup(self):
+        self._header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=self._shm.buf)
+        self.cursor = 0
+
+    def _map_data(self, capacity, n_channels, dtype):
+        self.capacity = capacity
+        self.n_channels = n_channels
+        self.dtype = dtype
+        self._data = np.ndarray((n_channels, 2 * capacity), dtype=dtype,
+                                buffer=self._shm.buf, offset=_DATA_OFFSET)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def total_written(self):
+        """Bộ đếm tuần tự: tổng số mẫu đã ghi (đã công bố) từ đầu."""
+        return int(self._header[_H_SEQ])
+
+    @property
+    def closed(self):
+        """True khi bên ghi đã báo kết thúc (mark_closed)."""
+        return bool(self._header[_H_CLOSED])
+
+    def __len__(self):
+        return min(self.total_written, self.capacity)
+
+    # --- Bên ghi ---
+    def extend(self, block):
+        """
+        Ghi một khối (n,) hoặc (n, n_channels), rồi mới công bố bằng cách tăng seq.
+        Chỉ một tiến trình/luồng được ghi (bên tạo, hoặc attach(name, writer=True)).
+        """
+        if not self.writable:
+            raise RuntimeError("SharedRingBuffer này được gắn vào ở chế độ chỉ đọc")
+        x = np.asarray(block, dtype=self.dtype)
+        if x.ndim == 1:
+            x = x.reshape(-1, 1) if self.n_channels == 1 else x.reshape(1, -1)
+        n = x.shape[0]
+        if n == 0:
+            return
+        if x.shape[1] != self.n_channels:
+            raise ValueError(f"Khối dữ liệu có {x.shape[1]} kênh, bộ đệm có {self.n_channels} kênh")
+
+        seq = self.total_written
+        cap = self.capacity
+        if n > cap:
+            x = x[-cap:]
+            seq += n - cap
+            n = cap
+        x = x.T
+
+        start = seq % cap
+        first = min(n, cap - start)
+        self._data[:, start:start + first] = x[:, :first]
+        self._data[:, start + cap:start + cap + first] = x[:, :first]
+        rest = n - first
+        if rest:
+            self._data[:, :rest] = x[:, first:]
+            self._data[:, cap:cap + rest] = x[:, first:]
+        # Công bố sau khi dữ liệu đã nằm trong vùng nhớ
+        self._header[_H_SEQ] = seq + n
+
+    def append(self, sample):
+        self.extend(np.reshape(sample, (1, self.n_channels)))
+
+    def mark_closed(self):
+        """Báo cho bên đọc biết sẽ không còn dữ liệu mới."""
+        self._header[_H_CLOSED] = 1
+
+    # --- Bên đọc (và bên ghi) ---
+    def _window(self, start, stop):
+        """View (stop - start, n_channels) của các mẫu [start, stop), yêu cầu stop - start <= capacity."""
+        s = start % self.capacity
+        return self._data[:, s:s + (stop - start)].T
+
+    def view(self):
+        """View (capacity, n_channels) của cửa sổ mới nhất, cũ -> mới (không copy)."""
+        seq = self.total_written
+        # Khi chưa đủ capacity mẫu, phần đầu là giá trị 0 ban đầu (giống RingBuffer)
+        return self._window(seq - self.capacity, seq)
+
+    def copy_view(self, retries=5):
+        """
+        Bản sao (capacity, n_channels) của cửa sổ mới nhất, nhất quán với một giá trị seq:
+        nếu bên ghi công bố thêm mẫu trong lúc copy thì copy lại (tối đa 'retries' lần,
+        sau đó trả về bản sao cuối cùng).
+        """
+        for _ in range(retries):
+            seq = self.total_written
+            window = self._window(seq - self.capacity, seq).copy()
+            if self.total_written == seq:
+                break
+        return window
+
+    def channel(self, index=0):
+        """View 1 chiều (capacity,) của một kênh, cũ -> mới."""
+        return self.view()[:, index]
+
+    def latest(self, n, index=0):
+        """View n mẫu mới nhất của một kênh."""
+        return self.channel(index)[self.capacity - min(int(n), self.capacity):]
+
+    def read_new(self):
+        """
+        Trả về (view, lost): view (m, n_channels) các mẫu mới kể từ lần đọc trước
+        (không copy) và số mẫu bị mất do đọc chậm (bị ghi đè trước khi kịp đọc).
+        View chỉ đúng khi is_valid(start) còn True, với start = con trỏ cũ + lost
+        (xem thuộc tính last_start); copy ra nếu cần giữ lâu.
+        """
+        seq = self.total_written
+        start = self.cursor
+        lost = 0
+        if seq - start > self.capacity:
+            lost = seq - self.capacity - start
+            start = seq - self.capacity
+        self.cursor = seq
+        self.last_start = start
+        return self._window(start, seq), lost
+
+    def is_valid(self, start):
+        """True nếu mẫu thứ 'start' (và các mẫu sau) chưa bị bên ghi ghi đè."""
+        return self.total_written - start <= self.capacity
+
+    # --- Giải phóng ---
+    def close(self):
+        """Đóng ánh xạ vùng nhớ. Bên tạo đồng thời xóa vùng nhớ (unlink)."""
+        # Bỏ tham chiếu tới buffer trước khi đóng (nếu không mmap báo lỗi)
+        self._header = self._data = None
+        self._shm.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getstate__(self):
+        # Khi gửi sang tiến trình khác (multiprocessing) chỉ gửi tên, bên nhận tự gắn vào để đọc
+        return {'name': self.name}
+
+    def __setstate__(self, state):
+        self.__dict__.update(SharedRingBuffer.attach(state['name']).__dict__)
+
+
+# Tiến trình đã tự mở resource_tracker khi gắn vào (không kế thừa từ tiến trình cha)
+_own_tracker_pid = None
+
+
+def _attach_shm(name):
+    """
+    Gắn vào vùng nhớ chia sẻ mà không để resource_tracker của tiến trình này giữ nó:
+    nếu không, Python < 3.13 sẽ xóa vùng nhớ khi tiến trình đọc thoát.
+
+    Tiến trình con (fork/spawn) dùng chung resource_tracker với tiến trình tạo, nơi vùng
+    nhớ đã được đăng ký: đăng ký lại không đổi gì, còn hủy đăng ký sẽ xóa luôn bản đăng
+    ký của bên tạo. Vì vậy chỉ hủy khi tiến trình này tự mở resource_tracker riêng.
+    """
+    global _own_tracker_pid
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        pass
+    if resource_tracker._resource_tracker._fd is None:
+        _own_tracker_pid = os.getpid()  # SharedMemory() sắp mở tracker riêng
+    shm = shared_memory.SharedMemory(name=name)
+    if _own_tracker_pid == os.getpid():
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
@@ -0,0 +1,288 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from Offline_processing import process_recording, save_result
+from Recording_loader import load_recording
+
+# --- CẤU HÌNH MẶC ĐỊNH ---
+FS = 100
+CHUNK_SECONDS = 1800   # Bản ghi dài hơn được chia thành các đoạn 30 phút
+WARMUP_SECONDS = 30    # Dữ liệu chạy trước mỗi đoạn để bộ lọc ổn định (bỏ đi, không ghi ra)
+SUMMARY_FILE = 'summary.csv'
+SUMMARY_COLUMNS = ('file', 'samples', 'duration_s', 'bpm_median', 'bpm_mean', 'bpm_min', 'bpm_max',
+                   'spo2_median', 'spo2_min', 'valid_fraction', 'cpu_s')
+
+
+def find_recordings(paths):
+    """Danh sách file CSV/.rec từ các đường dẫn (file hoặc thư mục), mỗi file một lần."""
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files += sorted(glob.glob(os.path.join(p, '*.csv')) + glob.glob(os.path.join(p, '*.rec')))
+        else:
+            files.append(p)
+    seen = set()
+    return [f for f in files if not (os.path.abspath(f) in seen or seen.add(os.path.abspath(f)))]
+
+
+def output_stem(path):
+    """
+    Tên file kết quả của một bản ghi: <tên>_<8 ký tự sha1 của đường dẫn tuyệt đối>,
+    để a/data.csv và b/data.csv không ghi đè lên nhau.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    return f"{name}_{hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]}"
+
+
+def plan_chunks(n_samples, fs, window, hop, chunk_seconds, warmup_seconds):
+    """
+    Chia bản ghi thành các đoạn [start, stop) và số mẫu chạy trước (warm-up) của mỗi đoạn.
+    Độ dài đoạn và warm-up là bội số của bước BPM/SpO2, để lưới cửa sổ của mọi đoạn
+    trùng với lưới khi xử lý cả file một lần. Warm-up ít nhất một cửa sổ BPM/SpO2.
+    """
+    h = max(int(round(hop * fs)), 1)
+    w = int(round(window * fs))
+    size = max(int(round(chunk_seconds * fs)) // h, 1) * h
+    warm = -(-max(int(round(warmup_seconds * fs)), w) // h) * h
+    return [(start, min(start + size, n_samples), warm) for start in range(0, n_samples, size)] or [(0, 0, 0)]
+
+
+def process_chunk(path, part_path, start, stop, warm, params):
+    """
+    Tiến trình con: xử lý đoạn [start, stop) của một bản ghi, bắt đầu lọc từ start - warm
+    và đọc thêm một cửa sổ sau stop (cho các cửa sổ BPM/SpO2 bắt đầu trong đoạn).
+    Ghi kết quả ra part_path (đổi tên nguyên tử, dùng để chạy tiếp khi bị ngắt).
+    """
+    fs = params['fs']
+    w = int(round(params['window'] * fs))
+    data = load_recording(path)  # memmap: chỉ các trang của đoạn này được đọc
+    lo = max(0, start - warm)
+    hi = min(len(data), stop + w)
+    t0 = time.process_time()
+    r = process_recording(data, fs=fs, seek=lo / fs, duration=(hi - lo) / fs if hi > lo else None,
+                          window=params['window'], hop=params['hop'],
+                          spo2_cal_coeffs=tuple(params['spo2_cal_coeffs']), use_sos=params['use_sos'])
+    if r['start'] != lo:
+        raise RuntimeError(f"{path}: đoạn bắt đầu ở mẫu {r['start']}, cần {lo}")
+    # Chỉ giữ mẫu của đoạn và các cửa sổ bắt đầu trong đoạn
+    win_start = np.rint(r['time'] * fs).astype(np.int64) - w
+    keep = (win_start >= start) & (win_start < stop)
+    part = {
+        'filtered': r['filtered'][start - lo:stop - lo],
+        'time': r['time'][keep], 'bpm': r['bpm'][keep], 'spo2': r['spo2'][keep],
+        'cpu': time.process_time() - t0,
+    }
+    _atomic_savez(part_path, part)
+    return stop - start
+
+
+def _atomic_savez(path, arrays):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def job_key(path, params):
+    """Khóa của một lần xử lý: đổi file gốc hoặc tham số thì xử lý lại từ đầu."""
+    st = os.stat(path)
+    blob = json.dumps([os.path.abspath(path), st.st_size, st.st_mtime_ns, params], sort_keys=True)
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()[:12]
+
+
+def merge_parts(path, out_dir, parts, n_samples, params):
+    """Ghép các đoạn thành <output_stem>.npz (cùng định dạng Offline_processing) và tính thống kê."""
+    output = os.path.join(out_dir, output_stem(path) + '.npz')
+    with tempfile.TemporaryFile(dir=out_dir) as tmp:
+        filtered = np.memmap(tmp, mode='w+', dtype=np.float64, shape=(n_samples, 3)) if n_samples else \
+            np.empty((0, 3))
+        times, bpm, spo2 = [], [], []
+        pos = 0
+        cpu = 0.0
+        for part_path in parts:
+            with np.load(part_path) as p:
+                n = len(p['filtered'])
+                filtered[pos:pos + n] = p['filtered']
+                pos += n
+                times.append(p['time'])
+                bpm.append(p['bpm'])
+                spo2.append(p['spo2'])
+                cpu += float(p['cpu'])
+        result = {'fs': params['fs'], 'start': 0, 'filtered': filtered,
+                  'time': np.concatenate(times), 'bpm': np.concatenate(bpm), 'spo2': np.concatenate(spo2)}
+        fd, tmp_out = tempfile.mkstemp(dir=out_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            save_result(f, result)
+        os.replace(tmp_out, output)
+    return summarize(path, result, n_samples, params['fs'], cpu)
+
+
+def summarize(path, result, n_samples, fs, cpu):
+    bpm, spo2 = result['bpm'], result['spo2']
+    valid = np.isfinite(bpm)
+
+    def stat(fn, x):
+        return round(float(fn(x[np.isfinite(x)])), 2) if np.isfinite(x).any() else None
+
+    return {
+        'file': path,
+        'samples': int(n_samples),
+        'duration_s': round(n_samples / fs, 2),
+        'bpm_median': stat(np.median, bpm), 'bpm_mean': stat(np.mean, bpm),
+        'bpm_min': stat(np.min, bpm), 'bpm_max': stat(np.max, bpm),
+        'spo2_median': stat(np.median, spo2), 'spo2_min': stat(np.min, spo2),
+        'valid_fraction': round(float(valid.mean()), 3) if len(valid) else 0.0,
+        'cpu_s': round(cpu, 3),
+    }
+
+
+def _prepare(path):
+    """Tạo cache .npy (nếu chưa có) và trả về số mẫu; chạy trong tiến trình con."""
+    return len(load_recording(path))
+
+
+def run_batch(paths, out_dir, params, workers=None, chunk_seconds=CHUNK_SECONDS,
+              warmup_seconds=WARMUP_SECONDS, verbose=True):
+    """
+    Xử lý lại cả thư mục bản ghi song song bằng ProcessPoolExecutor.
+
+    - Mỗi bản ghi được chia thành các đoạn chunk_seconds (kèm warm-up), các đoạn của
+      mọi file được phân cho các tiến trình, đoạn dài xếp trước.
+    - Mỗi đoạn xong được ghi ngay vào out_dir/.parts/; chạy lại sau khi bị ngắt chỉ xử lý
+      các đoạn còn thiếu. File đã xong (cùng file gốc, cùng tham số) được bỏ qua.
+    - Kết quả: out_dir/<output_stem>.npz, out_dir/<output_stem>.json (thống kê),
+      out_dir/summary.csv (cột 'file' là đường dẫn như đã truyền vào).
+
+    Tham số:
+    - params (dict): 'fs', 'window', 'hop', 'spo2_cal_coeffs', 'use_sos'
+                     (đổi tham số nào thì mọi file được xử lý lại).
+    - workers (int): Số tiến trình (mặc định = số lõi CPU).
+    """
+    files = find_recordings(paths)
+    os.makedirs(out_dir, exist_ok=True)
+    # Cách chia đoạn cũng ảnh hưởng kết quả (warm-up) nên là một phần của khóa
+    key_params = dict(params, chunk_seconds=chunk_seconds, warmup_seconds=warmup_seconds)
+    parts_root = os.path.join(out_dir, '.parts')
+    summaries = {}
+    pending = []
+    for path in files:
+        key = job_key(path, key_params)
+        stem = output_stem(path)
+        summary_path = os.path.join(out_dir, stem + '.json')
+        if os.path.exists(summary_path) and os.path.exists(os.path.join(out_dir, stem + '.npz')):
+            with open(summary_path, encoding='utf-8') as f:
+                done = json.load(f)
+            if done.get('key') == key:
+                summaries[path] = done
+                continue
+        # Kết quả dở dang của phiên bản/tham số cũ không dùng được nữa
+        for old in glob.glob(os.path.join(glob.escape(parts_root), glob.escape(stem) + '.*')):
+            if not old.endswith('.' + key):
+                shutil.rmtree(old, ignore_errors=True)
+        pending.append((path, key, stem))
+    if verbose:
+        print(f"-> {len(files)} bản ghi, {len(summaries)} đã xử lý, {len(pending)} cần xử lý")
+
+    t0 = time.perf_counter()
+    total = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        lengths = dict(zip(pending, pool.map(_prepare, [p for p, _, _ in pending])))
+
+        jobs, tasks = {}, []
+        for job, n_samples in lengths.items():
+            path, key, stem = job
+            part_dir = os.path.join(parts_root, f"{stem}.{key}")
+            os.makedirs(part_dir, exist_ok=True)
+            chunks = plan_chunks(n_samples, params['fs'], params['window'], params['hop'],
+                                 chunk_seconds, warmup_seconds)
+            parts = [os.path.join(part_dir, f"chunk_{i:05d}.npz") for i in range(len(chunks))]
+            jobs[job] = {'n': n_samples, 'parts': parts, 'left': set()}
+            for part_path, (start, stop, warm) in zip(parts, chunks):
+                # Đoạn đã có file kết quả từ lần chạy trước thì bỏ qua
+                if not os.path.exists(part_path):
+                    jobs[job]['left'].add(part_path)
+                    tasks.append((job, part_path, start, stop, warm))
+                    total += stop - start
+
+        # Đoạn dài trước để các tiến trình kết thúc gần cùng lúc
+        tasks.sort(key=lambda t: t[2] - t[3])
+        futures = {pool.submit(process_chunk, job[0], part_path, start, stop, warm, params): (job, part_path)
+                   for job, part_path, start, stop, warm in tasks}
+
+        def finish(job):
+            path, key, stem = job
+            summary = merge_parts(path, out_dir, jobs[job]['parts'], jobs[job]['n'], params)
+            summary['key'] = key
+            with open(os.path.join(out_dir, stem + '.json'), 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+            shutil.rmtree(os.path.dirname(jobs[job]['parts'][0]), ignore_errors=True)
+            summaries[path] = summary
+            if verbose:
+                print(f"   {summary['file']}: {summary['samples']} mẫu, BPM {summary['bpm_median']}, "
+                      f"SpO2 {summary['spo2_median']}")
+
+        # File mà mọi đoạn đã xong từ lần chạy trước (bị ngắt lúc ghép)
+        for job in jobs:
+            if not jobs[job]['left']:
+                finish(job)
+        for future in as_completed(futures):
+            job, part_path = futures[future]
+            future.result()
+            jobs[job]['left'].discard(part_path)
+            if not jobs[job]['left']:
+                finish(job)
+
+    elapsed = time.perf_counter() - t0
+    write_summary(os.path.join(out_dir, SUMMARY_FILE), [summaries[p] for p in files if p in summaries])
+    if verbose and total:
+        print(f"-> Đã xử lý {total} mẫu trong {elapsed:.2f} giây: {total / elapsed:,.0f} mẫu/giây "
+              f"({workers or os.cpu_count()} tiến trình)")
+    return summaries
+
+
+def write_summary(path, summaries):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(','.join(SUMMARY_COLUMNS) + '\n')
+        for s in summaries:
+            f.write(','.join('' if s[c] is None else str(s[c]) for c in SUMMARY_COLUMNS) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Xử lý lại nhiều bản ghi song song (ProcessPoolExecutor), chạy tiếp được khi bị ngắt.")
+    parser.add_argument('paths', nargs='*', default=[os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                  '..', 'csv')],
+                        help="File hoặc thư mục (mặc định: ../csv)")
+    parser.add_argument('-o', '--output', default='processed', help="Thư mục kết quả")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Số tiến trình (mặc định: số lõi)")
+    parser.add_argument('--fs', type=int, default=FS)
+    parser.add_argument('--window', type=float, default=5.0, help="Cửa sổ BPM/SpO2 (giây)")
+    parser.add_argument('--hop', type=float, default=1.0, help="Bước BPM/SpO2 (giây)")
+    parser.add_argument('--spo2-cal', type=float, nargs=2, default=(110, 25), metavar=('A', 'B'),
+                        help="Hệ số hiệu chuẩn SpO2 = A - B * R")
+    parser.add_argument('--sos', action='store_true', help="Dùng bộ lọc dạng SOS")
+    parser.add_argument('--chunk', type=float, default=CHUNK_SECONDS, help="Độ dài mỗi đoạn (giây)")
+    parser.add_argument('--warmup', type=float, default=WARMUP_SECONDS, help="Warm-up bộ lọc mỗi đoạn (giây)")
+    args = parser.parse_args()
+
+    params = {'fs': args.fs, 'window': args.window, 'hop': args.hop,
+              'spo2_cal_coeffs': list(args.spo2_cal), 'use_sos': args.sos}
+    run_batch(args.paths, args.output, params, workers=args.workers,
+              chunk_seconds=args.chunk, warmup_seconds=args.warmup)
+
+
+if __name__ == "__main__":
+    main()
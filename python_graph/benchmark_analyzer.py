@@ -0,0 +1,125 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from PPG_analyzer import PPGAnalyzer, StreamingPPGAnalyzer
+from benchmark_filters import load_csv, CSV_DIR
+
+# --- CẤU HÌNH ---
+FS = 100
+WINDOW_SIZE = 500  # 5 giây, giống Final.py
+
+
+def compare_streaming(data, block_size, check_every):
+    """
+    Nạp dữ liệu vào StreamingPPGAnalyzer theo từng khối, cứ 'check_every' mẫu
+    thì so sánh với analyze() chạy trên đúng cửa sổ đó.
+    Thứ tự cột CSV: ECG, IR, RED.
+    """
+    ref_analyzer = PPGAnalyzer(fs=FS)
+    stream = StreamingPPGAnalyzer(fs=FS, window_size=WINDOW_SIZE)
+    ir, red = data[:, 1], data[:, 2]
+
+    checked = same_status = same_bpm = 0
+    spo2_err = []
+    t_stream = t_ref = 0.0
+    next_check = WINDOW_SIZE
+    for start in range(0, len(data), block_size):
+        stop = min(start + block_size, len(data))
+        t0 = time.perf_counter()
+        res = stream.update(red[start:stop], ir[start:stop])
+        t_stream += time.perf_counter() - t0
+
+        if stop < next_check:
+            continue
+        next_check += check_every
+        t0 = time.perf_counter()
+        ref = ref_analyzer.analyze(red[stop - WINDOW_SIZE:stop], ir[stop - WINDOW_SIZE:stop])
+        t_ref += time.perf_counter() - t0
+
+        checked += 1
+        if res['status'] == ref['status']:
+            same_status += 1
+            if ref['status'] == "Success":
+                same_bpm += res['bpm'] == ref['bpm']
+                spo2_err.append(abs(res['spo2'] - ref['spo2']))
+    return {
+        'checked': checked,
+        'same_status': same_status,
+        'same_bpm': same_bpm,
+        'success': len(spo2_err),
+        'max_spo2_err': max(spo2_err) if spo2_err else 0.0,
+        't_stream_per_sample': t_stream / len(data),
+        't_ref_per_call': t_ref / max(checked, 1),
+    }
+
+
+def compare_batch(data, window=5.0, hop=1.0):
+    """So sánh analyze_batch() với vòng lặp analyze() trên cùng các cửa sổ."""
+    analyzer = PPGAnalyzer(fs=FS)
+    ir, red = data[:, 1], data[:, 2]
+
+    t0 = time.perf_counter()
+    batch = analyzer.analyze_batch(red, ir, window=window, hop=hop)
+    t_batch = time.perf_counter() - t0
+
+    w = int(round(window * FS))
+    same_bpm = 0
+    spo2_err = 0.0
+    t0 = time.perf_counter()
+    for i, start in enumerate(batch['start']):
+        ref = analyzer.analyze(red[start:start + w], ir[start:start + w])
+        if ref['status'] == "Success":
+            same_bpm += ref['bpm'] == batch['bpm'][i]
+            if not np.isnan(batch['spo2'][i]):
+                spo2_err = max(spo2_err, abs(ref['spo2'] - batch['spo2'][i]))
+        else:
+            same_bpm += np.isnan(batch['bpm'][i])
+    t_loop = time.perf_counter() - t0
+    return len(batch['start']), same_bpm, spo2_err, t_batch, t_loop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh StreamingPPGAnalyzer với PPGAnalyzer.analyze().")
+    parser.add_argument('files', nargs='*', help="File CSV (mặc định: toàn bộ csv/*.csv)")
+    parser.add_argument('--block', type=int, default=2, help="Số mẫu mỗi lần update (2 ~ 1 frame @ 50fps)")
+    parser.add_argument('--check-every', type=int, default=10, help="So sánh mỗi N mẫu")
+    parser.add_argument('--hours', type=float, default=1.0,
+                        help="Độ dài bản ghi ghép (giờ) để đo tốc độ analyze_batch")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(CSV_DIR, '*.csv')))
+    print(f"{'File':<12}{'Cửa sổ':>8}{'Status':>9}{'BPM khớp':>10}{'SpO2 lệch':>11}"
+          f"{'Stream (us/mẫu)':>17}{'analyze (us/lần)':>18}")
+    for path in files:
+        r = compare_streaming(load_csv(path), args.block, args.check_every)
+        bpm_rate = r['same_bpm'] / max(r['success'], 1) * 100
+        print(f"{os.path.basename(path):<12}{r['checked']:>8}"
+              f"{r['same_status'] / max(r['checked'], 1) * 100:>8.1f}%{bpm_rate:>9.1f}%"
+              f"{r['max_spo2_err']:>11.2f}{r['t_stream_per_sample'] * 1e6:>17.1f}"
+              f"{r['t_ref_per_call'] * 1e6:>18.1f}")
+
+    print(f"\n{'File':<12}{'Cửa sổ':>8}{'BPM khớp':>10}{'SpO2 lệch':>11}{'batch (ms)':>12}{'vòng lặp (ms)':>15}")
+    recordings = []
+    for path in files:
+        data = load_csv(path)
+        recordings.append(data)
+        n, same, err, t_batch, t_loop = compare_batch(data)
+        print(f"{os.path.basename(path):<12}{n:>8}{same / max(n, 1) * 100:>9.1f}%{err:>11.2f}"
+              f"{t_batch * 1e3:>12.2f}{t_loop * 1e3:>15.2f}")
+
+    # Ghép các bản ghi thành một bản ghi dài để đo tốc độ
+    if recordings and args.hours > 0:
+        joined = np.concatenate(recordings)
+        n_samples = int(args.hours * 3600 * FS)
+        long_data = np.tile(joined, (n_samples // len(joined) + 1, 1))[:n_samples]
+        n, same, _, t_batch, t_loop = compare_batch(long_data)
+        print(f"\nanalyze_batch: {args.hours:g} giờ @ {FS}Hz ({n_samples} mẫu, {n} cửa sổ) "
+              f"trong {t_batch:.3f} giây, vòng lặp analyze() {t_loop:.3f} giây "
+              f"(nhanh hơn {t_loop / t_batch:.1f} lần, BPM khớp {same / max(n, 1) * 100:.1f}%)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from Notch import RealTimeNotchFilter
+from BandPass_filter import RealTimeBandpassFilter
+from Filter_bank import create_vital_signs_bank
+from SOS_filter import RealTimeSOSFilter, use_fast_kernel
+from Biquad_filter import ScalarIIRFilter
+
+# --- CẤU HÌNH ---
+FS = 100
+CSV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'csv')
+
+
+def load_csv(path):
+    """Đọc file CSV (ECG, IR, RED) thành mảng float (n, 3)."""
+    return np.loadtxt(path, delimiter=',', dtype=np.float64, ndmin=2)
+
+
+def make_filters():
+    """Tạo đúng bộ lọc như trong Final.py."""
+    return {
+        'notch_ecg': RealTimeNotchFilter(fs=FS, freq=50.0, Q=30.0),
+        'bandpass_ecg': RealTimeBandpassFilter(lowcut=0.5, highcut=40.0, fs=FS, order=2),
+        'bandpass_red': RealTimeBandpassFilter(lowcut=0.5, highcut=12.0, fs=FS, order=2),
+        'bandpass_ir': RealTimeBandpassFilter(lowcut=0.5, highcut=12.0, fs=FS, order=2),
+    }
+
+
+def run_per_sample(data):
+    """Đường xử lý cũ: gọi lfilter cho từng mẫu."""
+    f = make_filters()
+    out = np.empty_like(data)
+    for i, (ecg, ir, red) in enumerate(data):
+        out[i, 0] = f['bandpass_ecg'].filter(f['notch_ecg'].process_sample(ecg))
+        out[i, 1] = -f['bandpass_ir'].filter(ir)
+        out[i, 2] = -f['bandpass_red'].filter(red)
+    return out
+
+
+def run_block(data, block_size):
+    """Đường xử lý mới: mỗi kênh gọi filter_block một lần cho mỗi khối."""
+    f = make_filters()
+    out = np.empty_like(data)
+    for start in range(0, len(data), block_size):
+        blk = data[start:start + block_size]
+        stop = start + len(blk)
+        out[start:stop, 0] = f['bandpass_ecg'].filter_block(f['notch_ecg'].filter_block(blk[:, 0]))
+        out[start:stop, 1] = -f['bandpass_ir'].filter_block(blk[:, 1])
+        out[start:stop, 2] = -f['bandpass_red'].filter_block(blk[:, 2])
+    return out
+
+
+def run_filter_bank(data, block_size, use_sos=False):
+    """Lọc cả 3 kênh bằng FilterBank (một lần gọi cho mỗi nhóm kênh)."""
+    bank = create_vital_signs_bank(fs=FS, use_sos=use_sos)
+    out = np.concatenate([bank.process(data[start:start + block_size])
+                          for start in range(0, len(data), block_size)])
+    # FilterBank nhân 2 cho ECG (giống Final.py), đưa về cùng thang đo để so sánh
+    out[:, 0] /= 2
+    return out
+
+
+def per_sample_latency(step, samples, repeat=3):
+    """Thời gian trung bình (ns) cho một lần gọi step(mẫu)."""
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for v in samples:
+            step(v)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(samples) * 1e9
+
+
+def run_latency(samples, repeat):
+    """So sánh độ trễ mỗi mẫu (1 vào -> 1 ra) giữa các lớp bộ lọc."""
+    def bandpass():
+        return RealTimeBandpassFilter(lowcut=0.5, highcut=40.0, fs=FS, order=2)
+
+    def notch():
+        return RealTimeNotchFilter(fs=FS, freq=50.0, Q=30.0)
+
+    cases = [
+        ('Bandpass.filter', lambda: bandpass().filter,
+         lambda: ScalarIIRFilter.from_filters(bandpass()).filter),
+        ('Notch.process_sample', lambda: notch().process_sample,
+         lambda: ScalarIIRFilter.from_filters(notch()).process_sample),
+        ('SOS(notch+bandpass).filter', lambda: RealTimeSOSFilter.cascade(notch(), bandpass()).filter,
+         lambda: ScalarIIRFilter.from_filters(notch(), bandpass()).filter),
+    ]
+    print(f"\n{'Độ trễ mỗi mẫu':<28}{'Scipy (ns)':>12}{'Scalar (ns)':>13}{'Tăng tốc':>10}  Sai số tương đối")
+    for name, make_ref, make_scalar in cases:
+        t_ref = per_sample_latency(make_ref(), samples, repeat)
+        t_scalar = per_sample_latency(make_scalar(), samples, repeat)
+        ref_step, scalar_step = make_ref(), make_scalar()
+        ref = np.array([ref_step(v) for v in samples])
+        out = np.array([scalar_step(v) for v in samples])
+        err = np.max(np.abs(out - ref)) / max(np.max(np.abs(ref)), 1e-12)
+        print(f"{name:<28}{t_ref:>12.0f}{t_scalar:>13.0f}{t_ref / t_scalar:>10.1f}  {err:.2g}")
+
+
+def timed(func, *args, repeat=3):
+    """Trả về (kết quả, thời gian nhỏ nhất) sau 'repeat' lần chạy."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh tốc độ lọc từng mẫu và lọc theo khối.")
+    parser.add_argument('files', nargs='*', help="File CSV (mặc định: toàn bộ csv/*.csv)")
+    parser.add_argument('--blocks', type=int, nargs='+', default=[2, 10, 100, 1000],
+                        help="Các kích thước khối cần đo (2 mẫu ~ 1 frame 20ms @ 100Hz)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency-samples', type=int, default=5000,
+                        help="Số mẫu ECG dùng để đo độ trễ từng mẫu (0 = bỏ qua)")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(CSV_DIR, '*.csv')))
+    if not files:
+        print(f"LỖI: Không tìm thấy file CSV trong {CSV_DIR}")
+        return
+
+    data = np.concatenate([load_csv(p) for p in files])
+    n = len(data)
+    print(f"-> {len(files)} file, {n} mẫu x 3 kênh ({n / FS:.1f} giây @ {FS}Hz)")
+
+    ref, t_ref = timed(run_per_sample, data, repeat=args.repeat)
+    print(f"{'Chế độ':<16}{'Thời gian (s)':>14}{'Mẫu/giây':>14}{'Tăng tốc':>10}  Khớp")
+    print(f"{'per-sample':<16}{t_ref:>14.4f}{n / t_ref:>14.0f}{1.0:>10.1f}  -")
+    for block_size in args.blocks:
+        out, t = timed(run_block, data, block_size, repeat=args.repeat)
+        same = "bit-identical" if np.array_equal(out, ref) else f"max diff {np.max(np.abs(out - ref)):.3g}"
+        print(f"{'block=' + str(block_size):<16}{t:>14.4f}{n / t:>14.0f}{t_ref / t:>10.1f}  {same}")
+    for use_sos, label in ((False, 'bank='), (True, 'bank-sos=')):
+        for block_size in args.blocks:
+            out, t = timed(run_filter_bank, data, block_size, use_sos, repeat=args.repeat)
+            same = "bit-identical" if np.array_equal(out, ref) else f"max diff {np.max(np.abs(out - ref)):.3g}"
+            print(f"{label + str(block_size):<16}{t:>14.4f}{n / t:>14.0f}{t_ref / t:>10.1f}  {same}")
+    # Nhân C riêng của SciPy (tùy chọn, xem SOS_filter.use_fast_kernel)
+    if use_fast_kernel():
+        for block_size in args.blocks:
+            out, t = timed(run_filter_bank, data, block_size, True, repeat=args.repeat)
+            same = "bit-identical" if np.array_equal(out, ref) else f"max diff {np.max(np.abs(out - ref)):.3g}"
+            print(f"{'sos-kernel=' + str(block_size):<16}{t:>14.4f}{n / t:>14.0f}{t_ref / t:>10.1f}  {same}")
+        use_fast_kernel(False)
+
+    if args.latency_samples > 0:
+        run_latency(data[:args.latency_samples, 0].tolist(), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from Serial_ingest import LineParser
+from benchmark_filters import CSV_DIR, timed
+
+
+def parse_per_line(chunks):
+    """
+    Đường cũ: readline().decode().strip().split(',') + float() cho từng dòng,
+    mỗi lần đọc gom thành một mảng như Final.update.
+    """
+    blocks = []
+    pending = b''
+    for chunk in chunks:
+        rows = []
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for raw in lines:
+            line = raw.decode('utf-8', errors='ignore').strip()
+            if not line or ',' not in line:
+                continue
+            parts = line.split(',')
+            if len(parts) == 3:
+                try:
+                    rows.append((float(parts[0]), float(parts[1]), float(parts[2])))
+                except ValueError:
+                    pass
+        blocks.append(np.array(rows).reshape(-1, 3))
+    return np.concatenate(blocks)
+
+
+def parse_block(chunks):
+    """Đường mới: LineParser tách cả khối bằng Numpy."""
+    parser = LineParser()
+    return np.concatenate([parser.feed(chunk) for chunk in chunks])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh tách dòng Serial từng dòng và theo khối.")
+    parser.add_argument('files', nargs='*', help="File CSV (mặc định: toàn bộ csv/*.csv)")
+    parser.add_argument('--chunks', type=int, nargs='+', default=[64, 512, 4096],
+                        help="Kích thước mỗi lần read() (byte). ~40 byte/mẫu @ 100Hz")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(CSV_DIR, '*.csv')))
+    raw = b''
+    for path in files:
+        with open(path, 'rb') as f:
+            raw += f.read().replace(b'\r\n', b'\n').replace(b'\n', b'\r\n')
+    # Thêm dòng chào và vài dòng nhiễu giống lúc ESP32 khởi động
+    raw = b"Khoi tao he thong...\r\n!\r\n" + raw
+    n_lines = raw.count(b'\n')
+    print(f"-> {len(files)} file, {n_lines} dòng, {len(raw) / 1024:.0f} KiB")
+
+    print(f"{'Chunk (byte)':<14}{'Từng dòng (s)':>15}{'Theo khối (s)':>15}{'Tăng tốc':>10}{'Dòng/giây':>14}  Khớp")
+    for size in args.chunks:
+        chunks = [raw[i:i + size] for i in range(0, len(raw), size)]
+        ref, t_ref = timed(parse_per_line, chunks, repeat=args.repeat)
+        out, t = timed(parse_block, chunks, repeat=args.repeat)
+        print(f"{size:<14}{t_ref:>15.4f}{t:>15.4f}{t_ref / t:>10.1f}{n_lines / t:>14.0f}"
+              f"  {np.array_equal(out, ref)}")
+
+
+if __name__ == "__main__":
+    main()
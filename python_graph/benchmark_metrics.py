@@ -0,0 +1,106 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from Acquisition_pipeline import VitalSignsDSP
+from Metrics import Registry
+from Serial_ingest import SerialIngest
+from benchmark_filters import CSV_DIR, FS, load_csv
+
+
+class _Bytes:
+    """Cổng Serial giả: trả về lần lượt các khối byte cho SerialIngest.read_block()."""
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.i = 0
+        self.in_waiting = 0
+
+    def read(self, n):
+        chunk = self.chunks[self.i]
+        self.i += 1
+        return chunk
+
+
+def run_dsp(data, block_size, metrics):
+    dsp = VitalSignsDSP(fs=FS, metrics=metrics)
+    t0 = time.perf_counter()
+    for start in range(0, len(data), block_size):
+        dsp.process(data[start:start + block_size])
+    return time.perf_counter() - t0
+
+
+def run_parse(chunks, metrics):
+    ingest = SerialIngest(_Bytes(chunks))
+    if metrics is not None:
+        ingest.instrument(metrics)
+    t0 = time.perf_counter()
+    for _ in chunks:
+        ingest.read_block()
+    return time.perf_counter() - t0
+
+
+def best(fn, *args, repeat=3):
+    """Thời gian nhỏ nhất khi tắt và khi bật đo đạc, chạy xen kẽ (máy bận lên xuống ảnh hưởng như nhau)."""
+    off, on = [], []
+    for _ in range(repeat):
+        off.append(fn(*args, None))
+        on.append(fn(*args, Registry()))
+    return min(off), min(on)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chi phí của đo đạc (Metrics.py): tắt, bật, và một lần lấy số liệu.")
+    parser.add_argument('files', nargs='*', help="File CSV (mặc định: toàn bộ csv/*.csv)")
+    parser.add_argument('--blocks', type=int, nargs='+', default=[2, 10, 100],
+                        help="Số mẫu mỗi khối đưa vào DSP (2 mẫu ~ một lần đọc Serial @ 100Hz)")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(CSV_DIR, '*.csv')))
+    if not files:
+        print(f"LỖI: Không tìm thấy file CSV trong {CSV_DIR}")
+        return
+    data = np.concatenate([load_csv(p) for p in files]).astype(np.int64)
+    n = len(data)
+    print(f"-> {len(files)} file, {n} mẫu ({n / FS:.1f} giây @ {FS}Hz)")
+
+    # Chi phí một lần gọi trên đường nóng
+    h = Registry().histogram('bench_seconds')
+    k = 200000
+    t0 = time.perf_counter()
+    for _ in range(k):
+        h.observe(1e-4)
+    t_observe = (time.perf_counter() - t0) / k
+    t0 = time.perf_counter()
+    for _ in range(k):
+        time.perf_counter()
+    t_clock = (time.perf_counter() - t0) / k
+    print(f"-> Histogram.observe(): {t_observe * 1e9:.0f} ns, time.perf_counter(): {t_clock * 1e9:.0f} ns")
+
+    print(f"{'Đường xử lý':<20}{'Tắt (s)':>10}{'Bật (s)':>10}{'Chênh':>9}{'µs/khối':>10}")
+    for block_size in args.blocks:
+        off, on = best(run_dsp, data, block_size, repeat=args.repeat)
+        blocks = -(-n // block_size)
+        print(f"{'DSP khối=' + str(block_size):<20}{off:>10.3f}{on:>10.3f}{(on - off) / off * 100:>+8.1f}%"
+              f"{(on - off) / blocks * 1e6:>10.2f}")
+
+    lines = b''.join(b"%d,%d,%d\r\n" % tuple(row) for row in data.tolist())
+    chunks = [lines[i:i + 32] for i in range(0, len(lines), 32)]   # ~1-2 dòng mỗi lần đọc
+    off, on = best(run_parse, chunks, repeat=args.repeat)
+    print(f"{'Tách dòng (32 B)':<20}{off:>10.3f}{on:>10.3f}{(on - off) / off * 100:>+8.1f}%"
+          f"{(on - off) / len(chunks) * 1e6:>10.2f}")
+
+    # Một lần Prometheus lấy số liệu (luồng HTTP, không chạm đường xử lý)
+    registry = Registry()
+    run_dsp(data[:FS * 60], 2, registry)
+    t0 = time.perf_counter()
+    for _ in range(100):
+        text = registry.prometheus()
+    print(f"-> Một lần /metrics: {(time.perf_counter() - t0) / 100 * 1e3:.2f} ms, {len(text)} byte")
+
+
+if __name__ == "__main__":
+    main()
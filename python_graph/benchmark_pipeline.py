@@ -0,0 +1,180 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import serial
+
+from ESP32_simulator import VirtualESP32
+from Filter_bank import create_vital_signs_bank
+from SGS import StreamingSmoother
+from PPG_analyzer import StreamingPPGAnalyzer
+from Ring_buffer import RingBuffer
+from Serial_ingest import SerialIngest, COL_IR, COL_RED
+from Acquisition_pipeline import AcquisitionPipeline
+from benchmark_filters import CSV_DIR
+
+# --- CẤU HÌNH ---
+FS = 100
+WINDOW_SIZE = 500
+FRAME_INTERVAL = 0.02  # 50fps giống FuncAnimation(interval=20) trong Final.py
+
+
+def read_lines(ser):
+    """Đường đọc cũ: readline() + decode/split/float cho từng dòng."""
+    rows = []
+    while ser.in_waiting:
+        line = ser.readline().decode('utf-8', errors='ignore').strip()
+        if not line or ',' not in line:
+            continue
+        parts = line.split(',')
+        if len(parts) >= 3:
+            try:
+                rows.append((float(parts[0]), float(parts[1]), float(parts[2])))
+            except ValueError:
+                pass
+    return np.array(rows).reshape(-1, 3)
+
+
+def busy(seconds):
+    """Giả lập một lần vẽ lại của matplotlib (chiếm CPU, giữ GIL)."""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def run_pipeline(sim, reader, frame_interval, render_cost=0.0):
+    """
+    Chạy pipeline giống Final.update (đọc -> FilterBank -> Smoother -> Analyzer)
+    trên cổng Serial ảo cho tới khi simulator phát hết dữ liệu.
+
+    Trả về dict: số mẫu, thời gian, CPU mỗi frame và độ trễ (gửi -> xử lý xong)
+    của mẫu mới nhất trong mỗi frame.
+    """
+    ser = serial.Serial(sim.port, 921600, timeout=0.1)
+    ingest = SerialIngest(ser)
+    if reader in ('thread', 'process'):
+        return run_threaded(sim, ser, ingest, reader, frame_interval, render_cost)
+    poll = ingest.poll if reader == 'ingest' else (lambda: read_lines(ser))
+
+    bank = create_vital_signs_bank(fs=FS, use_sos=False)
+    smoother = StreamingSmoother(window_length=9, polyorder=2, capacity=WINDOW_SIZE)
+    analyzer = StreamingPPGAnalyzer(fs=FS, window_size=WINDOW_SIZE)
+    ppg_data = RingBuffer(WINDOW_SIZE, n_channels=2)
+
+    received = 0
+    latencies, frame_cpu = [], []
+    sim.start()
+    t_start = time.perf_counter()
+    while True:
+        done = sim.finished.is_set()
+        c0 = time.process_time()
+        block = poll()
+        if len(block):
+            filtered = bank.process(block)
+            smoother.update(filtered[:, 0])
+            ppg_data.extend(filtered[:, 1:3])
+            analyzer.update(red_samples=block[:, COL_RED], ir_samples=block[:, COL_IR])
+            received += len(block)
+            # Chỉ chính xác khi không có lỗi (dòng rác làm lệch thứ tự dòng nhận/gửi)
+            t_sent = sim.sent_time(received - 1)
+            if t_sent is not None:
+                latencies.append(time.perf_counter() - t_sent)
+        frame_cpu.append(time.process_time() - c0)
+        busy(render_cost)
+        if done and not ser.in_waiting:
+            break
+        if frame_interval:
+            time.sleep(frame_interval)
+    elapsed = time.perf_counter() - t_start
+    ser.close()
+
+    latencies = np.array(latencies) * 1e3
+    return {
+        'received': received,
+        'sent': sim.sent,
+        'elapsed': elapsed,
+        'rate': received / elapsed,
+        'cpu_per_frame': np.mean(frame_cpu) * 1e3,
+        'lat_p50': np.percentile(latencies, 50) if len(latencies) else np.nan,
+        'lat_p99': np.percentile(latencies, 99) if len(latencies) else np.nan,
+        'malformed': ingest.malformed,
+    }
+
+
+def run_threaded(sim, ser, ingest, dsp_mode, frame_interval, render_cost):
+    """Giống run_pipeline nhưng dùng AcquisitionPipeline: bên vẽ chỉ lấy ảnh chụp mới nhất."""
+    pipeline = AcquisitionPipeline(ingest, fs=FS, window_size=WINDOW_SIZE, dsp_mode=dsp_mode)
+    pipeline.start()
+    latencies, frame_cpu = [], []
+    received = 0
+    sim.start()
+    t_start = time.perf_counter()
+    while True:
+        done = sim.finished.is_set()
+        c0 = time.process_time()
+        frame = pipeline.latest_frame()
+        if frame is not None:
+            received = frame['n_samples']
+            t_sent = sim.sent_time(received - 1)
+            if t_sent is not None:
+                latencies.append(time.perf_counter() - t_sent)
+        frame_cpu.append(time.process_time() - c0)
+        busy(render_cost)
+        if done and received >= ingest.lines and not ser.in_waiting and not pipeline.raw_queue.depth:
+            break
+        if frame_interval:
+            time.sleep(frame_interval)
+    elapsed = time.perf_counter() - t_start
+    pipeline.stop()
+    ser.close()
+
+    latencies = np.array(latencies) * 1e3
+    return {
+        'received': received,
+        'sent': sim.sent,
+        'elapsed': elapsed,
+        'rate': received / elapsed,
+        'cpu_per_frame': np.mean(frame_cpu) * 1e3,
+        'lat_p50': np.percentile(latencies, 50) if len(latencies) else np.nan,
+        'lat_p99': np.percentile(latencies, 99) if len(latencies) else np.nan,
+        'malformed': ingest.malformed,
+        'raw_dropped': pipeline.raw_queue.dropped,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Đo thông lượng/độ trễ pipeline kiểu Final.py với ESP32 ảo (không cần phần cứng).")
+    parser.add_argument('file', nargs='?', default=os.path.join(CSV_DIR, 'data2.csv'))
+    parser.add_argument('--speeds', type=float, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--readers', nargs='+', default=['readline', 'ingest', 'thread'],
+                        choices=['readline', 'ingest', 'thread', 'process'],
+                        help="readline/ingest: mọi thứ trong hàm vẽ (như Final.py cũ); "
+                             "thread/process: AcquisitionPipeline với DSP ở luồng/tiến trình riêng")
+    parser.add_argument('--seconds', type=float, default=5.0, help="Thời lượng dữ liệu phát mỗi lần đo (giây thực)")
+    parser.add_argument('--burst', type=int, default=1)
+    parser.add_argument('--garbage', type=float, default=0.0)
+    parser.add_argument('--frame', type=float, default=FRAME_INTERVAL, help="Chu kỳ frame (giây), 0 = không nghỉ")
+    parser.add_argument('--render-cost', type=float, default=0.0,
+                        help="Thời gian giả lập mỗi lần vẽ lại (giây), vd: 0.05 cho GUI chậm")
+    args = parser.parse_args()
+
+    data = np.loadtxt(args.file, delimiter=',', dtype=np.int64, ndmin=2)
+    print(f"{'Reader':<10}{'Tốc độ':>8}{'Mẫu':>8}{'Mẫu/giây':>11}{'CPU/frame (ms)':>16}"
+          f"{'Trễ p50 (ms)':>14}{'Trễ p99 (ms)':>14}")
+    for speed in args.speeds:
+        n = min(len(data), int(args.seconds * FS * speed))
+        for reader in args.readers:
+            sim = VirtualESP32(data[:n], fs=FS, speed=speed, burst=args.burst,
+                               garbage_rate=args.garbage, seed=0)
+            try:
+                r = run_pipeline(sim, reader, args.frame, args.render_cost)
+            finally:
+                sim.stop()
+            print(f"{reader:<10}{speed:>7g}x{r['received']:>8}{r['rate']:>11.0f}{r['cpu_per_frame']:>16.3f}"
+                  f"{r['lat_p50']:>14.2f}{r['lat_p99']:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
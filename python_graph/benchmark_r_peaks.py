@@ -0,0 +1,89 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+from scipy.signal import find_peaks, resample_poly
+
+from Filter_bank import create_vital_signs_bank
+from R_peak_detector import StreamingRPeakDetector
+from benchmark_filters import load_csv, CSV_DIR
+
+# --- CẤU HÌNH ---
+FS = 100
+SKIP = 2.0  # Bỏ qua 2 giây đầu (khởi tạo ngưỡng) khi so khớp
+
+
+def filtered_ecg(ecg, fs):
+    """ECG qua chuỗi lọc của Final.py (Notch -> Bandpass, nhân 2)."""
+    x = np.column_stack((ecg, ecg, ecg))
+    return create_vital_signs_bank(fs=fs, use_sos=True).process(x)[:, 0]
+
+
+def run_stream(ecg, fs, block_size):
+    """Nạp ECG theo từng khối, trả về (đỉnh R, thời gian xử lý mỗi mẫu)."""
+    detector = StreamingRPeakDetector(fs=fs)
+    peaks = []
+    t0 = time.perf_counter()
+    for start in range(0, len(ecg), block_size):
+        peaks.append(detector.update(ecg[start:start + block_size]))
+    elapsed = time.perf_counter() - t0
+    return np.concatenate(peaks), elapsed / len(ecg)
+
+
+def reference_peaks(ecg, fs):
+    """Tham chiếu offline: find_peaks trên cả bản ghi (khoảng cách >= 250 ms)."""
+    peaks, _ = find_peaks(ecg, distance=0.25 * fs, prominence=0.5 * np.percentile(ecg, 99))
+    return peaks
+
+
+def match(peaks, ref, tolerance):
+    """Số đỉnh của 'peaks' nằm trong +-tolerance mẫu quanh một đỉnh tham chiếu."""
+    if not len(peaks) or not len(ref):
+        return 0
+    pos = np.clip(np.searchsorted(ref, peaks), 1, len(ref) - 1)
+    nearest = np.minimum(np.abs(ref[pos - 1] - peaks), np.abs(ref[pos] - peaks))
+    return int((nearest <= tolerance).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra StreamingRPeakDetector: độ khớp và chi phí mỗi mẫu.")
+    parser.add_argument('files', nargs='*', help="File CSV (mặc định: toàn bộ csv/*.csv)")
+    parser.add_argument('--block', type=int, default=10, help="Số mẫu mỗi lần update (@ 100Hz)")
+    parser.add_argument('--fs', type=int, nargs='+', default=[100, 250, 500],
+                        help="Tần số lấy mẫu khi đo tốc độ (nội suy từ 100Hz)")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(CSV_DIR, '*.csv')))
+    print(f"{'File':<12}{'Đỉnh R':>8}{'Tham chiếu':>12}{'Khớp':>8}{'Theo khối = cả file':>21}{'BPM':>8}")
+    recordings = []
+    for path in files:
+        raw = load_csv(path)[:, 0]
+        recordings.append(raw)
+        ecg = filtered_ecg(raw, FS)
+        peaks, _ = run_stream(ecg, FS, args.block)
+        # Kết quả không phụ thuộc cách chia khối
+        same = np.array_equal(peaks, run_stream(ecg, FS, len(ecg))[0])
+        ref = reference_peaks(ecg, FS)
+        skip = int(SKIP * FS)
+        peaks, ref = peaks[peaks >= skip], ref[ref >= skip]
+        rr = np.diff(peaks)
+        bpm = 60 * FS / np.median(rr) if len(rr) else float('nan')
+        print(f"{os.path.basename(path):<12}{len(peaks):>8}{len(ref):>12}"
+              f"{match(peaks, ref, 2) / max(len(ref), 1) * 100:>7.1f}%"
+              f"{str(same):>21}{bpm:>8.1f}")
+
+    # Tốc độ ở tần số lấy mẫu cao: nội suy các bản ghi lên fs, khối 0.1 giây
+    if recordings:
+        joined = np.concatenate(recordings).astype(np.float64)
+        print(f"\n{'Fs (Hz)':>8}{'Khối':>8}{'us/mẫu':>10}{'x thời gian thực':>18}")
+        for fs in args.fs:
+            ecg = filtered_ecg(resample_poly(joined, fs, FS), fs)
+            for block in (max(fs // 10, 1), fs):
+                _, per_sample = run_stream(ecg, fs, block)
+                print(f"{fs:>8}{block:>8}{per_sample * 1e6:>10.2f}{1 / (per_sample * fs):>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import time
+
+import matplotlib
+matplotlib.use('Agg')  # Đo chi phí dựng hình, không phụ thuộc cửa sổ GUI
+import matplotlib.pyplot as plt
+import numpy as np
+
+from Renderer import LiveRenderer
+
+FRAMES = 100
+
+
+def make_signals(n, fs, rng):
+    t = np.arange(n) / fs
+    ecg = 2000 * np.exp(-((t % 0.8) - 0.1) ** 2 / 2e-4) + 50 * rng.standard_normal(n)
+    ppg = 1500 * np.sin(2 * np.pi * 1.25 * t)
+    return ecg, ppg, 0.8 * ppg
+
+
+def make_figure():
+    fig, axes = plt.subplots(3, 1, figsize=(10, 10), sharex=True)
+    for ax, lim in zip(axes, (3000, 3000, 5000)):
+        ax.grid(True, linestyle=':', alpha=0.6)
+        ax.set_ylim(-lim, lim)
+    return fig, axes
+
+
+def bench_full(n, fs, frames, rng):
+    """Kiểu Final.py cũ: đổi Y của cả n điểm, đổi tiêu đề mỗi 10 frame, vẽ lại toàn bộ hình."""
+    fig, axes = make_figure()
+    lines = [ax.plot(np.zeros(n), linewidth=1.2)[0] for ax in axes]
+    signals = make_signals(n + frames * 2, fs, rng)
+    times = []
+    for k in range(frames):
+        t0 = time.perf_counter()
+        for line, y in zip(lines, signals):
+            line.set_ydata(y[2 * k:2 * k + n])
+        if k % 10 == 0:
+            axes[2].set_title(f"PPG IR | BPM: {80 + k % 7} | SpO2: 97%")
+        fig.canvas.draw()
+        times.append(time.perf_counter() - t0)
+    plt.close(fig)
+    return np.array(times) * 1e3, 3 * n
+
+
+def bench_blit(n, fs, frames, rng):
+    """LiveRenderer: blitting các đường + dòng chữ BPM/SpO2, giảm điểm min/max theo pixel."""
+    fig, axes = make_figure()
+    renderer = LiveRenderer(fig, show_frame_time=False)
+    lines = [renderer.add_line(ax, n, linewidth=1.2) for ax in axes]
+    status = renderer.add_text(axes[2], "Waiting...")
+    signals = make_signals(n + frames * 2, fs, rng)
+    k = 0
+
+    def update():
+        for i, y in zip(lines, signals):
+            renderer.set_line(i, y[2 * k:2 * k + n])
+        if k % 10 == 0:
+            renderer.set_text(status, f"BPM: {80 + k % 7} | SpO2: 97%", color='green')
+
+    renderer._update = update
+    renderer.step()  # Frame đầu vẽ toàn bộ và lưu nền
+    renderer.frame_times.clear()
+    for k in range(frames):
+        renderer.step()
+    plt.close(fig)
+    return np.array(renderer.frame_times) * 1e3, renderer.n_vertices
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="So sánh thời gian frame: vẽ lại toàn bộ (FuncAnimation blit=False) và LiveRenderer.")
+    parser.add_argument('--seconds', type=float, nargs='+', default=[5, 60], help="Độ dài cửa sổ hiển thị")
+    parser.add_argument('--fs', type=int, nargs='+', default=[100, 250], help="Tần số lấy mẫu (Hz)")
+    parser.add_argument('--frames', type=int, default=FRAMES)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'Cửa sổ':>8}{'Fs':>6}{'Cách vẽ':>10}{'Điểm vẽ':>10}{'TB (ms)':>10}{'p95 (ms)':>10}{'fps tối đa':>12}")
+    for seconds in args.seconds:
+        for fs in args.fs:
+            n = int(seconds * fs)
+            for name, bench in (('full', bench_full), ('blit', bench_blit)):
+                t, vertices = bench(n, fs, args.frames, rng)
+                print(f"{seconds:>7g}s{fs:>6}{name:>10}{vertices:>10}{t.mean():>10.2f}"
+                      f"{np.percentile(t, 95):>10.2f}{1e3 / t.mean():>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import time
+
+from Acquisition_server import AcquisitionServer
+from benchmark_filters import CSV_DIR
+
+# --- CẤU HÌNH ---
+FS = 100
+
+
+def simulate(conn, path, n, fs, speed, burst):
+    """
+    Tiến trình con: n ESP32 ảo (pty) phát 'path' lặp lại. Gửi danh sách cổng về
+    tiến trình chính rồi chờ lệnh dừng.
+    Chạy riêng để CPU của simulator không bị tính vào server.
+    """
+    from ESP32_simulator import VirtualESP32
+    sims = [VirtualESP32(path, fs=fs, speed=speed, burst=burst, loop=True, seed=i).start() for i in range(n)]
+    conn.send([sim.port for sim in sims])
+    conn.recv()
+    for sim in sims:
+        sim.stop()
+
+
+def run_server(ports, duration, dsp_interval):
+    """Chạy AcquisitionServer 'duration' giây, trả về (server, thời gian thực, thời gian CPU của tiến trình)."""
+    server = AcquisitionServer(ports, fs=FS, dsp_interval=dsp_interval)
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    asyncio.run(server.run(duration))
+    return server, time.perf_counter() - t0, time.process_time() - cpu0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Số thiết bị một lõi CPU xử lý được với Acquisition_server.")
+    parser.add_argument('--file', default=os.path.join(CSV_DIR, 'data2.csv'), help="File CSV phát trên mỗi thiết bị")
+    parser.add_argument('--devices', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--duration', type=float, default=10.0, help="Thời gian chạy mỗi cấu hình (giây)")
+    parser.add_argument('--speed', type=float, default=1.0, help="Tốc độ phát so với 100Hz (vd: 2.5 = 250Hz)")
+    parser.add_argument('--burst', type=int, default=1, help="Số dòng mỗi thiết bị gửi gộp mỗi lần")
+    parser.add_argument('--dsp-interval', type=float, default=0.05, help="Chu kỳ xử lý của server (giây)")
+    args = parser.parse_args()
+
+    print(f"{'Thiết bị':>9}{'Mẫu/giây':>11}{'CPU':>8}{'Đọc':>8}{'DSP':>8}{'Mất':>6}{'Chờ DSP (ms)':>14}{'Ước tính tối đa':>17}")
+    for n in args.devices:
+        conn, child = mp.Pipe()
+        proc = mp.Process(target=simulate, args=(child, args.file, n, FS, args.speed, args.burst), daemon=True)
+        proc.start()
+        ports = conn.recv()
+        server, wall, cpu = run_server(ports, args.duration, args.dsp_interval)
+        conn.send('stop')
+        proc.join()
+
+        received = sum(d.dsp.n_samples for d in server.devices)
+        read = sum(d.read_time for d in server.devices)
+        dsp = sum(d.dsp_time for d in server.devices)
+        lost = sum(s['lost'] for s in server.status())
+        lag = max(d.max_lag for d in server.devices)
+        load = cpu / wall
+        # Số thiết bị để một lõi đầy 100% (tải tỉ lệ thuận với số thiết bị)
+        print(f"{n:>9}{received / wall:>11.0f}{load * 100:>7.1f}%{read / wall * 100:>7.1f}%"
+              f"{dsp / wall * 100:>7.1f}%{lost:>6}{lag * 1e3:>14.1f}{n / load:>17.0f}")
+
+
+if __name__ == "__main__":
+    main()
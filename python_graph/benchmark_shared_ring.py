@@ -0,0 +1,86 @@
+import argparse
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+from Shared_ring import SharedRingBuffer
+
+
+def consume_queue(q, n_blocks, out):
+    """Tiến trình đọc: nhận từng khối (đã pickle) từ multiprocessing.Queue."""
+    total = 0
+    for _ in range(n_blocks):
+        total += int(q.get()[-1, 0])
+    out.put(total)
+
+
+def consume_ring(name, n_samples, out):
+    """Tiến trình đọc: lấy view các mẫu mới trên SharedRingBuffer (không copy)."""
+    ring = SharedRingBuffer.attach(name)
+    ring.cursor = 0
+    total = lost = 0
+    while ring.cursor < n_samples:
+        block, n_lost = ring.read_new()
+        lost += n_lost
+        if len(block):
+            total += int(block[-1, 0])
+        else:
+            time.sleep(0)
+    ring.close()
+    out.put((total, lost))
+
+
+def bench_queue(blocks):
+    ctx = mp.get_context()
+    q, out = ctx.Queue(), ctx.Queue()
+    p = ctx.Process(target=consume_queue, args=(q, len(blocks), out))
+    p.start()
+    t0 = time.perf_counter()
+    for block in blocks:
+        q.put(block)
+    out.get()
+    elapsed = time.perf_counter() - t0
+    p.join()
+    return elapsed
+
+
+def bench_ring(blocks, capacity):
+    ctx = mp.get_context()
+    out = ctx.Queue()
+    n_samples = sum(len(b) for b in blocks)
+    with SharedRingBuffer(capacity, n_channels=3, dtype=np.int64) as ring:
+        p = ctx.Process(target=consume_ring, args=(ring.name, n_samples, out))
+        p.start()
+        t0 = time.perf_counter()
+        for block in blocks:
+            ring.extend(block)
+        _, lost = out.get()
+        elapsed = time.perf_counter() - t0
+        p.join()
+    return elapsed, lost
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="So sánh chi phí chuyển dữ liệu thô sang tiến trình DSP: "
+                    "multiprocessing.Queue (pickle) và SharedRingBuffer.")
+    parser.add_argument('--samples', type=int, default=200_000, help="Tổng số mẫu (ecg, ir, red) mỗi lần đo")
+    parser.add_argument('--blocks', type=int, nargs='+', default=[1, 8, 64, 512],
+                        help="Số mẫu mỗi khối (1 = gửi từng dòng, 8 = một lần poll ở 100 Hz/50 fps...)")
+    parser.add_argument('--capacity', type=int, default=16384, help="Dung lượng SharedRingBuffer (mẫu)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'Mẫu/khối':>9}{'Queue (µs/khối)':>17}{'Ring (µs/khối)':>16}{'Tăng tốc':>10}{'Mất (ring)':>12}")
+    for size in args.blocks:
+        n_blocks = max(1, args.samples // size)
+        blocks = [rng.integers(0, 1 << 18, size=(size, 3)) for _ in range(n_blocks)]
+        t_queue = bench_queue(blocks)
+        t_ring, lost = bench_ring(blocks, args.capacity)
+        print(f"{size:>9}{t_queue / n_blocks * 1e6:>17.2f}{t_ring / n_blocks * 1e6:>16.2f}"
+              f"{t_queue / t_ring:>9.1f}x{lost:>12}")
+
+
+if __name__ == "__main__":
+    main()
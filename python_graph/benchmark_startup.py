@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from ESP32_simulator import VirtualESP32
+from benchmark_filters import CSV_DIR
+
+# --- CẤU HÌNH ---
+FS = 100
+HERE = os.path.dirname(os.path.abspath(__file__))
+READY = "-> Sẵn sàng"          # Dòng Monitor_app in khi nguồn đã có dữ liệu và mọi tầng đã tạo
+HEAVY = ('scipy.signal', 'matplotlib')
+
+# Khởi động của Final.py trước khi có vitals.py: import matplotlib + SciPy + pyserial
+# ở đầu file, rồi time.sleep(2) chờ ESP32 reset sau khi mở cổng
+LEGACY = ("import time, serial, scipy.signal, matplotlib.pyplot, matplotlib.animation\n"
+          "time.sleep(2)\n"
+          f"print({READY!r}, flush=True)\n")
+
+# Chạy vitals.py như 'python vitals.py ...' và in các module nặng đã tải khi thoát
+WRAPPER = ("import atexit, runpy, sys\n"
+           "atexit.register(lambda: print('MODULES', ','.join(m for m in {heavy!r} if m in sys.modules), flush=True))\n"
+           "sys.argv = {argv!r}\n"
+           "runpy.run_path({script!r}, run_name='__main__')\n")
+
+
+def cases(port, csv_path, tmp):
+    """(tên, argv của vitals.py hoặc None = LEGACY, đo tới dòng READY hay tới khi thoát)."""
+    sim = ['--port', port, '--duration', '0.5']
+    return [
+        ("Final.py cũ (import + sleep 2)", None, True),
+        ("vitals.py --help", ['--help'], False),
+        ("record", ['record', *sim, '-o', os.path.join(tmp, 'bench.rec')], True),
+        ("monitor --no-plot", ['monitor', *sim, '--no-plot'], True),
+        ("monitor (vẽ)", ['monitor', *sim], True),
+        ("play (vẽ)", ['play', csv_path, '--duration', '2'], True),
+        ("play --headless", ['play', csv_path, '--headless', '-o', os.path.join(tmp, 'bench.npz')], False),
+        ("analyze -j 1", ['analyze', csv_path, '-o', os.path.join(tmp, 'analyze'), '-j', '1'], False),
+    ]
+
+
+def run_once(argv, until_ready, timeout=60.0):
+    """Chạy một tiến trình mới, trả về (ms tới READY hoặc tới khi thoát, các module nặng đã tải)."""
+    if argv is None:
+        code = LEGACY
+    else:
+        code = WRAPPER.format(heavy=HEAVY, argv=['vitals.py', *argv], script=os.path.join(HERE, 'vitals.py'))
+    # Backend không cửa sổ: plt.show() trả về ngay, vẫn tính thời gian import/tạo figure
+    env = dict(os.environ, MPLBACKEND='Agg', PYTHONUNBUFFERED='1')
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', code], cwd=HERE, env=env, text=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    elapsed = None
+    modules = None
+    output = []
+    for line in proc.stdout:
+        output.append(line)
+        if until_ready and elapsed is None and line.startswith(READY):
+            elapsed = time.perf_counter() - t0
+        if line.startswith('MODULES'):
+            modules = [m for m in line[len('MODULES'):].strip().split(',') if m]
+    proc.wait(timeout)
+    if not until_ready:
+        elapsed = time.perf_counter() - t0
+    if proc.returncode != 0 or elapsed is None:
+        raise RuntimeError(f"{argv}: thoát với mã {proc.returncode}\n" + ''.join(output[-20:]))
+    return elapsed * 1e3, (modules if modules is not None else list(HEAVY))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Thời gian khởi động (cold start) của vitals.py, mỗi lần đo là một tiến trình mới.")
+    parser.add_argument('--file', default=os.path.join(CSV_DIR, 'data2.csv'), help="File CSV (ESP32 ảo, play, analyze)")
+    parser.add_argument('--repeat', type=int, default=5, help="Số lần đo mỗi lệnh (lấy trung vị)")
+    parser.add_argument('-o', '--output', default=None, help="Ghi kết quả ra file JSON")
+    parser.add_argument('--compare', default=None, help="File JSON của lần đo trước (in thêm cột chênh lệch)")
+    args = parser.parse_args()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)['results']
+
+    sim = VirtualESP32(args.file, fs=FS, loop=True).start()
+    results = {}
+    header = f"{'Lệnh':<32}{'Trung vị (ms)':>15}{'Min':>9}{'Max':>9}"
+    if previous:
+        header += f"{'Trước (ms)':>12}{'Chênh':>9}"
+    print(header + "  Module nặng đã tải")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, argv, until_ready in cases(sim.port, os.path.abspath(args.file), tmp):
+                times = []
+                for i in range(args.repeat):
+                    if argv is not None and argv[0] == 'analyze':
+                        # Thư mục kết quả mới mỗi lần, không thì batch_process bỏ qua file đã xử lý
+                        argv[argv.index('-o') + 1] = os.path.join(tmp, f'analyze{i}')
+                    ms, modules = run_once(argv, until_ready)
+                    times.append(ms)
+                median = float(np.median(times))
+                results[name] = {'median_ms': median, 'min_ms': min(times), 'max_ms': max(times),
+                                 'modules': modules}
+                line = f"{name:<32}{median:>15.0f}{min(times):>9.0f}{max(times):>9.0f}"
+                if previous:
+                    old = previous.get(name, {}).get('median_ms')
+                    line += (f"{old:>12.0f}{(median - old) / old * 100:>+8.0f}%" if old
+                             else f"{'-':>12}{'-':>9}")
+                print(line + "  " + (', '.join(modules) or '-'))
+    finally:
+        sim.stop()
+
+    legacy = results["Final.py cũ (import + sleep 2)"]['median_ms']
+    print(f"-> 'record' sẵn sàng nhanh hơn Final.py cũ {legacy / results['record']['median_ms']:.1f} lần, "
+          f"'monitor (vẽ)' {legacy / results['monitor (vẽ)']['median_ms']:.1f} lần.")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'repeat': args.repeat, 'results': results}, f, indent=2)
+        print(f"-> Đã ghi {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+# pytest chạy từ python_graph/: các module nằm phẳng ở đây (import Rate_monitor...).
+# test_sample.py là script đo trên cổng COM3, không phải test.
+collect_ignore = ['test_sample.py']
@@ -1,48 +1,52 @@
 import serial
-import csv
+import time
+from Serial_ingest import SerialIngest
+from Recorder import Recorder
 
 # --- CẤU HÌNH ---
 SERIAL_PORT = 'COM3'   # Đổi lại cổng COM của bạn
 BAUD_RATE = 921600     # Đổi lại tốc độ (thường ESP32 dùng 115200)
-FILENAME = 'data_raw1.csv'
+# Mỗi lần chạy một file mới (đưa qua time.strftime), không ghi đè phiên đo trước.
+# Chuyển sang CSV: python Recorder.py data_raw_20250101_080000.rec
+FILENAME = 'data_raw_%Y%m%d_%H%M%S.rec'
+STATUS_INTERVAL = 1.0       # Chu kỳ in trạng thái (giây)
 
 # --- KẾT NỐI ---
 try:
     ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
     print(f"Đang hứng dữ liệu từ {SERIAL_PORT}...")
+    # Đọc theo khối: một lần read() cho toàn bộ bộ đệm, tách dòng bằng Numpy
+    ingest = SerialIngest(ser)
 except Exception as e:
     print(f"Lỗi: {e}")
     exit()
 
 # --- VÒNG LẶP LƯU DỮ LIỆU ---
+recorder = None  # Ctrl+C có thể đến trước khi mở xong file
 try:
-    with open(FILENAME, mode='a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        
+    # Gom mẫu trong bộ nhớ, ghi theo chunk nhị phân và fsync định kỳ
+    # (thay cho ghi + flush + in ra màn hình từng khối)
+    with Recorder(time.strftime(FILENAME), fs=100, metadata={'port': SERIAL_PORT, 'baud_rate': BAUD_RATE}) as recorder:
+        last_status = time.monotonic()
+
         while True:
-            if ser.in_waiting > 0:
-                # 1. Đọc dữ liệu thô
-                raw_line = ser.readline()
-                
-                try:
-                    # 2. Chuyển thành chuỗi (xóa khoảng trắng/xuống dòng thừa 2 đầu)
-                    text_line = raw_line.decode('utf-8').strip()
-                    
-                    # 3. Nếu dòng có dữ liệu thì xử lý
-                    if text_line:
-                        # Tách dấu phẩy để Excel hiểu là các ô khác nhau
-                        data = text_line.split(',')
-                        
-                        # Ghi vào file
-                        writer.writerow(data)
-                        f.flush() # Lưu ngay lập tức
-                        
-                        # In ra màn hình để bạn biết nó đang chạy
-                        print(text_line)
-                        
-                except Exception:
-                    pass # Bỏ qua các dòng lỗi (nhiễu tín hiệu lúc khởi động)
+            # 1. Đọc hết dữ liệu thô đang có (chờ tối đa timeout), tách thành các hàng số
+            #    Các dòng lỗi (nhiễu tín hiệu lúc khởi động) tự bị bỏ qua
+            rows = ingest.read_block()
+
+            # 2. Nếu có dữ liệu thì đưa vào bộ đệm ghi
+            if len(rows):
+                recorder.write(rows)
+
+            # 3. Mỗi giây in dòng mới nhất ra màn hình để bạn biết nó đang chạy
+            if len(rows) and time.monotonic() - last_status >= STATUS_INTERVAL:
+                last_status = time.monotonic()
+                print(f"{','.join(map(str, rows[-1]))}  ({recorder.n_samples} mẫu)")
 
 except KeyboardInterrupt:
-    print("\nĐã dừng.")
+    if recorder is not None:
+        print(f"\nĐã dừng. Đã lưu {recorder.n_samples} mẫu vào {recorder.path}")
+    else:
+        print("\nĐã dừng.")
+finally:
     ser.close()
\ No newline at end of file
@@ -1,11 +1,13 @@
 import serial
 import time
-import csv
+from Serial_ingest import SerialIngest
+from Recorder import Recorder
 
 # --- CẤU HÌNH ---
 serial_port = 'COM3'  # Đổi thành cổng COM của bạn (trên Mac/Linux là /dev/ttyUSB...)
 baud_rate = 115200    # Phải khớp với Serial.begin trong code ESP32
-log_file = 'ecg_ppg_data.csv'
+log_file = 'ecg_ppg_data.rec'  # Chuyển sang CSV: python Recorder.py ecg_ppg_data.rec
+status_interval = 1.0          # Chu kỳ in trạng thái ra màn hình (giây)
 # ----------------
 
 def save_to_file():
@@ -13,31 +15,35 @@ def save_to_file():
         ser = serial.Serial(serial_port, baud_rate, timeout=1)
         print(f"Đã kết nối tới {serial_port}...")
         
-        # Mở file để ghi (mode 'a' là nối tiếp, 'w' là ghi đè)
-        with open(log_file, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            
-            # Ghi tiêu đề cột (tùy chọn, nếu code ESP32 chưa in)
-            # writer.writerow(["Timestamp", "IR", "Red", "ECG", "HR", "SpO2", "Finger", "LeadsOff"])
+        # Mở file để ghi (ghi đè). Dữ liệu được gom trong bộ nhớ và ghi theo chunk nhị phân,
+        # bị tắt đột ngột chỉ mất tối đa một chunk (5 giây)
+        with Recorder(log_file, fs=100, metadata={'port': serial_port, 'baud_rate': baud_rate}) as recorder:
             
+            # Đọc Serial theo khối, dòng lỗi (dòng chào của ESP32, nhiễu...) bị bỏ qua
+            ingest = SerialIngest(ser)
+            last_status = time.monotonic()
+
             while True:
-                if ser.in_waiting > 0:
-                    try:
-                        # Đọc 1 dòng từ Serial, giải mã UTF-8 và xóa khoảng trắng thừa
-                        line = ser.readline().decode('utf-8', errors='ignore').strip()
-                        
-                        if line:
-                            print(f"Data: {line}") # In ra màn hình để theo dõi
-                            
-                            # Tách dữ liệu bằng dấu phẩy và lưu vào file
-                            data_row = line.split(',')
-                            writer.writerow(data_row)
-                            
-                    except Exception as e:
-                        print(f"Lỗi đọc dòng: {e}")
-                        
+                try:
+                    # Chờ dữ liệu (tối đa timeout) rồi đọc hết bộ đệm trong một lần
+                    rows = ingest.read_block()
+
+                    if len(rows):
+                        # Lưu cả khối vào bộ đệm của Recorder
+                        recorder.write(rows)
+
+                    # In trạng thái định kỳ thay vì in từng dòng
+                    if time.monotonic() - last_status >= status_interval:
+                        last_status = time.monotonic()
+                        latest = ','.join(map(str, rows[-1])) if len(rows) else '-'
+                        print(f"Data: {latest} ({recorder.n_samples} mẫu, "
+                              f"bỏ qua {ingest.malformed} dòng lỗi)")
+
+                except serial.SerialException as e:
+                    print(f"Lỗi đọc dòng: {e}")
+
     except KeyboardInterrupt:
-        print("\nĐã dừng ghi file!")
+        print(f"\nĐã dừng ghi file! ({log_file})")
         if ser.is_open:
             ser.close()
             
@@ -1,22 +1,18 @@
 import serial
-import time
 
-# Thay cổng COM của bạn vào đây
-ser = serial.Serial('COM3', 921600) 
-print("Dang do toc do lay mau (Sample Rate)...")
+from Rate_monitor import watch
 
-count = 0
-start_time = time.time()
+# Thay cổng COM của bạn vào đây
+SERIAL_PORT = 'COM3'
+BAUD_RATE = 921600
+FS = 100  # Tần số danh định của firmware (Hz)
 
-while True:
-    if ser.in_waiting:
-        ser.readline() # Đọc và bỏ qua dữ liệu
-        count += 1
-        
-    # Cứ mỗi 1 giây thì in kết quả một lần
-    if time.time() - start_time >= 1.0:
-        print(f"Toc do thuc te: {count} Hz (Mau/giay)")
-        
-        # Reset bộ đếm
-        count = 0
-        start_time = time.time()
\ No newline at end of file
+# Đo tần số thực theo thời điểm mỗi lần đọc khối (không phải đếm dòng mỗi giây),
+# kèm độ lệch đồng hồ và số mẫu mất, xem Rate_monitor.py
+if __name__ == "__main__":
+    ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=0.1)
+    print("Dang do toc do lay mau (Sample Rate)...")
+    try:
+        watch(ser, fs=FS)
+    finally:
+        ser.close()
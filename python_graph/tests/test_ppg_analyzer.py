@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+import pytest
+
+from PPG_analyzer import PPGAnalyzer
+
+CSV_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'csv')
+
+
+def assert_same_as_analyze(analyzer, red, ir, window, hop):
+    batch = analyzer.analyze_batch(red, ir, window=window, hop=hop)
+    w = int(round(window * analyzer.fs))
+    assert len(batch['start'])
+    for i, start in enumerate(batch['start']):
+        ref = analyzer.analyze(red[start:start + w], ir[start:start + w])
+        if ref['status'] == "Success":
+            assert batch['bpm'][i] == ref['bpm'], start
+            assert batch['spo2'][i] == pytest.approx(ref['spo2'], abs=0.011), start
+        else:
+            assert np.isnan(batch['bpm'][i]) and np.isnan(batch['spo2'][i]), start
+
+
+@pytest.mark.parametrize('name', ['data1.csv', 'other.csv', 'DQH.csv'])
+@pytest.mark.parametrize('window, hop', [(5.0, 1.0), (3.0, 0.13)])
+def test_batch_matches_analyze_on_recordings(name, window, hop):
+    data = np.loadtxt(os.path.join(CSV_DIR, name), delimiter=',')
+    assert_same_as_analyze(PPGAnalyzer(fs=100), data[:, 2], data[:, 1], window, hop)
+
+
+def test_batch_matches_analyze_with_ties():
+    # Tín hiệu nguyên nhỏ: nhiều cực đại cao bằng nhau đứng gần nhau
+    rng = np.random.default_rng(0)
+    x = np.rint(5 * np.sin(np.arange(6000) / 13.0) + rng.integers(0, 3, 6000)).astype(float) + 100
+    assert_same_as_analyze(PPGAnalyzer(fs=100), x, x, 5.0, 0.11)
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from Rate_monitor import PolyphaseResampler, RateMonitor
+
+RATE = 97.3   # Tần số thật của thiết bị (đồng hồ chậm -27000 ppm so với 100Hz)
+
+
+def feed(monitor, duration=20.0, rate=RATE, drop=(), stall=None, period=0.01, seed=0):
+    """
+    Phát các lần đọc khối giả cho RateMonitor: thiết bị lấy mẫu đều tại k / rate, máy
+    tính đọc mỗi 'period' giây (trễ USB 0-3 ms) và nhận mọi mẫu đã có.
+
+    - drop: Các cặp (giây, số mẫu): bỏ bấy nhiêu mẫu liên tiếp từ thời điểm đó.
+    - stall: (giây, độ dài): không có lần đọc nào trong khoảng đó (mẫu dồn lại, không mất).
+    Trả về tổng số mẫu mà update() báo mất.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * rate)
+    keep = np.ones(n, dtype=bool)
+    for t_drop, count in drop:
+        k = int(t_drop * rate)
+        keep[k:k + count] = False
+    sample_t = np.arange(n) / rate
+    sent = 0
+    reported = 0
+    t = 0.0
+    while t < duration:
+        t += period
+        if stall is not None and stall[0] <= t < stall[0] + stall[1]:
+            continue
+        ready = int(np.searchsorted(sample_t, t - rng.uniform(0, 0.003), side='right'))
+        got = int(keep[sent:ready].sum())
+        sent = max(sent, ready)
+        if got:
+            reported += monitor.update(t, got)
+    return reported
+
+
+def test_rate_and_drift():
+    m = RateMonitor(fs=100)
+    assert feed(m) == 0
+    assert m.rate == pytest.approx(RATE, rel=1e-3)
+    assert m.drift_ppm == pytest.approx(-27000, abs=500)
+    assert m.lost == 0 and m.extra == 0
+
+
+@pytest.mark.parametrize('count', [40, 8])
+def test_gap(count):
+    m = RateMonitor(fs=100)
+    assert feed(m, drop=[(12.0, count)]) == count
+    assert m.lost == count and m.extra == 0
+    assert len(m.gaps) == 1
+    # Tần số và độ lệch tính cả mẫu mất nên không bị kéo xuống
+    assert m.rate == pytest.approx(RATE, rel=1e-3)
+    assert m.drift_ppm == pytest.approx(-27000, abs=500)
+
+
+def test_stall_is_not_loss():
+    # USB ngừng 300 ms rồi trả dồn: dữ liệu đến muộn nhưng đủ, không phải mất mẫu
+    m = RateMonitor(fs=100)
+    assert feed(m, stall=(12.0, 0.3)) == 0
+    assert m.lost == 0 and m.extra == 0
+    assert m.rate == pytest.approx(RATE, rel=1e-3)
+
+
+def _signal(n, channels=3, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)[:, None]
+    return 1e5 + 2e3 * np.sin(2 * np.pi * t / np.array([83.0, 97.0, 71.0])[:channels]) \
+        + rng.normal(0, 50, (n, channels))
+
+
+@pytest.mark.parametrize('up, down', [(1000, 973), (973, 1000), (3, 2)])
+def test_resampler_block_split_invariance(up, down):
+    x = _signal(3000)
+    whole = PolyphaseResampler(up, down).process(x)
+    rng = np.random.default_rng(1)
+    cuts = np.sort(rng.choice(np.arange(1, len(x)), 200, replace=False))
+    r = PolyphaseResampler(up, down)
+    parts = [r.process(b) for b in np.split(x, cuts)] + [r.process(x[:0])]
+    split = np.concatenate(parts)
+    assert split.shape == whole.shape
+    np.testing.assert_allclose(split, whole, rtol=0, atol=1e-6)
+    # Độ dài ra đúng tỉ lệ (trừ phần chờ trễ nhóm của bộ lọc)
+    assert abs(len(whole) - len(x) * up / down) <= 16 * 2
+
+
+def test_resampler_single_samples():
+    x = _signal(500)
+    whole = PolyphaseResampler(1000, 973).process(x)
+    r = PolyphaseResampler(1000, 973)
+    split = np.concatenate([r.process(x[i:i + 1]) for i in range(len(x))])
+    np.testing.assert_allclose(split, whole, rtol=0, atol=1e-6)
@@ -0,0 +1,34 @@
+import pytest
+
+from Serial_ingest import SerialIngest
+
+
+class FakeSerial:
+    """Cổng Serial giả: mỗi lần read() trả về một khối byte đã định sẵn."""
+    def __init__(self, chunks, timeout=0.1):
+        self.chunks = list(chunks)
+        self.timeout = timeout
+        self.in_waiting = 0
+
+    def read(self, n):
+        return self.chunks.pop(0) if self.chunks else b''
+
+    def reset_input_buffer(self):
+        self.chunks = []
+
+
+def test_wait_ready_keeps_first_rows():
+    ser = FakeSerial([b"Khoi tao he thong...\r\n", b"1391,0,0\r\n1911,82732,", b"82721\r\n", b"5,6,7\r\n"])
+    ingest = SerialIngest(ser)
+    assert ingest.wait_ready(1.0) == 1
+    assert ingest.read_block().tolist() == [[1391, 0, 0]]
+    assert ingest.read_block().tolist() == [[1911, 82732, 82721]]
+    assert ingest.poll().tolist() == []  # in_waiting = 0
+    assert ingest.lines == 2
+
+
+def test_wait_ready_times_out_without_read_timeout():
+    ser = FakeSerial([], timeout=None)
+    with pytest.raises(TimeoutError):
+        SerialIngest(ser).wait_ready(0.05)
+    assert ser.timeout is None
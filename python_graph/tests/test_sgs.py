@@ -0,0 +1,21 @@
+import numpy as np
+from scipy.signal import savgol_filter
+
+from SGS import StreamingSmoother
+
+
+def test_smooth_returns_one_sample_per_input_across_blocks():
+    smoother = StreamingSmoother(window_length=9, polyorder=2, capacity=50)
+    x = np.random.default_rng(0).normal(size=40)
+    out = np.concatenate([smoother.smooth(x[i:i + 3]) for i in range(0, len(x), 3)])
+    assert len(out) == len(x)
+    # Sau độ trễ (window_length - 1) / 2 mẫu, khớp savgol_filter ở phần giữa
+    ref = savgol_filter(x, 9, 2)
+    np.testing.assert_allclose(out[8:], ref[4:-4])
+
+
+def test_window_length_one_keeps_block_length():
+    smoother = StreamingSmoother(window_length=1, polyorder=0, capacity=10)
+    for _ in range(3):
+        out = smoother.smooth(np.arange(5.))
+        np.testing.assert_allclose(out, np.arange(5.))
@@ -0,0 +1,169 @@
+import argparse
+
+# Chỉ import argparse ở đầu file: mỗi lệnh tự import những module nó cần, nên
+# 'record' không tải scipy.signal, và chỉ 'monitor'/'play' có đồ thị mới tải matplotlib
+# (xem benchmark_startup.py)
+
+# --- CẤU HÌNH MẶC ĐỊNH ---
+FS = 100
+BAUD_RATE = 921600
+READY_TIMEOUT = 5.0   # Chờ tối đa bấy nhiêu giây cho dòng dữ liệu hợp lệ đầu tiên
+
+
+def _open_port(args):
+    """Cổng Serial thật (--port) hoặc ESP32 ảo phát lại file (--sim). Trả về (port, sim)."""
+    if args.sim:
+        from ESP32_simulator import VirtualESP32
+        sim = VirtualESP32(args.sim, fs=args.fs, loop=True).start()
+        return sim.port, sim
+    if not args.port:
+        raise SystemExit("LỖI: cần --port (vd: COM3, /dev/ttyUSB0) hoặc --sim file.csv")
+    return args.port, None
+
+
+def _serial_source(args, port, **kwargs):
+    return dict({'type': 'serial', 'port': port, 'baud': args.baud, 'ready_timeout': args.ready_timeout},
+                **kwargs)
+
+
+def _metrics(args):
+    """--metrics-port/--metrics-json -> giá trị ghi đè khóa 'metrics' của cấu hình (None = không đo)."""
+    if args.metrics_port is None and args.metrics_json is None:
+        return None
+    return {'port': args.metrics_port, 'json': args.metrics_json}
+
+
+def cmd_record(args):
+    """Chỉ ghi dữ liệu thô ra .rec (không lọc, không vẽ)."""
+    from Monitor_app import run
+    port, sim = _open_port(args)
+    config = {
+        'title': "Ghi dữ liệu thô",
+        'fs': args.fs,
+        'window_size': args.fs * 5,
+        'duration': args.duration,
+        'metrics': _metrics(args),
+        # Ghi nguyên trạng những gì ESP32 gửi: không bỏ dòng lặp, không chèn mẫu bù
+        'source': _serial_source(args, port, monitor=False),
+        'stages': [{'type': 'recorder', 'path': args.output,
+                    'metadata': {'port': port, 'baud_rate': args.baud}}],
+    }
+    try:
+        run(config)
+    finally:
+        if sim is not None:
+            sim.stop()
+
+
+def cmd_monitor(args):
+    """Đo trực tiếp: lọc, BPM/SpO2, ECG HR, PTT theo cấu hình; vẽ trừ khi --no-plot."""
+    from Block_pipeline import load_config
+    from Monitor_app import run
+    config = load_config(args.config)
+    if args.no_plot:
+        config['stages'] = [spec for spec in config['stages'] if spec.get('type') != 'plot']
+    port, sim = _open_port(args)
+    try:
+        run(config, fs=args.fs, dsp_mode=args.dsp_mode, display_seconds=args.display_seconds,
+            duration=args.duration, metrics=_metrics(args), source=_serial_source(args, port))
+    finally:
+        if sim is not None:
+            sim.stop()
+
+
+def cmd_play(args):
+    """Phát lại bản ghi CSV/.rec theo thời gian thực, hoặc xử lý nhanh nhất có thể (--headless)."""
+    if args.headless:
+        from Offline_processing import run as run_headless
+        run_headless(args.file, args.output, fs=args.fs, seek=args.seek, duration=args.duration,
+                     window=args.window)
+        return
+    from Monitor_app import run
+    run('final_csv_raw' if args.raw else 'final_csv', fs=args.fs, metrics=_metrics(args),
+        source={'path': args.file, 'seek': args.seek, 'duration': args.duration, 'speed': args.speed})
+
+
+def cmd_analyze(args):
+    """Xử lý lại nhiều bản ghi song song (batch_process), kèm PTT từng nhịp nếu --ptt."""
+    import os
+    from batch_process import find_recordings, output_stem, run_batch
+    params = {'fs': args.fs, 'window': args.window, 'hop': args.hop,
+              'spo2_cal_coeffs': list(args.spo2_cal), 'use_sos': args.sos}
+    run_batch(args.paths, args.output, params, workers=args.workers)
+    if args.ptt:
+        from PTT import ptt_batch, save_csv
+        from Recording_loader import load_recording
+        for path in find_recordings(args.paths):
+            name = output_stem(path) + '_ptt.csv'
+            save_csv(os.path.join(args.output, name), ptt_batch(load_recording(path), fs=args.fs))
+        print(f"-> Đã ghi PTT từng nhịp vào {args.output}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='vitals.py', description="Thu thập, phát lại và xử lý dữ liệu ECG/PPG (ESP32 + MAX30102 + AD8232).")
+    parser.add_argument('--fs', type=int, default=FS, help="Tần số lấy mẫu (Hz)")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def serial_args(p):
+        p.add_argument('--port', default=None, help="Cổng Serial (vd: COM3, /dev/ttyUSB0)")
+        p.add_argument('--baud', type=int, default=BAUD_RATE)
+        p.add_argument('--sim', default=None, help="Không cần phần cứng: ESP32 ảo phát lặp file CSV này")
+        p.add_argument('--ready-timeout', type=float, default=READY_TIMEOUT,
+                       help="Chờ dòng dữ liệu hợp lệ đầu tiên tối đa bấy nhiêu giây")
+        p.add_argument('--duration', type=float, default=None, help="Dừng sau bấy nhiêu giây (mặc định: Ctrl+C)")
+        metrics_args(p)
+
+    def metrics_args(p):
+        p.add_argument('--metrics-port', type=int, default=None,
+                       help="Bật đo đạc: HTTP /metrics (Prometheus) trên 127.0.0.1:cổng này")
+        p.add_argument('--metrics-json', default=None,
+                       help="Bật đo đạc: ghi số đo ra file này mỗi 10 giây (.jsonl: thêm dòng, giữ cả ca)")
+
+    p = sub.add_parser('record', help="Ghi dữ liệu thô ra file .rec (không tải SciPy/matplotlib)")
+    serial_args(p)
+    p.add_argument('-o', '--output', default='recording_%Y%m%d_%H%M%S.rec',
+                   help="File .rec (được đưa qua strftime)")
+    p.set_defaults(func=cmd_record)
+
+    p = sub.add_parser('monitor', help="Đo và hiển thị trực tiếp")
+    serial_args(p)
+    p.add_argument('--config', default='final', help="Cấu hình trong configs/ (final, ecg, ppg...) hoặc file JSON")
+    p.add_argument('--no-plot', action='store_true', help="Không vẽ (không tải matplotlib), in kết quả mỗi giây")
+    p.add_argument('--dsp-mode', choices=('thread', 'process'), default=None)
+    p.add_argument('--display-seconds', type=float, default=None, help="Độ dài hiển thị (giây)")
+    p.set_defaults(func=cmd_monitor)
+
+    p = sub.add_parser('play', help="Phát lại bản ghi CSV/.rec")
+    p.add_argument('file', help="File CSV hoặc .rec")
+    p.add_argument('--seek', type=float, default=0.0, help="Bắt đầu từ giây thứ")
+    p.add_argument('--duration', type=float, default=None, help="Chỉ phát bấy nhiêu giây")
+    p.add_argument('--speed', type=float, default=1.0, help="Tốc độ phát (2 = nhanh gấp đôi)")
+    p.add_argument('--raw', action='store_true', help="Hiển thị dữ liệu thô (không lọc)")
+    p.add_argument('--headless', action='store_true', help="Không vẽ, xử lý nhanh nhất có thể, ghi .npz")
+    p.add_argument('-o', '--output', default=None, help="File kết quả của --headless")
+    p.add_argument('--window', type=float, default=5.0, help="Cửa sổ BPM/SpO2 của --headless (giây)")
+    metrics_args(p)
+    p.set_defaults(func=cmd_play)
+
+    p = sub.add_parser('analyze', help="Xử lý lại nhiều bản ghi song song")
+    p.add_argument('paths', nargs='+', help="File hoặc thư mục")
+    p.add_argument('-o', '--output', default='processed', help="Thư mục kết quả")
+    p.add_argument('-j', '--workers', type=int, default=None, help="Số tiến trình (mặc định: số lõi)")
+    p.add_argument('--window', type=float, default=5.0, help="Cửa sổ BPM/SpO2 (giây)")
+    p.add_argument('--hop', type=float, default=1.0, help="Bước BPM/SpO2 (giây)")
+    p.add_argument('--spo2-cal', type=float, nargs=2, default=(110, 25), metavar=('A', 'B'),
+                   help="Hệ số hiệu chuẩn SpO2 = A - B * R")
+    p.add_argument('--sos', action='store_true', help="Dùng bộ lọc dạng SOS")
+    p.add_argument('--ptt', action='store_true', help="Ghi thêm <tên>_<mã>_ptt.csv (PTT từng nhịp)")
+    p.set_defaults(func=cmd_analyze)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()